@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks of performance sensitive code paths.
+
+Usage
+
+    python benchmark.py rbac --role-count=20 --permission-count=200
+    python benchmark.py response --row-count=1000
+"""
+
+import asyncio
+import timeit
+from typing import Any, Callable
+
+from loguru import logger
+import fire
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from tools.rbac_manager import RBACManager
+
+
+def _build_rbac_fixture(role_count: int, permission_count: int):
+    """
+    Build a synthetic RBAC config, roles form an inheritance chain and
+    permissions are spread evenly over roles.
+    """
+    roles = {f"role_{i}" for i in range(role_count)}
+    role_inheritance = {f"role_{i}": {f"role_{i - 1}"} for i in range(1, role_count)}
+    role_permissions = {
+        f"role_{i}": {f"perm_{j}" for j in range(i, permission_count, role_count)}
+        for i in range(role_count)
+    }
+    return roles, role_inheritance, role_permissions
+
+
+def _time_per_op_ns(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+
+def bench_rbac(
+    role_count: int = 20,
+    permission_count: int = 200,
+    required_count: int = 5,
+    number: int = 100000,
+):
+    """
+    Compare set-based and bitmask-based permission checks of `RBACManager`
+
+    - `required_count` How many permissions are required in each check
+    """
+    roles, role_inheritance, role_permissions = _build_rbac_fixture(
+        role_count, permission_count
+    )
+    required = {f"perm_{j}" for j in range(required_count)}
+    top_role = f"role_{role_count - 1}"
+    # roles that together (but not individually) cover the required permissions
+    role_group = [f"role_{j % role_count}" for j in range(required_count)]
+
+    logger.disable("tools.rbac_manager")
+    managers = {
+        "set": RBACManager(roles, role_inheritance, role_permissions, use_bitmask=False),
+        "bitmask": RBACManager(roles, role_inheritance, role_permissions),
+    }
+    logger.enable("tools.rbac_manager")
+
+    results: dict[str, dict[str, float]] = {}
+    for mode, manager in managers.items():
+        results[mode] = {
+            "single role": _time_per_op_ns(
+                lambda: manager.check_role_has_all_permissions(top_role, required),
+                number,
+            ),
+            "role group": _time_per_op_ns(
+                lambda: manager.check_roles_have_all_permissions(role_group, required),
+                number,
+            ),
+        }
+
+    logger.info(
+        f"RBAC check benchmark: {role_count} roles, {permission_count} permissions, "
+        f"{required_count} required permissions, {number} checks per run"
+    )
+    for case in results["set"]:
+        set_ns = results["set"][case]
+        bitmask_ns = results["bitmask"][case]
+        logger.info(
+            f"{case:<12} set: {set_ns:8.1f} ns/op  bitmask: {bitmask_ns:8.1f} ns/op  "
+            f"speedup: {set_ns / bitmask_ns:.2f}x"
+        )
+
+
+def _build_response_fixture(row_count: int, tag_count: int):
+    """
+    Build transient ORM items with tags, and trades of those items, as loaded
+    by providers before validation.
+    """
+    from schemes import sql as orm
+
+    tags = [
+        orm.Tag(tag_id=i, name=f"tag_{i}", tag_type=orm.TagsType.user_created)
+        for i in range(tag_count)
+    ]
+    buyer = orm.User(user_id=1, username="buyer", created_time=0)
+    items: list[Any] = []
+    trades: list[Any] = []
+    for i in range(row_count):
+        item = orm.Item(
+            item_id=i,
+            name=f"item_{i}",
+            description="benchmark item " * 4,
+            created_time=i,
+            price=i,
+            state=orm.ItemState.valid,
+            fav_count=0,
+        )
+        for tag in tags:
+            item.association_tags.append(orm.AssociationItemTag(tag=tag))
+        items.append(item)
+        trades.append(
+            orm.TradeRecord(
+                trade_id=i,
+                buyer=buyer,
+                item=item,
+                created_time=i,
+                state=orm.TradeState.pending,
+            )
+        )
+    return items, trades
+
+
+def _time_per_op_ms(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+def bench_response(row_count: int = 1000, tag_count: int = 3, number: int = 10):
+    """
+    Compare response pipelines of a list endpoint, in two stages
+
+    Validate, from ORM rows to output models inside endpoint
+
+    - `per row` `model_validate()` of each row
+    - `type adapter` A cached `TypeAdapter` of the list type
+
+    Serialize, from validated output models to response body
+
+    - `fastapi json` FastAPI validates the models against `response_model` again,
+      rendered by the standard `JSONResponse`
+    - `fastapi orjson` Same as above, rendered by `ORJSONResponse`, the default
+      response class of the app
+    - `type adapter` Dumped to JSON bytes directly by the cached adapter, check out
+      `gene_sche.json_response()`
+    """
+    from schemes import db as db_sche
+    from schemes import general as gene_sche
+
+    items, trades = _build_response_fixture(row_count, tag_count)
+    loop = asyncio.new_event_loop()
+
+    def stages(model: type, rows: list[Any]) -> dict[str, dict[str, Callable]]:
+        out_type = list[model]
+        adapter = gene_sche.get_type_adapter(out_type)
+        field = create_response_field(name="response", type_=out_type)
+        validated = adapter.validate_python(rows, from_attributes=True)
+
+        def fastapi_serialize(response_class: type[JSONResponse]) -> Callable:
+            def run() -> bytes:
+                content = loop.run_until_complete(
+                    serialize_response(
+                        field=field, response_content=validated, exclude_none=True
+                    )
+                )
+                return response_class(content).body
+
+            return run
+
+        return {
+            "validate": {
+                "per row": lambda: [model.model_validate(r) for r in rows],
+                "type adapter": lambda: adapter.validate_python(
+                    rows, from_attributes=True
+                ),
+            },
+            "serialize": {
+                "fastapi json": fastapi_serialize(JSONResponse),
+                "fastapi orjson": fastapi_serialize(ORJSONResponse),
+                "type adapter": lambda: gene_sche.json_response(
+                    validated, out_type, exclude_none=True
+                ).body,
+            },
+        }
+
+    logger.info(
+        f"Response benchmark: {row_count} rows, {tag_count} tags per item, "
+        f"{number} responses per run"
+    )
+    for model, rows in [(db_sche.ItemOut, items), (db_sche.TradeRecordOut, trades)]:
+        for stage, pipelines in stages(model, rows).items():
+            results = {
+                name: _time_per_op_ms(fn, number) for name, fn in pipelines.items()
+            }
+            baseline = next(iter(results.values()))
+            for name, ms in results.items():
+                logger.info(
+                    f"{model.__name__:<15} {stage:<10} {name:<15} {ms:8.2f} ms  "
+                    f"speedup: {baseline / ms:.2f}x"
+                )
+
+    loop.close()
+
+
+if __name__ == "__main__":
+    fire.Fire({"rbac": bench_rbac, "response": bench_response})
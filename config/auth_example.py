@@ -31,3 +31,12 @@ TOKEN_EXPIRES_DELTA_HOURS: int = 240
 
 # Controls the cookies key in the frontend to store JWT info.
 JWT_FRONTEND_COOKIE_KEY: str = 'role_info'
+
+# Resolved users of sessions are cached in memory of each worker process.
+# Cached user info may be stale in other workers at most this seconds.
+USER_CACHE_TTL_SECONDS: int = 60
+USER_CACHE_MAX_SIZE: int = 10000
+ROLE_CACHE_TTL_SECONDS: int = 60
+# Contact info permission of (seller, buyer) pairs are cached in each worker process,
+# invalidated on trade changes. May be stale in other workers at most this seconds.
+CONTACT_INFO_PERMISSION_CACHE_TTL_SECONDS: int = 60
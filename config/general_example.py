@@ -27,3 +27,25 @@ POINT_SPREADING_TOLERANCE_MIN: int = 10
 # the duration between two data of backend.
 # this value will be used to calculate the factor when converting usage list to the unit of usage per hour.
 BACKEND_CATCH_TIME_DURATION_MIN: int = 60
+
+# background job runner, check out provider/job
+# disable it on processes that should not execute jobs
+JOB_RUNNER_ENABLED: bool = True
+# seconds between two polls of due jobs, new jobs enqueued in the same process
+# are picked immediately
+JOB_POLL_INTERVAL_S: float = 5
+# seconds a claimed job is leased to a runner, job will be retried by other
+# runners if not finished within this time
+JOB_LEASE_S: int = 300
+# default max attempts of a job, and base seconds of exponential retry backoff
+JOB_MAX_ATTEMPTS: int = 3
+JOB_RETRY_BACKOFF_S: int = 10
+
+# stale trades are cancelled by a periodic job, check out provider/trade/expiry
+# seconds a pending trade waits for seller's acceptance
+TRADE_ACCEPT_TIMEOUT_S: int = 3 * 24 * 3600
+# seconds an accepted trade waits for seller's confirmation
+TRADE_CONFIRM_TIMEOUT_S: int = 7 * 24 * 3600
+# seconds between two expiry runs, and max trades cancelled per statement
+TRADE_EXPIRY_INTERVAL_S: int = 300
+TRADE_EXPIRY_BATCH_SIZE: int = 200
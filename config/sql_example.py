@@ -1,4 +1,43 @@
+from typing import Any, Literal
+
+# database backend of business database
+# - "mysql" MySQL server with aiomysql driver
+# - "sqlite" Local SQLite file with aiosqlite driver, used as stand-in for local load tests
+DB_DRIVER: Literal["mysql", "sqlite"] = "mysql"
+
 DB_HOST: str = "YOUR_HOST_HERE"
 DB_NAME: str = "YOUR_DB_NAME_HERE"
 DB_USERNAME: str = "YOUR_DB_USERNAME_HERE"
 DB_PASSWORD: str = "YOUR_DB_PASSWORD_HERE"
+
+# set to True only if the business database is a disposable scratch database.
+# Scripts that write fixture rows or drop tables refuse to run on MySQL otherwise
+SCRATCH_DB: bool = False
+
+# only used when DB_DRIVER is "sqlite"
+SQLITE_PATH: str = "./sh_trade.sqlite3"
+
+ENGINE_ECHO: bool = False
+
+# name of the connection pool profile, check out POOL_PROFILES in provider/database.py
+# If None, use "dev" in dev environment, otherwise use "production"
+POOL_PROFILE: str | None = None
+
+# fields here will override the selected pool profile, e.g. {"pool_size": 20}
+POOL_OVERRIDES: dict[str, Any] = {}
+
+# host of the read replica of business database, which shares database name and
+# credentials with the primary. If None, all reads are sent to primary database
+REPLICA_DB_HOST: str | None = None
+
+# after a user commits writes, reads of this user are sent to primary within this window
+# to make sure user could read their own writes despite replication lag
+READ_YOUR_WRITES_WINDOW_MS: int = 5000
+
+# count SQL statements and DB time per request, attached to response headers
+# X-DB-Query-Count and X-DB-Query-Time-Ms
+QUERY_COUNTER_ENABLED: bool = True
+
+# warn about N+1 queries when the same statement shape repeats more than this
+# times in one request
+N_PLUS_ONE_THRESHOLD: int = 10
@@ -3,6 +3,7 @@ from typing import Annotated, cast, List
 
 from loguru import logger
 from fastapi import APIRouter, Query, Depends, Request, Response, status, Body
+from pydantic import BaseModel
 
 from config import system as sys_config
 
@@ -16,7 +17,7 @@ from provider import item as item_provider
 from provider import fav as fav_provider
 from provider.user import CurrentUserDep, CurrentUserOrNoneDep
 
-from provider.database import SessionDep
+from provider.database import SessionDep, ReadSessionDep
 from exception import error as exc
 
 
@@ -29,8 +30,26 @@ async def get_fav_items(ss: SessionDep, user: CurrentUserDep):
     """
     Get favourite items of current user
     """
-    return await ss.run_sync(
-        lambda ss: [db_sche.ItemOut.model_validate(i) for i in user.fav_items]
+    items_out = await ss.run_sync(
+        lambda ss: [
+            db_sche.ItemOut.model_validate(i).model_copy(update={"faved_by_me": True})
+            for i in user.fav_items
+        ]
+    )
+    return gene_sche.json_response(items_out, List[db_sche.ItemOut])
+
+
+class FavItemCountOut(BaseModel):
+    fav_item_count: int
+
+
+@fav_router.get("/count", response_model=FavItemCountOut)
+async def get_fav_item_count(ss: ReadSessionDep, user: CurrentUserDep):
+    """
+    Get favourite items count of current user, fav items are not loaded
+    """
+    return FavItemCountOut(
+        fav_item_count=await fav_provider.get_fav_item_count(ss, user.user_id)
     )
 
 
@@ -53,7 +72,9 @@ async def add_fav_item(
     - `item_already_in_fav` (409) (DuplicatedError)
     """
     item = await fav_provider.add_fav_item(ss, user, item_id)
-    return await ss.run_sync(lambda ss: db_sche.ItemOut.model_validate(item))
+    item_out = await gene_sche.validate_result(ss, item, db_sche.ItemOut)
+    item_out.faved_by_me = True
+    return gene_sche.json_response(item_out, db_sche.ItemOut)
 
 
 @fav_router.delete("/remove", response_model=gene_sche.BulkOpeartionInfo)
@@ -3,6 +3,7 @@ from typing import Annotated, cast, List
 
 from loguru import logger
 from fastapi import APIRouter, Query, Depends, Request, Response, status, Body
+from pydantic import BaseModel
 
 from config import system as sys_config
 
@@ -13,9 +14,11 @@ from schemes import sql as orm
 from provider import user as user_provider
 from provider import database as db_provider
 from provider import item as item_provider
+from provider import job as job_provider
+from provider import fav as fav_provider
 from provider.user import CurrentUserDep, CurrentUserOrNoneDep
 
-from provider.database import SessionDep
+from provider.database import SessionDep, ReadSessionDep
 from exception import error as exc
 
 
@@ -24,7 +27,7 @@ item_router = APIRouter()
 
 @item_router.get("", response_model=List[db_sche.ItemOut])
 async def get_items_of_user(
-    ss: SessionDep,
+    ss: ReadSessionDep,
     user: CurrentUserOrNoneDep,
     user_id: int | None = None,
     ignore_sold: bool = False,
@@ -58,13 +61,101 @@ async def get_items_of_user(
         full_access = True
 
     # retrieve info
-    return await item_provider.get_user_items(
+    items = await item_provider.get_user_items(
         ss,
         user_id,
         ignore_hide=not full_access,
         ignore_sold=ignore_sold,
         time_desc=time_desc,
     )
+    items_out = await gene_sche.validate_result(ss, items, List[db_sche.ItemOut])
+    await fav_provider.mark_faved_items(ss, user, items_out)
+
+    return gene_sche.json_response(items_out, List[db_sche.ItemOut])
+
+
+@item_router.get(
+    "/catalog",
+    response_model=gene_sche.PaginatedResultOut[List[db_sche.ItemOut]],
+    response_model_exclude_none=True,
+)
+async def get_catalog_items(
+    ss: ReadSessionDep,
+    user: CurrentUserOrNoneDep,
+    keyword: Annotated[str | None, Query(max_length=50)] = None,
+    tags: Annotated[List[str] | None, Query(max_length=10)] = None,
+    price_min: Annotated[int | None, Query(ge=0)] = None,
+    price_max: Annotated[int | None, Query(ge=0)] = None,
+    state: Annotated[List[orm.ItemState] | None, Query()] = None,
+    sort: gene_sche.ItemSortTypeIn = gene_sche.ItemSortTypeIn.recent,
+    size: Annotated[int, Query(ge=1, le=100)] = 20,
+    cursor: str | None = None,
+):
+    """
+    Browse and search items of all users, no account needed for this endpoint.
+
+    Args
+
+    - `keyword` Items must contain all words of keyword in name or description
+    - `tags` Items must have at least one of these tags
+    - `price_min`, `price_max` Inclusive price range
+    - `state` Default to `valid` items only. Hidden items never appear
+    - `sort` Order of result
+    - `size`, `cursor` Keyset pagination, pass `next_cursor` of last response to
+      get next page. Cursor should be used with the same `sort`
+
+    Notes
+
+    - `total` is not returned, keep fetching until `next_cursor` is absent
+    - `faved_by_me` of each item is only returned for signed-in users
+    """
+    if price_min is not None and price_max is not None and price_min > price_max:
+        raise exc.ParamError(
+            param_name="price_max", message="price_max should not less than price_min"
+        )
+
+    res = await item_provider.search_items(
+        ss,
+        keyword=keyword,
+        tag_names=tags,
+        price_min=price_min,
+        price_max=price_max,
+        states=state,
+        sort=sort,
+        pagination=gene_sche.PaginationConfig(size=size, keyset=True, cursor=cursor),
+    )
+
+    res_out = await gene_sche.validate_result(
+        ss, res, gene_sche.PaginatedResultOut[List[db_sche.ItemOut]]
+    )
+    await fav_provider.mark_faved_items(ss, user, res_out.data)
+
+    return gene_sche.json_response(
+        res_out,
+        gene_sche.PaginatedResultOut[List[db_sche.ItemOut]],
+        exclude_none=True,
+    )
+
+
+class TagSuggestionOut(BaseModel):
+    name: str
+    usage_count: int
+
+
+@item_router.get("/tags/suggest", response_model=List[TagSuggestionOut])
+async def suggest_tags(
+    prefix: Annotated[str, Query(min_length=1, max_length=20)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    """
+    Suggest existing tags starting with `prefix`, most used tags first.
+
+    Served from an in-memory index, no account needed for this endpoint.
+    """
+    return [
+        TagSuggestionOut(name=name, usage_count=count)
+        for name, count in item_provider.suggest_tags(prefix, limit)
+    ]
 
 
 @item_router.post(
@@ -120,35 +211,44 @@ async def update_item(ss: SessionDep, user: CurrentUserDep, info: db_sche.ItemIn
     # update item
     item_orm = await item_provider.update_item(ss, info)
     await item_orm.awaitable_attrs.association_tags
-    return await ss.run_sync(lambda ss: db_sche.ItemOut.model_validate(item_orm))
+    return await gene_sche.validated_response(ss, item_orm, db_sche.ItemOut)
 
 
-@item_router.delete("/remove_all", response_model=List[gene_sche.BulkOpeartionInfo])
+@item_router.delete("/remove_all", response_model=db_sche.JobOut)
 async def remove_all_items(ss: SessionDep, user: CurrentUserDep):
     """
     Remove all items of current user
 
     This will also remove all questions related to this item
+
+    The removal runs in background, poll `/job/status` with the returned `job_id`
+    to get the result.
     """
     # remove all items belongs to this user
-    await user.awaitable_attrs.items
-
-    bulk_res = await item_provider.remove_items_cascade(ss, user.items)
+    item_id_list = await item_provider.get_cascade_item_ids_from_users(
+        ss, [user.user_id]
+    )
 
-    try:
-        await ss.commit()
-        return bulk_res
-    except:
-        await ss.rollback()
-        raise
+    return await job_provider.enqueue_job(
+        ss,
+        "remove_items",
+        {"item_id_list": list(item_id_list)},
+        user_id=user.user_id,
+    )
 
 
 @item_router.delete(
     "/remove",
-    response_model=List[gene_sche.BulkOpeartionInfo],
+    response_model=db_sche.JobOut,
     responses=exc.openApiErrorMark({403: "Permission Required"}),
 )
 async def remove_items(ss: SessionDep, user: CurrentUserDep, item_id_list: list[int]):
+    """
+    Remove items by id, only admin could remove items of other users
+
+    The removal runs in background, poll `/job/status` with the returned `job_id`
+    to get the result.
+    """
     items = [await item_provider.get_item_by_id(ss, iid) for iid in item_id_list]
 
     # permission check, user could only delete items of themselves
@@ -162,7 +262,12 @@ async def remove_items(ss: SessionDep, user: CurrentUserDep, item_id_list: list[
             )
 
     # cascade delete item
-    return await item_provider.remove_items_cascade(ss, items)
+    return await job_provider.enqueue_job(
+        ss,
+        "remove_items",
+        {"item_id_list": [i.item_id for i in items]},
+        user_id=user.user_id,
+    )
 
 
 @item_router.post(
@@ -226,7 +331,7 @@ async def add_question(
 
 @item_router.get("/questions", response_model=List[db_sche.QuestionOut])
 async def get_questions_of_item(
-    ss: SessionDep,
+    ss: ReadSessionDep,
     user: CurrentUserOrNoneDep,
     item_id: int,
     time_desc: bool = True,
@@ -0,0 +1,57 @@
+from fastapi import APIRouter
+
+from schemes import db as db_sche
+
+from provider import job as job_provider
+from provider.user import CurrentUserDep
+
+from provider.database import ReadSessionDep
+from exception import error as exc
+
+
+job_router = APIRouter()
+"""API Router of background job related endpoints"""
+
+
+@job_router.get(
+    "/status",
+    response_model=db_sche.JobOut,
+    responses=exc.openApiErrorMark({404: "Job Not Found", 403: "Permission Required"}),
+)
+async def get_job_status(ss: ReadSessionDep, user: CurrentUserDep, job_id: int):
+    """
+    Get status of a background job, used to poll the result of operations like
+    account removal.
+
+    Only the user who started the job could check it.
+
+    Raises
+
+    - `no_result`
+    - `permission_required`
+    """
+    job = await job_provider.get_job_by_id(ss, job_id)
+
+    if job.user_id != user.user_id:
+        raise exc.PermissionError(message="You could only check jobs started by yourself")
+
+    return job
+
+
+@job_router.get(
+    "/status/token",
+    response_model=db_sche.JobOut,
+    responses=exc.openApiErrorMark({404: "Job Not Found"}),
+)
+async def get_job_status_by_token(ss: ReadSessionDep, token: str):
+    """
+    Get status of a background job by its `poll_token`, no session required.
+
+    Used to poll jobs that remove the login of their requester, e.g. account removal,
+    check out `/user/remove`.
+
+    Raises
+
+    - `no_result`
+    """
+    return await job_provider.get_job_by_poll_token(ss, token)
@@ -25,10 +25,13 @@ from provider.notification import (
     send_to_telegram_callback,
     get_notifications,
     get_notification_by_id,
+    get_unread_notification_count,
+    mark_notification_read,
+    mark_all_notifications_read,
     check_user_could_read_notification,
 )
 
-from provider.database import SessionDep
+from provider.database import SessionDep, ReadSessionDep
 from exception import error as exc
 
 
@@ -65,8 +68,8 @@ async def send_notifications(
         content=db_sche.NotificationContentOut(title=title, message=message)
     )
 
-    return await ss.run_sync(
-        lambda x: db_sche.NotificationOut.model_validate(orm_notification)
+    return await gene_sche.validated_response(
+        ss, orm_notification, db_sche.NotificationOut
     )
 
 
@@ -76,6 +79,7 @@ class GetNotificationIn(BaseModel):
     time_desc: bool = True
     ignore_read: bool = False
     pagination: gene_sche.PaginationConfig | None = None
+    count_total: bool = True
 
 
 class GetNotificationOut(BaseModel):
@@ -94,7 +98,7 @@ class GetNotificationOut(BaseModel):
 )
 async def get_user_notifications(
     p: Annotated[bool, Depends(PermissionsChecker({"notification:read:self"}))],
-    ss: SessionDep,
+    ss: ReadSessionDep,
     user: CurrentUserDep,
     config: Annotated[GetNotificationIn, Body(embed=True)],
 ):
@@ -106,6 +110,7 @@ async def get_user_notifications(
         received=config.received,
         pagination=config.pagination,
         ignore_read=config.ignore_read,
+        count_total=config.count_total,
     )
 
     # def valiate_result(ss):
@@ -113,10 +118,32 @@ async def get_user_notifications(
     #         list[db_sche.NotificationOut]
     #     ].model_validate(notification_res)
 
-    return await gene_sche.validate_result(
+    return await gene_sche.validated_response(
         ss,
         notification_res,
         gene_sche.PaginatedResultOut[list[db_sche.NotificationOut]],
+        exclude_none=True,
+    )
+
+
+class UnreadNotificationCountOut(BaseModel):
+    unread_count: int
+
+
+@notification_router.get("/unread_count", response_model=UnreadNotificationCountOut)
+async def get_user_unread_notification_count(
+    p: Annotated[bool, Depends(PermissionsChecker({"notification:read:self"}))],
+    ss: ReadSessionDep,
+    user: CurrentUserDep,
+):
+    """
+    Get count of unread received notifications of current user.
+
+    The count is read from a counter maintained when notifications are sent or
+    read, so this endpoint is cheap enough for polling.
+    """
+    return UnreadNotificationCountOut(
+        unread_count=await get_unread_notification_count(ss, user.user_id)
     )
 
 
@@ -148,11 +175,11 @@ async def get_user_notification_by_id(
     # permission check
     await check_user_could_read_notification(ss, user=user, notification=orm_n)
 
-    return await gene_sche.validate_result(ss, orm_n, db_sche.NotificationOut)
+    return await gene_sche.validated_response(ss, orm_n, db_sche.NotificationOut)
 
 
 @notification_router.post("/read", response_model=db_sche.NotificationOut)
-async def mark_notification_read(
+async def read_notification(
     p: Annotated[bool, Depends(PermissionsChecker({"notification:read:self"}))],
     ss: SessionDep,
     user: CurrentUserDep,
@@ -175,10 +202,13 @@ async def mark_notification_read(
             message="You could only mark notification as read of your own received notifications.",
         )
 
-    orm_notification.read_time = orm.get_current_timestamp_ms()
+    await mark_notification_read(ss, orm_notification)
 
     await db_provider.try_commit(ss)
 
+    # read time is updated in database only, reload it for the response
+    await ss.refresh(orm_notification, ["read_time"])
+
     return orm_notification
 
 
@@ -187,26 +217,32 @@ async def read_all_notifications(
     p: Annotated[bool, Depends(PermissionsChecker({"notification:read_all:self"}))],
     ss: SessionDep,
     user: CurrentUserDep,
+    up_to_notification_id: Annotated[int | None, Body()] = None,
+    up_to_time: Annotated[int | None, Body()] = None,
 ):
     """
     Mark all notifications as read of current signed in user.
 
+    Args
+
+    - `up_to_notification_id` Only mark notifications with id not greater than this
+    - `up_to_time` Only mark notifications created not later than this timestamp
+
+    Pass the newest notification the client has displayed as watermark, so that
+    notifications arrived after that will stay unread.
+
     Return `BulkOpeartionInfo` recording how many notifications has been read
     """
-
     count = gene_sche.BulkOpeartionInfo(operation="Read received notifications")
 
-    # sync function to mark all received notification as read
-    # notice: not sure if there will be any problem that we changing read_time while
-    # iterating `received_notifications`
-    def _mark_all_read(ss):
-        nonlocal count
-        for n in user.received_notifications:
-            if n.read_time is None:
-                n.read_time = orm.get_current_timestamp_ms()
-                count.inc()
-
-    await ss.run_sync(_mark_all_read)
+    count.inc(
+        await mark_all_notifications_read(
+            ss,
+            user.user_id,
+            up_to_notification_id=up_to_notification_id,
+            up_to_time=up_to_time,
+        )
+    )
     await try_commit(ss)
 
     return count
@@ -0,0 +1,39 @@
+from loguru import logger
+from fastapi import APIRouter
+
+from schemes import general as gene_sche
+
+from provider import database as db_provider
+from provider.user import CurrentUserDep
+
+from provider.database import SessionDep
+from exception import error as exc
+
+
+system_router = APIRouter()
+"""API Router of system status related endpoints"""
+
+
+@system_router.get(
+    "/db_pool",
+    response_model=gene_sche.PoolStatusOut,
+    responses=exc.openApiErrorMark({403: "Permission Required"}),
+)
+async def get_db_pool_status(ss: SessionDep, user: CurrentUserDep):
+    """
+    Get live connection pool status of the worker process that handles this request.
+    Only available to admin.
+
+    Notes
+
+    - Each uvicorn worker has its own pool, so the result only reflects one worker
+    - The connection used by this request itself is counted in `checked_out`
+
+    Raises
+
+    - `permission_required`
+    """
+    if not await user.verify_role(ss, ["admin"]):
+        raise exc.PermissionError(message="Only admin could check database pool status")
+
+    return db_provider.get_pool_status()
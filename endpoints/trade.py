@@ -16,7 +16,7 @@ from provider import item as item_provider
 from provider import trade as trade_provider
 from provider.user import CurrentUserDep, CurrentUserOrNoneDep
 
-from provider.database import SessionDep
+from provider.database import SessionDep, ReadSessionDep
 from exception import error as exc
 
 trade_router = APIRouter()
@@ -48,20 +48,16 @@ async def start_transaction(
     - `invalid_item` (404)
     - `no_valid_contact_info` (404)
     - `processing_transaction_limit_exceeded` (400)
+    - `concurrent_trade_operation` (409)
     """
     # get item
     item = await item_provider.get_item_by_id(ss, item_id)
 
-    # check validity
-    await trade_provider.check_validity_to_start_transaction(ss, user, item)
-
-    # start transaction
-    new_transaction = await trade_provider.start_transaction(
-        ss, user, item, skip_check=True
-    )
+    # check validity and start transaction
+    new_transaction = await trade_provider.start_transaction(ss, user, item)
 
-    return await ss.run_sync(
-        lambda _: db_sche.TradeRecordOut.model_validate(new_transaction)
+    return await gene_sche.validated_response(
+        ss, new_transaction, db_sche.TradeRecordOut, exclude_none=True
     )
 
 
@@ -85,32 +81,40 @@ async def accept_transaction(ss: SessionDep, user: CurrentUserDep, trade_id: int
     - `transaction_not_pending` (406)
     - `processing_transaction_exists` (409)
     - `invalid_item` (404)
+    - `concurrent_trade_operation` (409)
     """
     # get trade
     trade = await trade_provider.get_trade_by_id(ss, trade_id)
 
     # validity check
-    await trade_provider.check_validity_to_accept_transaction(ss, user, trade)
+    eligibility = await trade_provider.check_validity_to_accept_transaction(
+        ss, user, trade
+    )
 
     # accept
-    trade = await trade_provider.accpet_transaction(ss, trade)
+    trade = await trade_provider.accpet_transaction(
+        ss, trade, eligibility.item_version
+    )
 
-    return await ss.run_sync(lambda ss: db_sche.TradeRecordOut.model_validate(trade))
+    return await gene_sche.validated_response(
+        ss, trade, db_sche.TradeRecordOut, exclude_none=True
+    )
 
 
 @trade_router.get(
     "/get",
-    response_model=list[db_sche.TradeRecordOut],
+    response_model=gene_sche.PaginatedResultOut[list[db_sche.TradeRecordOut]],
     response_model_exclude_none=True,
 )
 async def get_transactions(
-    ss: SessionDep,
+    ss: ReadSessionDep,
     user: CurrentUserDep,
     pagination: gene_sche.PaginationConfig | None = None,
     filters: GetTransactionsFilters | None = None,
+    count_total: Annotated[bool, Body()] = True,
 ):
     """
-    Get transactions related to current user.
+    Get transactions related to current user, newest first.
 
     This endpoint will return the transaction related to this user, both with
     this user as the seller or buyer of the transaction.
@@ -120,6 +124,9 @@ async def get_transactions(
     - `filter` If none, return all transactions related to current user.
       Else, only return the transactions satisfy the states that `filter`
       refers to. For more info, check out `TradesFilterTypeIn` model.
+    - `pagination` Use default page size if ignored. To use keyset pagination,
+      pass `next_cursor` of last response as `pagination.cursor` to get next page
+    - `count_total` If `False`, `total` is not returned
 
     E.g.:
 
@@ -135,13 +142,16 @@ async def get_transactions(
             filters.states
         )
 
-    transactions = await trade_provider.get_transactions(ss, user, allowed_states)
-
-    def to_pydantic_transactions(ss):
-        out_list = [db_sche.TradeRecordOut.model_validate(t) for t in transactions]
-        return out_list
+    res = await trade_provider.get_transactions(
+        ss, user, allowed_states, pagination=pagination, count_total=count_total
+    )
 
-    return await ss.run_sync(to_pydantic_transactions)
+    return await gene_sche.validated_response(
+        ss,
+        res,
+        gene_sche.PaginatedResultOut[list[db_sche.TradeRecordOut]],
+        exclude_none=True,
+    )
 
 
 @trade_router.post(
@@ -168,7 +178,9 @@ async def cancel_transaction(
         ss, user, trade, cancel_reason=cancel_reason
     )
 
-    return await ss.run_sync(lambda ss: db_sche.TradeRecordOut.model_validate(trade))
+    return await gene_sche.validated_response(
+        ss, trade, db_sche.TradeRecordOut, exclude_none=True
+    )
 
 
 @trade_router.get(
@@ -194,4 +206,6 @@ async def confirm_transaction(ss: SessionDep, user: CurrentUserDep, trade_id: in
     # confirm
     trade = await trade_provider.confirm_transaction(ss, user, trade)
 
-    return await ss.run_sync(lambda ss: db_sche.TradeRecordOut.model_validate(trade))
+    return await gene_sche.validated_response(
+        ss, trade, db_sche.TradeRecordOut, exclude_none=True
+    )
@@ -13,6 +13,7 @@ from schemes import sql as orm
 from provider import user as user_provider
 from provider.user import CurrentUserDep, CurrentUserOrNoneDep
 from provider import database as db_provider
+from provider import job as job_provider
 from provider.database import SessionDep
 from exception import error as exc
 
@@ -181,7 +182,7 @@ async def remove_all_contact_info(ss: SessionDep, user: user_provider.CurrentUse
         raise
 
 
-@user_router.delete("/remove", response_model=List[gene_sche.BulkOpeartionInfo])
+@user_router.delete("/remove", response_model=db_sche.JobOut)
 async def remove_user(ss: SessionDep, user: CurrentUserDep):
     """
     Delete all info of currently signed in user
@@ -190,11 +191,20 @@ async def remove_user(ss: SessionDep, user: CurrentUserDep):
 
     This endpoints will remove ALL info relavant to a user, please make sure
     no miscall to this endpoint.
+
+    The removal runs in background and signs the user out of all sessions, poll
+    `/job/status/token` with the returned `poll_token` to get the result.
     """
     # todo
     # validity check before remove users
     # - have no ongoing transaction
     # - have no any published visible items etc...
 
-    totals = await user_provider.remove_users_cascade(ss, [user])
-    return totals
+    return await job_provider.enqueue_job(
+        ss,
+        "remove_users",
+        {"user_id_list": [user.user_id]},
+        user_id=user.user_id,
+        # the session of requester is gone once the job succeeded
+        with_poll_token=True,
+    )
@@ -0,0 +1,300 @@
+"""
+Check query plans of hot provider queries.
+
+Each case calls provider functions against the business database, every statement
+they execute is captured and explained with `EXPLAIN` (MySQL) or
+`EXPLAIN QUERY PLAN` (SQLite). The check fails if any statement reads a table
+with a full table scan, which usually means an index is missing in `schemes/sql.py`.
+
+Usage
+
+    python explain_check.py
+    python explain_check.py --init-db  # drop and recreate all tables first
+
+Notes
+
+- A few fixture rows are inserted before running the cases. Fixture rows and all
+  writes of the cases are made in one transaction, which is rolled back at the end,
+  so nothing is left in the database. Commits of providers only release savepoints.
+- `--init-db` is refused unless the database is SQLite or `SCRATCH_DB` is set.
+- MySQL may prefer a full scan on tables with only a few rows, run this against a
+  database with realistic data volume when checking MySQL plans.
+"""
+
+import asyncio
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+import fire
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from schemes import sql as orm
+from schemes import general as gene_sche
+
+from provider.database import PrimarySession, get_dialect_name, _engine
+from provider.database import require_scratch_database
+from provider import item as item_provider
+from provider import fav as fav_provider
+from provider import trade as trade_provider
+from provider import notification as notification_provider
+from provider import user as user_provider
+from provider.user.core import get_user_contact_info_count
+
+from tools.query_counter import normalize_statement
+
+# tables that are always small and loaded entirely, full scan is fine
+ALLOWED_FULL_SCAN_TABLES = {"role"}
+
+_sqlite_scan_pattern = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+# derived tables, e.g. union of branches, only hold rows already read by index
+_derived_table_pattern = re.compile(r"^(anon_\d+|<(derived|union)[\d,]+>)$")
+
+
+@dataclass
+class Fixture:
+    seller: orm.User
+    buyer: orm.User
+    item: orm.Item
+    trade: orm.TradeRecord
+
+
+@dataclass
+class FullScan:
+    case: str
+    table: str
+    statement: str
+
+
+@dataclass
+class StatementRecorder:
+    """Capture statements executed by the business engine while `active`"""
+
+    active: bool = False
+    statements: list[tuple[str, Any]] = field(default_factory=list)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.active or executemany:
+            return
+        if statement.lstrip().split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            self.statements.append((statement, parameters))
+
+
+Case = Callable[[Any, Fixture], Awaitable[Any]]
+
+
+def _cases() -> dict[str, Case]:
+    """Provider queries to check, grouped by feature"""
+    keyset = gene_sche.PaginationConfig(keyset=True)
+
+    return {
+        "item.get_user_items": lambda ss, fx: item_provider.get_user_items(
+            ss, fx.seller.user_id, pagination=keyset
+        ),
+        "item.get_user_item_count": lambda ss, fx: item_provider.get_user_item_count(
+            ss, fx.seller.user_id
+        ),
+        "item.search_items": lambda ss, fx: item_provider.search_items(
+            ss, keyword="phone", tag_names=["phone"], price_min=1
+        ),
+        "item.search_items_by_price": lambda ss, fx: item_provider.search_items(
+            ss, sort=gene_sche.ItemSortTypeIn.price_asc
+        ),
+        "item.get_questions_by_item_id": lambda ss, fx: (
+            item_provider.get_questions_by_item_id(ss, fx.item.item_id)
+        ),
+        "item.get_tags_by_names": lambda ss, fx: item_provider.get_tags_by_names(
+            ss, ["phone", "book"]
+        ),
+        "fav.check_if_item_in_fav": lambda ss, fx: fav_provider.check_if_item_in_fav(
+            ss, fx.seller, fx.item.item_id
+        ),
+        "fav.get_fav_items": lambda ss, fx: fav_provider.get_fav_items(ss, fx.buyer),
+        "trade.get_trade_eligibility": lambda ss, fx: (
+            trade_provider.get_trade_eligibility(
+                ss, fx.buyer.user_id, fx.item.item_id
+            )
+        ),
+        "trade.get_transactions": lambda ss, fx: trade_provider.get_transactions(
+            ss, fx.buyer, None, pagination=keyset
+        ),
+        "trade.expire_stale_trades": lambda ss, fx: trade_provider.expire_stale_trades(
+            ss
+        ),
+        "notification.get_notifications": lambda ss, fx: (
+            notification_provider.get_notifications(
+                ss, fx.seller, sent=True, received=True, pagination=keyset
+            )
+        ),
+        "notification.mark_all_notifications_read": lambda ss, fx: (
+            notification_provider.mark_all_notifications_read(ss, fx.seller.user_id)
+        ),
+        "user.get_user_contact_info_count": lambda ss, fx: (
+            get_user_contact_info_count(ss, fx.seller)
+        ),
+        "user.check_is_active_buyer": lambda ss, fx: user_provider.check_is_active_buyer(
+            ss, fx.seller.user_id, fx.buyer.user_id
+        ),
+        "item.get_cascade_item_ids_from_users": lambda ss, fx: (
+            item_provider.get_cascade_item_ids_from_users(ss, [fx.seller.user_id])
+        ),
+        "item.remove_items_cascade_by_ids": lambda ss, fx: (
+            item_provider.remove_items_cascade_by_ids(ss, [fx.item.item_id])
+        ),
+    }
+
+
+def _enable_sqlite_savepoints():
+    """
+    pysqlite driver begins transactions by itself, which breaks `SAVEPOINT`.
+    Let SQLAlchemy emit `BEGIN` instead, check out SQLAlchemy docs of pysqlite.
+    """
+
+    @event.listens_for(_engine.sync_engine, "connect")
+    def _disable_driver_transaction(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(_engine.sync_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+def _case_session(conn: AsyncConnection) -> AsyncSession:
+    """Session joined to the outer transaction of `conn`, commits release a savepoint"""
+    return AsyncSession(
+        bind=conn,
+        expire_on_commit=False,
+        sync_session_class=PrimarySession,
+        join_transaction_mode="create_savepoint",
+    )
+
+
+async def _seed(conn: AsyncConnection) -> Fixture:
+    async with _case_session(conn) as ss:
+        seller = orm.User(username="explain_check_seller")
+        buyer = orm.User(username="explain_check_buyer")
+        tag = orm.Tag(name="explain_check")
+        item = orm.Item(name="phone", description="explain check", price=1)
+        item.association_tags.append(orm.AssociationItemTag(tag=tag))
+        seller.items.append(item)
+        trade = orm.TradeRecord(buyer=buyer, item=item)
+        ss.add_all([seller, buyer, trade])
+        ss.add(orm.AssociationUserFavouriteItem(user=buyer, item=item))
+        ss.add(orm.Notification(sender=buyer, receiver=seller, content={}))
+        await ss.commit()
+        return Fixture(seller=seller, buyer=buyer, item=item, trade=trade)
+
+
+async def _load_fixture(ss: AsyncSession, fixture: Fixture) -> Fixture:
+    """Get fixture instances bound to `ss`"""
+    return Fixture(
+        seller=await ss.get_one(orm.User, fixture.seller.user_id),
+        buyer=await ss.get_one(orm.User, fixture.buyer.user_id),
+        item=await ss.get_one(orm.Item, fixture.item.item_id),
+        trade=await ss.get_one(orm.TradeRecord, fixture.trade.trade_id),
+    )
+
+
+def _full_scan_tables(dialect: str, plan_rows: list[dict]) -> list[str]:
+    tables: list[str] = []
+    for row in plan_rows:
+        if dialect == "mysql":
+            if row.get("type") == "ALL" and row.get("table") is not None:
+                tables.append(row["table"])
+        else:
+            matched = _sqlite_scan_pattern.match(row["detail"])
+            if matched is not None:
+                tables.append(matched.group(1))
+    return [
+        t
+        for t in tables
+        if t not in ALLOWED_FULL_SCAN_TABLES and not _derived_table_pattern.match(t)
+    ]
+
+
+async def _explain(
+    conn: AsyncConnection, statement: str, parameters: Any
+) -> list[dict]:
+    dialect = get_dialect_name()
+    prefix = "EXPLAIN " if dialect == "mysql" else "EXPLAIN QUERY PLAN "
+    res = await conn.exec_driver_sql(prefix + statement, parameters)
+    return [dict(r) for r in res.mappings().all()]
+
+
+async def check(init_db: bool = False) -> list[FullScan]:
+    """
+    Run all cases and return statements that perform a full table scan
+    """
+    if init_db:
+        require_scratch_database("drop and recreate all tables")
+
+        from create_db import init_database
+
+        await init_database()
+
+    dialect = get_dialect_name()
+    if dialect == "sqlite":
+        _enable_sqlite_savepoints()
+
+    recorder = StatementRecorder()
+    event.listen(_engine.sync_engine, "before_cursor_execute", recorder)
+
+    full_scans: list[FullScan] = []
+    explained: set[str] = set()
+    try:
+        async with _engine.connect() as conn:
+            # fixture and all writes of cases are discarded at the end
+            outer_transaction = await conn.begin()
+            try:
+                fixture = await _seed(conn)
+                for name, case in _cases().items():
+                    recorder.statements.clear()
+                    recorder.active = True
+                    try:
+                        async with _case_session(conn) as ss:
+                            await case(ss, await _load_fixture(ss, fixture))
+                    except Exception as e:
+                        # business errors are fine, only plans matter here
+                        logger.debug(f"{name} raised {type(e).__name__}: {e}")
+                    finally:
+                        recorder.active = False
+
+                    for statement, parameters in list(recorder.statements):
+                        shape = normalize_statement(statement)
+                        if shape in explained:
+                            continue
+                        explained.add(shape)
+
+                        rows = await _explain(conn, statement, parameters)
+                        for table in _full_scan_tables(dialect, rows):
+                            full_scans.append(FullScan(name, table, shape))
+            finally:
+                await outer_transaction.rollback()
+    finally:
+        event.remove(_engine.sync_engine, "before_cursor_execute", recorder)
+        await _engine.dispose()
+
+    logger.info(f"Explained {len(explained)} statements on {dialect}")
+    return full_scans
+
+
+def main(init_db: bool = False):
+    full_scans = asyncio.run(check(init_db))
+
+    for s in full_scans:
+        logger.error(f"[{s.case}] full scan on table `{s.table}`: {s.statement}")
+
+    if len(full_scans) > 0:
+        logger.error(f"{len(full_scans)} full table scans found")
+        sys.exit(1)
+
+    logger.success("No full table scan found")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -1,7 +1,9 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.requests import Request
 from fastapi.exceptions import HTTPException, RequestValidationError
 from fastapi.exception_handlers import http_exception_handler
@@ -18,6 +20,7 @@ import uvicorn
 from loguru import logger
 
 from exception.error import BaseError, BaseErrorOut, InternalServerError
+from tools.query_counter import QueryCounterMiddleware
 
 import config
 
@@ -28,6 +31,12 @@ from endpoints.item import item_router
 from endpoints.fav import fav_router
 from endpoints.trade import trade_router
 from endpoints.notification import notification_router
+from endpoints.system import system_router
+from endpoints.job import job_router
+
+from provider.job import job_runner
+from provider.item import build_tag_suggestion_index, build_item_search_index
+from provider.database import session_manager
 
 # CORS Middleware
 middlewares = [
@@ -44,8 +53,47 @@ middlewares = [
     ),
 ]
 
+# count SQL statements and DB time of each request
+if config.sql.QUERY_COUNTER_ENABLED:
+    middlewares.append(
+        Middleware(
+            QueryCounterMiddleware,
+            n_plus_one_threshold=config.sql.N_PLUS_ONE_THRESHOLD,
+        )
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # build in-memory tag autocomplete index
+    try:
+        async with session_manager() as ss:
+            count = await build_tag_suggestion_index(ss)
+        logger.info(f"Tag suggestion index built with {count} tags")
+    except Exception as e:
+        logger.warning(f"Failed to build tag suggestion index: {e}")
+
+    # build in-memory catalog keyword index, only when no full-text index available
+    try:
+        async with session_manager() as ss:
+            count = await build_item_search_index(ss)
+        logger.info(f"Item search index built with {count} items")
+    except Exception as e:
+        logger.warning(f"Failed to build item search index: {e}")
+
+    # execute background jobs in this process
+    if config.general.JOB_RUNNER_ENABLED:
+        job_runner.start()
+    yield
+    await job_runner.stop()
+
+
 # include sub routers
-app = FastAPI(middleware=middlewares)
+# responses not built by endpoints themselves are serialized with orjson,
+# check out `gene_sche.json_response()` for pre-validated results
+app = FastAPI(
+    middleware=middlewares, lifespan=lifespan, default_response_class=ORJSONResponse
+)
 app.include_router(token_router, tags=["Token"])
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/user", tags=["User"])
@@ -53,6 +101,8 @@ app.include_router(item_router, prefix="/item", tags=["Item"])
 app.include_router(fav_router, prefix="/fav", tags=["Favourite"])
 app.include_router(trade_router, prefix="/trade", tags=["Trade"])
 app.include_router(notification_router, prefix="/notification", tags=["Notification"])
+app.include_router(system_router, prefix="/system", tags=["System"])
+app.include_router(job_router, prefix="/job", tags=["Job"])
 
 # mount static files
 app.mount("/assets", StaticFiles(directory="assets"), name="assets")
@@ -1,22 +1,25 @@
-from typing import Sequence, Annotated, Set
+from typing import Sequence, Annotated, Set, Collection
 
 from loguru import logger
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload, Session
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import selectinload, Session, object_session
 from sqlalchemy.sql import and_
 from sqlalchemy import exc as sqlexc
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi import Body, Depends
 
 from config import rbac as rbac_config
+from config import auth as auth_conf
 
 from schemes import sql as orm
-from .database import init_session_maker, session_maker, SessionDep
+from .database import init_session_maker, session_maker, SessionDep, PrimarySession
 from .user.core import CurrentUserDep, CurrentUserOrNoneDep
 
 from exception import error as exc
 
 from tools import rbac_manager as rbac
+from tools.ttl_cache import TTLCache
 
 # make sure session has already been initialized
 init_session_maker()
@@ -31,6 +34,84 @@ Should not be used directly.
 """
 
 
+_role_cache = TTLCache[int, frozenset[str]](
+    ttl_s=auth_conf.ROLE_CACHE_TTL_SECONDS,
+    max_size=auth_conf.USER_CACHE_MAX_SIZE,
+)
+"""
+Cross-request cache of role names of users, `user_id -> role names`
+
+Invalidated automatically when `AssociationUserRole` rows changed through ORM.
+For bulk `UPDATE` statements, call `mark_roles_changed()` manually.
+"""
+
+
+def invalidate_role_cache(user_ids: Collection[int]) -> None:
+    """
+    Remove cached role names of users from current role cache
+    """
+    for user_id in user_ids:
+        _role_cache.pop(user_id)
+
+
+def mark_roles_changed(ss: Session | AsyncSession, user_ids: Collection[int]) -> None:
+    """
+    Record users whose roles changed in `ss`, their cached role names will be
+    invalidated once `ss` commits.
+
+    Called automatically for ORM changes of `AssociationUserRole`, bulk `UPDATE`
+    statements should call this function manually.
+    """
+    changed: set[int] = ss.info.setdefault("role_changed_user_ids", set())
+    memo: dict[int, frozenset[str]] = ss.info.get("role_names", {})
+    for user_id in user_ids:
+        changed.add(user_id)
+        # drop request-scoped memo, so that following checks see the change
+        memo.pop(user_id, None)
+
+
+@event.listens_for(orm.AssociationUserRole, "after_insert")
+@event.listens_for(orm.AssociationUserRole, "after_update")
+@event.listens_for(orm.AssociationUserRole, "after_delete")
+def _mark_role_changed(mapper, connection, target: orm.AssociationUserRole):
+    ss = object_session(target)
+    if ss is None:
+        return
+
+    mark_roles_changed(ss, [target.user_id])
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _invalidate_committed_role_changes(ss: Session):
+    invalidate_role_cache(ss.info.pop("role_changed_user_ids", set()))
+
+
+async def get_user_role_names(ss: SessionDep, user_id: int) -> frozenset[str]:
+    """
+    Return names of roles of a user, with at most one query.
+
+    Result is memorized in `ss.info` for the rest of the request, and cached
+    across requests in `_role_cache`.
+    """
+    memo: dict[int, frozenset[str]] = ss.info.setdefault("role_names", {})
+    if user_id in memo:
+        return memo[user_id]
+
+    role_names = _role_cache.get(user_id)
+    if role_names is None:
+        stmt = (
+            select(orm.Role.role_name)
+            .join(orm.Role.association_users)
+            .where(orm.AssociationUserRole.user_id == user_id)
+            .where(orm.AssociationUserRole.deleted_at == None)
+        )
+        role_names = frozenset((await ss.scalars(stmt)).all())
+        _role_cache.set(user_id, role_names)
+
+    memo[user_id] = role_names
+    return role_names
+
+
 async def get_user_by_user_id(session: SessionDep, user_id: int):
     """
     Get user from database by user_id
@@ -124,20 +205,12 @@ async def check_user_permission(
     """
     role_set = set()
 
-    # get user role set if user logged in
+    # get user role set if user logged in,
+    # also attach SIGNED_IN_ROLE in config if exists
     if user is not None:
-
-        def get_role_set(ss: Session):
-            """
-            Return name list of the role that this user have,
-            also attach SIGNED_IN_ROLE in config if exists
-            """
-            ret_set = set(user.role_name_list)
-            if rbac_config.SIGNED_IN_ROLE is not None:
-                ret_set.add(rbac_config.SIGNED_IN_ROLE)
-            return ret_set
-
-        role_set = await ss.run_sync(get_role_set)
+        role_set = set(await get_user_role_names(ss, user.user_id))
+        if rbac_config.SIGNED_IN_ROLE is not None:
+            role_set.add(rbac_config.SIGNED_IN_ROLE)
 
     # else use guest role
     elif rbac_config.GUEST_ROLE is not None:
@@ -1,28 +1,347 @@
 import time
 from contextlib import asynccontextmanager
-from typing import Annotated
+from typing import Annotated, Hashable
 
 from loguru import logger
 from fastapi import Depends
+from pydantic import BaseModel
 
-from sqlalchemy import Select, select
+from sqlalchemy import Select, select, update, event
+from sqlalchemy.sql import ColumnElement
 from sqlalchemy.orm import MappedColumn, selectinload, QueryableAttribute, Session
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm.interfaces import LoaderOption
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+    AsyncEngine,
+)
 
 from config import sql
+from config import general as gene_config
+
+from schemes import general as gene_sche
+from schemes import sql as orm
+from schemes.sql import SQLBaseModel, get_current_timestamp_ms
+
+from tools.query_counter import instrument_engine
+
+
+class PoolProfile(BaseModel):
+    """
+    Connection pool settings used by `create_engine_from_config()`
+
+    Fields
+
+    - `pool_size` Connections kept open in the pool of each worker process
+    - `max_overflow` Extra connections allowed when the pool is exhausted
+    - `pool_timeout` Seconds to wait for a connection before giving up
+    - `pool_recycle` Seconds after which a connection will be recycled, should be
+      lower than the `wait_timeout` of MySQL server
+    - `pool_pre_ping` Test connection liveness before checkout
+    - `query_cache_size` Size of SQLAlchemy compiled statement cache
+
+    Notes
+
+    Every uvicorn worker owns its own pool, so the max connections one deployment could
+    open is `workers * (pool_size + max_overflow)`, which should stay below the
+    `max_connections` of the MySQL server.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    query_cache_size: int = 500
+
+
+POOL_PROFILES: dict[str, PoolProfile] = {
+    "dev": PoolProfile(pool_size=5, max_overflow=5),
+    "production": PoolProfile(
+        pool_size=10,
+        max_overflow=20,
+        pool_recycle=1800,
+        query_cache_size=1200,
+    ),
+    "load_test": PoolProfile(
+        pool_size=20,
+        max_overflow=0,
+        pool_timeout=10,
+        pool_pre_ping=False,
+        query_cache_size=1200,
+    ),
+}
+"""
+Preset pool profiles, selected by `POOL_PROFILE` in `config/sql.py`
+"""
+
+
+def get_pool_profile(profile: str | PoolProfile | None = None) -> PoolProfile:
+    """
+    Resolve the pool profile used to create engine
+
+    - `profile` Name of a preset in `POOL_PROFILES` or a `PoolProfile` instance.
+      If `None`, use `POOL_PROFILE` in config, or choose `dev`/`production` by
+      current environment if config is also `None`
+
+    `POOL_OVERRIDES` in config will always be applied on the resolved profile.
+    """
+    if profile is None:
+        profile = sql.POOL_PROFILE
+    if profile is None:
+        profile = "dev" if gene_config.is_dev() else "production"
+
+    if isinstance(profile, str):
+        try:
+            profile = POOL_PROFILES[profile]
+        except KeyError:
+            raise ValueError(
+                f"Unknown pool profile: '{profile}', "
+                f"available profiles: {list(POOL_PROFILES.keys())}"
+            )
+
+    return profile.model_copy(update=sql.POOL_OVERRIDES)
+
+
+def get_database_url(driver: str | None = None, host: str | None = None) -> str:
+    """
+    Return the database URL of business database based on config
+
+    - `driver` `mysql` or `sqlite`, use `DB_DRIVER` in config if `None`
+    - `host` MySQL host, use `DB_HOST` in config if `None`
+    """
+    driver = driver or sql.DB_DRIVER
+    host = host or sql.DB_HOST
+
+    if driver == "mysql":
+        return (
+            f"mysql+aiomysql://"
+            f"{sql.DB_USERNAME}:{sql.DB_PASSWORD}"
+            f"@{host}/{sql.DB_NAME}"
+        )
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite:///{sql.SQLITE_PATH}"
+
+    raise ValueError(f"Unsupported database driver: '{driver}'")
+
+
+def create_engine_from_config(
+    profile: str | PoolProfile | None = None,
+    driver: str | None = None,
+    url: str | None = None,
+) -> AsyncEngine:
+    """
+    Create a new async engine with the pool settings of a profile
+
+    Args
+
+    - `profile` Check out `get_pool_profile()`
+    - `driver` Check out `get_database_url()`
+    - `url` Use this database URL directly instead of the one generated from config
 
-_engine = create_async_engine(
-    f"mysql+aiomysql://"
-    f"{sql.DB_USERNAME}:{sql.DB_PASSWORD}"
-    f"@{sql.DB_HOST}/{sql.DB_NAME}",
-    echo=sql.ENGINE_ECHO,
+    Notes
+
+    The SQLite stand-in (`aiosqlite`) uses `NullPool` by default, here we force a
+    queue pool on it so that the pool behaves the same as on MySQL in load tests.
+    """
+    pool_profile = get_pool_profile(profile)
+    url = url or get_database_url(driver)
+
+    engine_kwargs = {}
+    if url.startswith("sqlite"):
+        engine_kwargs["poolclass"] = AsyncAdaptedQueuePool
+
+    engine = create_async_engine(
+        url,
+        echo=sql.ENGINE_ECHO,
+        **pool_profile.model_dump(),
+        **engine_kwargs,
+    )
+
+    logger.info(
+        f"Database engine created. Dialect: {engine.dialect.name}, "
+        f"pool: {pool_profile.model_dump()}"
+    )
+
+    return engine
+
+
+_engine = create_engine_from_config()
+
+# engine of the read replica, fallback to primary engine if no replica configured
+_read_engine = (
+    create_engine_from_config(url=get_database_url(host=sql.REPLICA_DB_HOST))
+    if sql.REPLICA_DB_HOST is not None
+    else _engine
 )
 
+# count statements per request, check out QueryCounterMiddleware
+if sql.QUERY_COUNTER_ENABLED:
+    instrument_engine(_engine)
+    instrument_engine(_read_engine)
+
+
+def get_dialect_name() -> str:
+    """Return dialect name of business database, e.g. `mysql`, `sqlite`"""
+    return _engine.dialect.name
+
+
+def require_scratch_database(operation: str):
+    """
+    Raise `RuntimeError` unless the business database is disposable, that is
+    SQLite, or `SCRATCH_DB` is set in `config/sql.py`
+
+    Used by scripts that write fixture rows or drop tables, `operation` describes
+    what the script is about to do.
+    """
+    if get_dialect_name() == "sqlite" or sql.SCRATCH_DB:
+        return
+
+    raise RuntimeError(
+        f"Refuse to {operation} on {get_dialect_name()} database '{sql.DB_NAME}', "
+        "use SQLite or set SCRATCH_DB in config/sql.py if it is a scratch database"
+    )
+
+
+def get_pool_status(engine: AsyncEngine | None = None) -> gene_sche.PoolStatusOut:
+    """
+    Return the live checkout/overflow counts of the pool of `engine`,
+    default to the business database engine
+    """
+    pool = (engine or _engine).pool
+    if not isinstance(pool, QueuePool):
+        raise TypeError(f"Could not get status of pool with type: {type(pool)}")
+
+    return gene_sche.PoolStatusOut(
+        size=pool.size(),
+        checked_in=pool.checkedin(),
+        checked_out=pool.checkedout(),
+        overflow=pool.overflow(),
+        max_overflow=pool._max_overflow,
+    )
+
+
+ROUTING_KEY = "routing_key"
+"""
+Key in `Session.info` storing the identity (`user_id`) of whom is using the session.
+
+Set by `get_current_user()`, used by `ReadRoutingPolicy` to provide read-your-writes guarantee.
+"""
+
+
+class ReadRoutingPolicy:
+    """
+    Decide which engine a read-only session should use.
+
+    Reads are sent to replica by default. Once a user committed some writes on primary,
+    reads of the same user will be sent to primary within `window_ms`, so that
+    the user could always read their own writes despite the replication lag.
+
+    Notes
+
+    Write records are kept in the memory of current worker process.
+    """
+
+    def __init__(self, window_ms: int) -> None:
+        self.window_ms = window_ms
+        self._last_write_ms: dict[Hashable, int] = {}
+
+    def record_write(self, key: Hashable) -> None:
+        """Record that `key` just committed writes on primary"""
+        now = get_current_timestamp_ms()
+        self._last_write_ms[key] = now
+
+        # drop expired records to avoid unbounded growth
+        if len(self._last_write_ms) > 10000:
+            self._last_write_ms = {
+                k: t for k, t in self._last_write_ms.items() if now - t <= self.window_ms
+            }
+
+    def use_primary(self, key: Hashable | None) -> bool:
+        """Return `True` if reads of `key` should be sent to primary"""
+        if key is None:
+            return False
+
+        last_write = self._last_write_ms.get(key)
+        if last_write is None:
+            return False
+
+        if get_current_timestamp_ms() - last_write > self.window_ms:
+            self._last_write_ms.pop(key, None)
+            return False
+
+        return True
+
+
+routing_policy = ReadRoutingPolicy(sql.READ_YOUR_WRITES_WINDOW_MS)
+
+
+class PrimarySession(Session):
+    """
+    Sync session class of sessions bound to the primary engine.
+
+    Commits containing writes are reported to `routing_policy`
+    """
+
+
+class ReadOnlySession(Session):
+    """
+    Sync session class of read-only sessions, check out `get_read_session()`
+
+    Engine is chosen per statement by `routing_policy`, based on the routing key
+    of the primary session of the same request, which is stored in
+    `info["primary_info"]`.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary_info = self.info.get("primary_info", {})
+        if routing_policy.use_primary(primary_info.get(ROUTING_KEY)):
+            return _engine.sync_engine
+        return _read_engine.sync_engine
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _mark_flushed_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _mark_bulk_writes(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _record_committed_writes(session):
+    if session.info.pop("has_writes", False) and ROUTING_KEY in session.info:
+        routing_policy.record_write(session.info[ROUTING_KEY])
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_rollback_writes(session):
+    session.info.pop("has_writes", None)
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_read_only_writes(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        raise RuntimeError("Could not write through a read-only session")
+
+
 # async version session maker
 # call get_session_maker() before use this instance
 session_maker: async_sessionmaker[AsyncSession] | None = async_sessionmaker[
     AsyncSession
-](_engine, expire_on_commit=False)
+](_engine, expire_on_commit=False, sync_session_class=PrimarySession)
+
+read_session_maker = async_sessionmaker[AsyncSession](
+    expire_on_commit=False, sync_session_class=ReadOnlySession
+)
+"""
+Session maker of read-only sessions, engine is determined by `ReadOnlySession.get_bind()`
+"""
 
 
 def init_session_maker(force_create: bool = False):
@@ -37,7 +356,7 @@ def init_session_maker(force_create: bool = False):
     if (session_maker is None) or force_create:
         logger.info("Session maker initializing...")
         session_maker = async_sessionmaker[AsyncSession](
-            _engine, expire_on_commit=False
+            _engine, expire_on_commit=False, sync_session_class=PrimarySession
         )
         logger.success("Session maker initialized")
     else:
@@ -74,6 +393,30 @@ def add_eager_load_to_stmt(stmt: Select, attr_list: list[QueryableAttribute]):
     return stmt
 
 
+# Loader option profiles
+#
+# Relations needed to validate an output schema from ORM instances, apply them with
+# `stmt.options(*PROFILE)` so validation triggers no lazy load. Each `selectinload`
+# adds one query for the whole result, regardless of how many rows are loaded.
+
+ITEM_OUT_LOAD: tuple[LoaderOption, ...] = (
+    selectinload(orm.Item.association_tags).selectinload(orm.AssociationItemTag.tag),
+)
+"""
+Loader options to validate `db_sche.ItemOut` from `orm.Item`
+"""
+
+TRADE_OUT_LOAD: tuple[LoaderOption, ...] = (
+    selectinload(orm.TradeRecord.buyer),
+    selectinload(orm.TradeRecord.item)
+    .selectinload(orm.Item.association_tags)
+    .selectinload(orm.AssociationItemTag.tag),
+)
+"""
+Loader options to validate `db_sche.TradeRecordOut` from `orm.TradeRecord`
+"""
+
+
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
 """SessionDep type annotation which could be used in FastAPI function
 
@@ -86,6 +429,32 @@ Examples:
 """
 
 
+async def get_read_session(primary_ss: SessionDep):
+    """
+    Get a new read-only session, which sends queries to read replica when possible
+
+    The primary session of the same request is used to find out who is requesting,
+    check out `ReadRoutingPolicy` for more info.
+
+    Notes
+
+    - Do not write with this session, flushing any change will raise `RuntimeError`
+    - ORM instances loaded by this session are not bound to the primary session
+    """
+    async with read_session_maker(info={"primary_info": primary_ss.info}) as session:
+        yield session
+    logger.debug("Read-only session closed")
+
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+"""
+Similar to `SessionDep`, but with a read-only session. Use it in read-heavy endpoints
+to offload queries from primary database.
+
+Check out `get_read_session()` for more info.
+"""
+
+
 async def try_commit(ss: SessionDep):
     """
     Try commit the current session and return None.
@@ -103,3 +472,45 @@ async def try_commit(ss: SessionDep):
     except:
         await ss.rollback()
         raise
+
+
+async def bulk_soft_delete(
+    ss: AsyncSession,
+    entity: type[SQLBaseModel],
+    *criteria: ColumnElement[bool],
+    operation: str | None = None,
+) -> gene_sche.BulkOpeartionInfo:
+    """
+    Soft delete all rows of `entity` matching `criteria` with a single
+    `UPDATE ... SET deleted_at=? WHERE ...` statement, return `BulkOpeartionInfo`
+    with the affected rows count.
+
+    Already deleted rows are excluded. Rows are never loaded into session,
+    instances already in the identity map are synchronized.
+
+    Changes are not committed.
+
+    Usage
+
+        await bulk_soft_delete(
+            ss,
+            orm.Question,
+            orm.Question.item_id.in_(item_id_list),
+            operation="Delete questions",
+        )
+
+    Notes
+
+    ORM events like `after_update` are NOT triggered for bulk updated rows,
+    callers should invalidate related caches by themselves.
+    """
+    count = gene_sche.BulkOpeartionInfo(operation=operation)
+
+    res = await ss.execute(
+        update(entity)
+        .where(*criteria, entity.deleted_at == None)
+        .values(deleted_at=get_current_timestamp_ms())
+    )
+    count.inc(res.rowcount)
+
+    return count
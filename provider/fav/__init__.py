@@ -1,4 +1,9 @@
 from .core import (
+    get_fav_item_count,
+    change_fav_item_counts,
+    change_item_fav_counts,
+    insert_fav_association,
+    remove_fav_associations,
     remove_fav_items_of_user,
     get_cascade_fav_items_by_items,
     remove_fav_items_cascade,
@@ -8,4 +13,6 @@ from .basic import (
     check_if_item_in_fav,
     get_fav_items,
     add_fav_item,
+    get_faved_item_ids,
+    mark_faved_items,
 )
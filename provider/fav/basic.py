@@ -25,6 +25,7 @@ from schemes import general as gene_sche
 from ..database import init_session_maker, session_maker, SessionDep, try_commit
 from ..user.core import CurrentUserDep, CurrentUserOrNoneDep, get_user_from_user_id
 from ..item.core import get_item_by_id
+from .core import insert_fav_association, change_item_fav_counts
 
 from exception import error as exc
 
@@ -73,30 +74,83 @@ async def add_fav_item(ss: SessionDep, user: orm.User, item_id: int) -> orm.Item
     """
     Add an item to user's favourite, then return the item orm instance
 
+    Duplication and the favourite limit are both decided by single atomic
+    statements, fav items of user are never loaded.
+
     Raises
 
     - `fav_items_limit_exceeded` (400) (LimitExceededError)
     - `item_already_in_fav` (409) (DuplicatedError)
     """
+    user_id = user.user_id
+
     # get item
     item = await get_item_by_id(ss, item_id)
 
-    # check duplication
-    await check_if_item_in_fav(ss, user, item_id)
-
-    # get user fav items
-    user_fav_count: int = await ss.run_sync(lambda ss: len(user.fav_items))
+    # add item to user's fav, duplication is checked by unique constraint
+    if not await insert_fav_association(ss, user_id, item_id):
+        raise exc.DuplicatedError(
+            name="item_already_in_fav",
+            message=f"Item with id: {item_id} already in the favourite list of user with id: {user_id}",
+        )
 
-    # check fav item count max limit
-    if user_fav_count >= sys_conf.MAX_USER_FAV_ITEMS:
+    # increase fav count only if max limit not reached
+    res = await ss.execute(
+        update(orm.User)
+        .where(
+            orm.User.user_id == user_id,
+            orm.User.fav_item_count < sys_conf.MAX_USER_FAV_ITEMS,
+        )
+        .values(fav_item_count=orm.User.fav_item_count + 1)
+    )
+    if res.rowcount != 1:
+        await ss.rollback()
         raise exc.LimitExceededError(
             name="fav_items_limit_exceeded",
-            message=f"User with id: {user.user_id} has reached the maximum favourite item count: {sys_conf.MAX_USER_FAV_ITEMS}",
+            message=f"User with id: {user_id} has reached the maximum favourite item count: {sys_conf.MAX_USER_FAV_ITEMS}",
         )
 
-    # add item to user's fav
-    user.fav_items.append(item)
+    await change_item_fav_counts(ss, {item_id: 1})
 
     await try_commit(ss)
 
+    # counter is updated in database only, reload it for the returned item
+    await ss.refresh(item, ["fav_count"])
+
     return item
+
+
+async def get_faved_item_ids(
+    ss: SessionDep, user_id: int, item_id_list: Sequence[int]
+) -> set[int]:
+    """
+    Return ids of items in `item_id_list` that are favourited by the user,
+    with a single `IN` query
+    """
+    if len(item_id_list) == 0:
+        return set()
+
+    stmt = select(orm.AssociationUserFavouriteItem.item_id).where(
+        orm.AssociationUserFavouriteItem.user_id == user_id,
+        orm.AssociationUserFavouriteItem.item_id.in_(set(item_id_list)),
+    )
+    return set((await ss.scalars(stmt)).all())
+
+
+async def mark_faved_items(
+    ss: SessionDep, user: orm.User | None, items: Sequence[db_sche.ItemOut]
+) -> Sequence[db_sche.ItemOut]:
+    """
+    Set `faved_by_me` of each item for the user in place, then return the items.
+
+    Nothing is changed if `user` is `None`, so `faved_by_me` stays `None` for
+    anonymous requests.
+    """
+    if user is None:
+        return items
+
+    faved = await get_faved_item_ids(ss, user.user_id, [i.item_id for i in items])
+    for i in items:
+        i.faved_by_me = i.item_id in faved
+
+    return items
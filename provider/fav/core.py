@@ -1,22 +1,162 @@
 import time
 
-from typing import Annotated, cast, List, Sequence
+from collections import Counter
+from typing import Annotated, cast, List, Mapping, Sequence
 
 from loguru import logger
-from sqlalchemy import select, update, func, Column, distinct, or_
-from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
-from sqlalchemy.sql import and_
+from sqlalchemy import select, update, insert, func, case, Column, distinct, or_
+from sqlalchemy.orm import selectinload, QueryableAttribute, InstrumentedAttribute, aliased
+from sqlalchemy.sql import and_, ColumnElement
 from sqlalchemy import exc as sqlexc
 
 
 from schemes import sql as orm
 from schemes import general as gene_sche
 
-from ..database import SessionDep, try_commit
+from ..database import SessionDep, try_commit, bulk_soft_delete
 
 from exception import error as exc
 
 
+async def get_fav_item_count(ss: SessionDep, user_id: int) -> int:
+    """
+    Get favourite items count of a user from the denormalized counter,
+    the association table will not be touched.
+    """
+    count = await ss.scalar(
+        select(orm.User.fav_item_count).where(orm.User.user_id == user_id)
+    )
+    if count is None:
+        raise exc.NoResultError(message=f"Could not found user with id: {user_id}")
+
+    return count
+
+
+async def _change_counters(
+    ss: SessionDep,
+    counter_col: InstrumentedAttribute[int],
+    key_col: InstrumentedAttribute[int],
+    deltas: Mapping[int, int],
+) -> None:
+    deltas = {key: d for key, d in deltas.items() if d != 0}
+    if len(deltas) == 0:
+        return
+
+    await ss.execute(
+        update(key_col.class_)
+        .where(key_col.in_(deltas))
+        .values({counter_col.key: counter_col + case(deltas, value=key_col, else_=0)})
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def change_fav_item_counts(ss: SessionDep, deltas: Mapping[int, int]) -> None:
+    """
+    Atomically add delta to the fav item counter of each user, with a single
+    `UPDATE` statement.
+
+    - `deltas` Mapping of `user_id -> delta`
+
+    Changes are not committed.
+    """
+    await _change_counters(ss, orm.User.fav_item_count, orm.User.user_id, deltas)
+
+
+async def change_item_fav_counts(ss: SessionDep, deltas: Mapping[int, int]) -> None:
+    """
+    Same as `change_fav_item_counts()`, but for `Item.fav_count`
+
+    - `deltas` Mapping of `item_id -> delta`
+    """
+    await _change_counters(ss, orm.Item.fav_count, orm.Item.item_id, deltas)
+
+
+async def insert_fav_association(ss: SessionDep, user_id: int, item_id: int) -> bool:
+    """
+    Add an item to user's favourite, return `False` if the item is already in it.
+
+    The unique constraint of `(user_id, item_id)` decides duplication, so this is
+    safe under concurrent requests. A soft deleted association of the same pair is
+    restored instead of inserting a new row.
+
+    Changes are not committed. Fav counters are not changed.
+    """
+    values = dict(
+        user_id=user_id, item_id=item_id, created_at=orm.get_current_timestamp_ms()
+    )
+
+    # usually the pair never existed, only one statement needed
+    res = await ss.execute(
+        insert(orm.AssociationUserFavouriteItem)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .values(**values)
+    )
+    if res.rowcount == 1:
+        return True
+
+    # restore the soft deleted one
+    res = await ss.execute(
+        update(orm.AssociationUserFavouriteItem)
+        .where(
+            orm.AssociationUserFavouriteItem.user_id == user_id,
+            orm.AssociationUserFavouriteItem.item_id == item_id,
+            orm.AssociationUserFavouriteItem.deleted_at != None,
+        )
+        .values(deleted_at=None, created_at=values["created_at"])
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount == 1
+
+
+async def remove_fav_associations(
+    ss: SessionDep,
+    *criteria: ColumnElement[bool],
+    operation: str | None = None,
+) -> gene_sche.BulkOpeartionInfo:
+    """
+    Soft delete fav associations matching `criteria`, and decrease fav counters
+    of related users and items, return `BulkOpeartionInfo`
+
+    Matched rows are locked while counting, so the counters stay consistent with
+    concurrent removals.
+
+    Changes are not committed.
+    """
+    rows = (
+        await ss.execute(
+            select(
+                orm.AssociationUserFavouriteItem.association_user_favourite_item_id,
+                orm.AssociationUserFavouriteItem.user_id,
+                orm.AssociationUserFavouriteItem.item_id,
+            )
+            .where(*criteria)
+            .with_for_update()
+        )
+    ).all()
+
+    if len(rows) == 0:
+        return gene_sche.BulkOpeartionInfo(operation=operation)
+
+    count = await bulk_soft_delete(
+        ss,
+        orm.AssociationUserFavouriteItem,
+        orm.AssociationUserFavouriteItem.association_user_favourite_item_id.in_(
+            [r[0] for r in rows]
+        ),
+        operation=operation,
+    )
+
+    await change_fav_item_counts(
+        ss, {user_id: -c for user_id, c in Counter(r[1] for r in rows).items()}
+    )
+    await change_item_fav_counts(
+        ss, {item_id: -c for item_id, c in Counter(r[2] for r in rows).items()}
+    )
+
+    return count
+
+
 async def remove_fav_items_of_user(
     ss: SessionDep, user: orm.User, item_id_list: Sequence[int] | None
 ) -> gene_sche.BulkOpeartionInfo:
@@ -28,20 +168,15 @@ async def remove_fav_items_of_user(
     - `item_id_list` If `None`, will remove all fav items from this user,
       else only remove items which's `item_id` in list
     """
-    stmt = select(orm.AssociationUserFavouriteItem).where(
-        orm.AssociationUserFavouriteItem.user_id == user.user_id,
-    )
+    criteria = [orm.AssociationUserFavouriteItem.user_id == user.user_id]
 
     if item_id_list is not None:
-        stmt = stmt.where(orm.AssociationUserFavouriteItem.item_id.in_(item_id_list))
-
-    item_asso_to_remove = (await ss.scalars(stmt)).all()
+        criteria.append(orm.AssociationUserFavouriteItem.item_id.in_(item_id_list))
 
     # remove fav items
-    bulk_count = gene_sche.BulkOpeartionInfo(operation="Delete fav items")
-    for i_asso in item_asso_to_remove:
-        i_asso.delete()  # soft delete
-        bulk_count.inc()
+    bulk_count = await remove_fav_associations(
+        ss, *criteria, operation="Delete fav items"
+    )
 
     await try_commit(ss)
 
@@ -72,11 +207,13 @@ async def remove_fav_items_cascade(
     associations: Sequence[orm.AssociationUserFavouriteItem],
     commit: bool = True,
 ) -> list[gene_sche.BulkOpeartionInfo]:
-    count = gene_sche.BulkOpeartionInfo(operation="Remove user-fav-item associations")
-
-    for a in associations:
-        count.inc()
-        a.delete()
+    count = await remove_fav_associations(
+        ss,
+        orm.AssociationUserFavouriteItem.association_user_favourite_item_id.in_(
+            [a.association_user_favourite_item_id for a in associations]
+        ),
+        operation="Remove user-fav-item associations",
+    )
 
     if commit:
         await try_commit(ss)
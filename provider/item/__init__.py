@@ -1,4 +1,5 @@
 from .core import *
+from .search import *
 
 from .basic import (
     get_user_item_count,
@@ -12,7 +13,10 @@ from .basic import (
     get_question_by_id,
     check_question_belongs_to_user,
     answer_question,
+    normalize_tag_name,
     get_tags_by_names,
     add_tags_if_not_exists,
     remove_tags_of_item,
+    build_tag_suggestion_index,
+    suggest_tags,
 )
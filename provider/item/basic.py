@@ -3,8 +3,9 @@ import time
 from typing import Annotated, cast, List, Sequence
 
 from loguru import logger
-from sqlalchemy import select, update, func, Column, distinct, or_
-from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
+from sqlalchemy import select, update, insert, func, Column, distinct, or_, event
+from sqlalchemy.orm import selectinload, QueryableAttribute, aliased, Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import and_
 from sqlalchemy import exc as sqlexc
 
@@ -17,14 +18,20 @@ from schemes import db as db_sche
 from schemes import general as gene_sche
 
 from ..database import init_session_maker, session_maker, SessionDep, try_commit
+from ..database import PrimarySession
+from ..database import bulk_soft_delete, ITEM_OUT_LOAD
 from ..user.core import CurrentUserDep, CurrentUserOrNoneDep, get_user_from_user_id
 from ..fav.core import get_cascade_fav_items_by_items, remove_fav_items_cascade
 
 from .core import *
+from .search import index_item_text
 
 
 from exception import error as exc
 
+from tools.ttl_cache import TTLCache
+from tools.prefix_index import PrefixIndex
+
 init_session_maker()
 
 __all__ = [
@@ -37,13 +44,93 @@ __all__ = [
     "get_question_by_id",
     "check_question_belongs_to_user",
     "answer_question",
+    "normalize_tag_name",
     "get_tags_by_names",
     "add_tags_if_not_exists",
     "remove_tags_of_item",
     "get_user_items",
+    "build_tag_suggestion_index",
+    "suggest_tags",
 ]
 
 
+_tag_id_cache = TTLCache[str, int](ttl_s=3600, max_size=50000)
+"""
+Cache of tags known to exist, `normalized tag name -> tag_id`
+
+Tags are never renamed or deleted, so the cache is only used to skip inserting
+existing tags. Stale entries are detected and dropped in `add_tags_if_not_exists()`.
+"""
+
+
+_tag_suggestion_index = PrefixIndex()
+"""
+Tag names with usage counts, used for tag autocomplete.
+
+Built at startup by `build_tag_suggestion_index()` and updated by
+`update_tags_of_item()` once its session commits. Bulk item removal does not update
+it, so counts are approximate until next rebuild.
+"""
+
+
+def _mark_tag_usage_changed(
+    ss: Session | AsyncSession, deltas: dict[str, int]
+) -> None:
+    """
+    Record usage count changes of tags in `ss`, they are applied to
+    `_tag_suggestion_index` once `ss` commits, and discarded if it rolls back.
+    """
+    pending: dict[str, int] = ss.info.setdefault("tag_usage_deltas", {})
+    for name, delta in deltas.items():
+        pending[name] = pending.get(name, 0) + delta
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _apply_committed_tag_usage(ss: Session):
+    for name, delta in ss.info.pop("tag_usage_deltas", {}).items():
+        _tag_suggestion_index.add(name, delta)
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _discard_rolled_back_tag_usage(ss: Session):
+    ss.info.pop("tag_usage_deltas", None)
+
+
+async def build_tag_suggestion_index(ss: SessionDep) -> int:
+    """
+    (Re)build tag suggestion index from database, return indexed tags count
+    """
+    stmt = (
+        select(orm.Tag.name, func.count(orm.AssociationItemTag.item_id))
+        .outerjoin(
+            orm.AssociationItemTag,
+            and_(
+                orm.AssociationItemTag.tag_id == orm.Tag.tag_id,
+                orm.AssociationItemTag.deleted_at == None,
+            ),
+        )
+        .where(orm.Tag.deleted_at == None)
+        .group_by(orm.Tag.tag_id, orm.Tag.name)
+        # soft delete of associations is already handled in join condition
+        .execution_options(include_deleted=True)
+    )
+    rows = (await ss.execute(stmt)).all()
+
+    _tag_suggestion_index.clear()
+    for name, count in rows:
+        _tag_suggestion_index.add(name, count)
+
+    return len(rows)
+
+
+def suggest_tags(prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+    """
+    Return at most `limit` `(tag name, usage count)` pairs of tags starting with
+    `prefix`, most used first. Database is not touched.
+    """
+    return _tag_suggestion_index.suggest(prefix, limit)
+
+
 async def get_user_items(
     ss: SessionDep,
     user_id: int,
@@ -51,9 +138,14 @@ async def get_user_items(
     ignore_hide: bool = True,
     ignore_sold: bool = False,
     load_tags: bool = True,
+    pagination: gene_sche.PaginationConfig | None = None,
 ):
     """
     Get selling items of a user by user id
+
+    - `pagination` If `None`, return all items. Supports keyset mode, use
+      `pagination.next_cursor()` with `(created_time, item_id)` key to get cursor
+      of next page
     """
     # promise user is valid
     user = await get_user_from_user_id(ss, user_id)
@@ -71,14 +163,14 @@ async def get_user_items(
 
     # load tags
     if load_tags:
-        stmt = stmt.options(
-            selectinload(orm.Item.association_tags).options(
-                selectinload(orm.AssociationItemTag.tag)
-            )
-        )
+        stmt = stmt.options(*ITEM_OUT_LOAD)
 
     # determine order
-    if time_desc:
+    if pagination is not None:
+        stmt = pagination.use_keyset_on(
+            stmt, orm.Item.created_time, orm.Item.item_id, desc=time_desc
+        )
+    elif time_desc:
         stmt = stmt.order_by(orm.Item.created_time.desc())
     else:
         stmt = stmt.order_by(orm.Item.created_time.asc())
@@ -139,16 +231,10 @@ async def update_tags_of_item(
 
     Note:
 
-    - All tags string will be performed `.strip()`
+    - All tags string will be normalized by `normalize_tag_name()`
     - Empty string tags will be ignored.
     """
-    # remove tags duplication,
-    tag_str_list = list(set(tag_str_list))
-
-    # remove empty tags, strip operation
-    tag_str_list = [t.strip() for t in tag_str_list if t != ""]
-
-    # get tag orm instance list to be added
+    # get tag orm instance list to be added, normalized and deduplicated inside
     tag_orm_list = await add_tags_if_not_exists(ss, tag_str_list)
 
     await ss.refresh(item, ["association_tags"])
@@ -156,6 +242,18 @@ async def update_tags_of_item(
 
     # remove previous tags
     if remove_prev:
+        prev_tag_names = (
+            await ss.scalars(
+                select(orm.Tag.name)
+                .join(orm.Tag.association_items)
+                .where(
+                    orm.AssociationItemTag.item_id == item.item_id,
+                    orm.AssociationItemTag.deleted_at == None,
+                )
+            )
+        ).all()
+        # removal is committed by remove_tags_of_item()
+        _mark_tag_usage_changed(ss, {name: -1 for name in prev_tag_names})
         item = await remove_tags_of_item(ss, item)
 
     await item.awaitable_attrs.association_tags
@@ -163,6 +261,9 @@ async def update_tags_of_item(
     for t in tag_orm_list:
         item.tags.append(t)
 
+    # update usage counts of tag suggestions once committed
+    _mark_tag_usage_changed(ss, {t.name: 1 for t in tag_orm_list})
+
     # commit if needed
     if commit:
         try:
@@ -183,13 +284,12 @@ async def remove_tags_of_item(ss: SessionDep, item: orm.Item):
     # create shallow copy of previous tags list
     all_prev_tags_associations = list(item.association_tags)
 
-    # select all associations with this item id
-    stmt = select(orm.AssociationItemTag).where(orm.AssociationItemTag.item == item)
-    res = await ss.scalars(stmt)
-    asso_to_delete = res.all()
-    # set this associations as deleted
-    for asso in asso_to_delete:
-        asso.delete()
+    # set all associations with this item id as deleted
+    await bulk_soft_delete(
+        ss,
+        orm.AssociationItemTag,
+        orm.AssociationItemTag.item_id == item.item_id,
+    )
 
     try:
         await ss.commit()
@@ -225,6 +325,7 @@ async def add_item(
             )
 
         await ss.commit()
+        index_item_text(item_orm)
 
         # load tags of the item (because of refresh)
         await item_orm.awaitable_attrs.tags
@@ -249,6 +350,7 @@ async def update_item(ss: SessionDep, info: db_sche.ItemInWithId):
     try:
         await ss.commit()
         await ss.refresh(item)
+        index_item_text(item)
         return item
     except:
         await ss.rollback()
@@ -466,65 +568,95 @@ async def answer_question(ss: SessionDep, question_id: int, answer: str):
         raise
 
 
+def normalize_tag_name(name: str) -> str:
+    """
+    Return the normalized tag name, stripped and case folded
+
+    `Tag.name` is unique, and MySQL compares it case-insensitively by default.
+    Tags are stored, looked up and cached by normalized names, so tags that only
+    differ in case are the same tag on every database.
+    """
+    return name.strip().casefold()
+
+
 async def get_tags_by_names(
     ss: SessionDep, tag_str_list: Sequence[str]
 ) -> Sequence[orm.Tag]:
     """
-    Get a list of orm Tag instance by list of tag name str
-
-    Raises
+    Get a list of orm Tag instance by list of tag name str with a single query
 
-    - `no_result` Corresponding tag not exists
+    Names are matched after `normalize_tag_name()`. Result follows the order of
+    `tag_str_list`, not exist tags are skipped.
     """
-    # store the retrieve orm tag instance
-    orm_tag_list: list[orm.Tag] = []
+    if len(tag_str_list) == 0:
+        return []
+
+    names = [normalize_tag_name(n) for n in tag_str_list]
 
-    # iterate to get tag with corresponding name
-    for tag_name in tag_str_list:
-        # retrieve tags
-        stmt = select(orm.Tag).where(orm.Tag.name == tag_name)
-        tag_orm = await ss.scalar(stmt)
-        # add to result list
-        orm_tag_list.append(tag_orm)
+    stmt = select(orm.Tag).where(orm.Tag.name.in_(set(names)))
+    # tags created before normalization may be stored in other cases
+    tags_by_name = {
+        normalize_tag_name(t.name): t for t in (await ss.scalars(stmt)).all()
+    }
 
-    return orm_tag_list
+    return [tags_by_name[n] for n in names if n in tags_by_name]
+
+
+async def _insert_tags_if_missing(ss: SessionDep, tag_str_list: Sequence[str]):
+    """
+    Insert tags with a single statement, tags already exist are ignored
+    by the unique index on `Tag.name`
+    """
+    stmt = (
+        insert(orm.Tag)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    await ss.execute(stmt, [{"name": n} for n in tag_str_list])
+    await try_commit(ss)
 
 
 async def add_tags_if_not_exists(ss: SessionDep, tag_str_list: Sequence[str]):
     """
     Create new tags based on a list of tag name str if the tag with the name
-    not exists. Empty string tags will be ignored
+    not exists. Names are normalized by `normalize_tag_name()`, empty tags will
+    be ignored
 
     Returns
 
     A list of orm Tag instance corresponding to the tag string list
+
+    Notes
+
+    When all tags are known to exist, only one query is issued. Otherwise tags are
+    bulk inserted first, at most three round trips in total.
     """
-    # get list of exists tags
-    stmt = select(orm.Tag)
-    res = await ss.scalars(stmt)
-    exists_tags = res.all()
-    exists_tags_str = [t.name for t in exists_tags]
-
-    # add if not exists
-    for tag in tag_str_list:
-        # tag exists
-        if tag in exists_tags_str:
-            continue
-        # tag is empty
-        if tag == "":
-            continue
-
-        # add tag
-        logger.debug(f"Adding tag with name: {tag}")
-        new_tag = orm.Tag(name=tag)
-        ss.add(new_tag)
-
-    # persist change
-    try:
-        await ss.commit()
-    except:
-        await ss.rollback()
-        raise
+    # normalize, remove empty and duplicated tags, keep order
+    tag_str_list = list(
+        dict.fromkeys(
+            n for n in (normalize_tag_name(t) for t in tag_str_list) if n != ""
+        )
+    )
+
+    # insert tags not known to exist
+    missing = [t for t in tag_str_list if _tag_id_cache.get(t) is None]
+    if len(missing) > 0:
+        logger.debug(f"Adding tags if not exist: {missing}")
+        await _insert_tags_if_missing(ss, missing)
+
+    tags = await get_tags_by_names(ss, tag_str_list)
+
+    # stale cache, tags were removed from database
+    if len(tags) < len(tag_str_list):
+        found = {normalize_tag_name(t.name) for t in tags}
+        stale = [t for t in tag_str_list if t not in found]
+        for t in stale:
+            _tag_id_cache.pop(t)
+        await _insert_tags_if_missing(ss, stale)
+        tags = await get_tags_by_names(ss, tag_str_list)
+
+    for t in tags:
+        _tag_id_cache.set(normalize_tag_name(t.name), t.tag_id)
 
     # return orm tag list
-    return await get_tags_by_names(ss, tag_str_list)
+    return tags
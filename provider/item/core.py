@@ -16,7 +16,8 @@ from schemes import sql as orm
 from schemes import db as db_sche
 from schemes import general as gene_sche
 
-from ..database import SessionDep, try_commit
+from ..database import SessionDep, try_commit, bulk_soft_delete
+from .search import unindex_items
 
 from exception import error as exc
 
@@ -24,10 +25,12 @@ __all__ = [
     "get_item_by_id",
     "remove_questions",
     "get_cascade_items_from_users",
+    "get_cascade_item_ids_from_users",
     "get_cascade_questions_from_items",
     "get_cascade_association_items_tags_from_items",
     "remove_associations_items_tags",
     "remove_items_cascade",
+    "remove_items_cascade_by_ids",
     "clean_up_question_with_deleted_items",
 ]
 
@@ -48,12 +51,12 @@ async def remove_questions(
     questions: Sequence[orm.Question],
     commit: bool = True,
 ) -> list[gene_sche.BulkOpeartionInfo]:
-    q_count = gene_sche.BulkOpeartionInfo(operation="Delete questions")
-
-    for q in questions:
-        if q.deleted_at is None:
-            q_count.inc()
-            q.delete()
+    q_count = await bulk_soft_delete(
+        ss,
+        orm.Question,
+        orm.Question.question_id.in_([q.question_id for q in questions]),
+        operation="Delete questions",
+    )
 
     if commit:
         await try_commit(ss)
@@ -83,6 +86,19 @@ async def get_cascade_items_from_users(
     return items
 
 
+async def get_cascade_item_ids_from_users(
+    ss: SessionDep, user_id_list: Sequence[int]
+) -> Sequence[int]:
+    """
+    Get ids of not deleted items of a list of users, without loading the items
+    """
+    stmt = select(orm.Item.item_id).where(
+        orm.Item.user_id.in_(user_id_list), orm.Item.deleted_at == None
+    )
+
+    return (await ss.scalars(stmt)).all()
+
+
 async def get_cascade_association_fav_items_from_user(
     ss: SessionDep, users: Sequence[orm.User]
 ):
@@ -133,11 +149,14 @@ async def get_cascade_association_items_tags_from_items(
 async def remove_associations_items_tags(
     ss: SessionDep, associations: Sequence[orm.AssociationItemTag], commit: bool = True
 ):
-    count = gene_sche.BulkOpeartionInfo(operation="Remove item-tag associations")
-
-    for a in associations:
-        count.inc()
-        a.delete()
+    count = await bulk_soft_delete(
+        ss,
+        orm.AssociationItemTag,
+        orm.AssociationItemTag.association_items_tags_id.in_(
+            [a.association_items_tags_id for a in associations]
+        ),
+        operation="Remove item-tag associations",
+    )
 
     if commit:
         await try_commit(ss)
@@ -168,43 +187,85 @@ async def remove_items_cascade(
     Raises
 
     - `cascade_constraint`
+
+    Check out `remove_items_cascade_by_ids()` if the items are not loaded yet.
     """
-    # record the effective delete count of all entities
-    i_count = gene_sche.BulkOpeartionInfo(operation="Delete items")
+    return await remove_items_cascade_by_ids(
+        ss, [i.item_id for i in items], constraint=constraint, commit=commit
+    )
+
+
+async def remove_items_cascade_by_ids(
+    ss: SessionDep,
+    item_id_list: Sequence[int],
+    constraint: bool = False,
+    commit: bool = True,
+) -> List[gene_sche.BulkOpeartionInfo]:
+    """
+    Same as `remove_items_cascade()`, but receive item ids.
+
+    Each cascade level is removed by one `UPDATE` statement, no rows will be
+    loaded into session. Fav associations are selected first to update fav
+    counters of related users.
+    """
+    # fav provider depends on this module
+    from ..fav.core import remove_fav_associations
 
-    # delete question cascade of item
-    questions = await get_cascade_questions_from_items(ss, items)
     # raise error if constraint
-    if constraint and len(questions) > 0:
-        raise exc.CascadeConstraintError("Could not remove items with active questions")
-    q_count_list = await remove_questions(ss, questions, commit=False)
+    if constraint:
+        question_count = await ss.scalar(
+            select(func.count(orm.Question.question_id)).where(
+                orm.Question.item_id.in_(item_id_list),
+                orm.Question.deleted_at == None,
+            )
+        )
+        if question_count:
+            raise exc.CascadeConstraintError(
+                "Could not remove items with active questions"
+            )
 
-    # remove tag associations
-    associations = await get_cascade_association_items_tags_from_items(ss, items)
-    t_count = await remove_associations_items_tags(ss, associations, commit=False)
+    # delete question cascade of item
+    q_count = await bulk_soft_delete(
+        ss,
+        orm.Question,
+        orm.Question.item_id.in_(item_id_list),
+        operation="Delete questions",
+    )
 
-    # late import
-    from ..fav.core import remove_fav_items_cascade, get_cascade_fav_items_by_items
+    # remove tag associations
+    t_count = await bulk_soft_delete(
+        ss,
+        orm.AssociationItemTag,
+        orm.AssociationItemTag.item_id.in_(item_id_list),
+        operation="Remove item-tag associations",
+    )
 
     # remove fav item association
-    asso_fav_items = await get_cascade_fav_items_by_items(ss, items)
+    fav_count = await remove_fav_associations(
+        ss,
+        orm.AssociationUserFavouriteItem.item_id.in_(item_id_list),
+        operation="Remove user-fav-item associations",
+    )
 
-    fav_count = await remove_fav_items_cascade(ss, asso_fav_items, commit=False)
-    
     # todo
     # remove all related trade record
 
     # delete items itself
-    for i in items:
-        if i.deleted_at == None:
-            i_count.inc()
-        i.delete()
+    i_count = await bulk_soft_delete(
+        ss,
+        orm.Item,
+        orm.Item.item_id.in_(item_id_list),
+        operation="Delete items",
+    )
 
     if commit:
         await try_commit(ss)
 
+    # results are filtered by database, so it's fine to unindex before commit
+    unindex_items(item_id_list)
+
     # return info
-    return [i_count] + q_count_list + [t_count] + fav_count
+    return [i_count, q_count, t_count, fav_count]
 
 
 async def clean_up_question_with_deleted_items(ss: SessionDep):
@@ -0,0 +1,182 @@
+import re
+
+from typing import Iterable, Sequence
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import match
+
+from schemes import sql as orm
+from schemes import general as gene_sche
+
+from ..database import SessionDep, get_dialect_name, ITEM_OUT_LOAD
+
+from tools.inverted_index import InvertedIndex
+
+__all__ = [
+    "build_item_search_index",
+    "index_item_text",
+    "unindex_items",
+    "search_items",
+]
+
+
+_item_text_index = InvertedIndex[int]()
+"""
+Keyword index of `Item.name` and `Item.description`, `item_id -> tokens`
+
+Only used when database has no full-text index (SQLite). Built at startup by
+`build_item_search_index()` and updated when items are added, updated or removed
+in current process.
+
+The index may contain removed or hidden items, search results are always
+filtered again by database.
+"""
+
+_boolean_mode_operators = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _use_inverted_index() -> bool:
+    return get_dialect_name() != "mysql"
+
+
+async def build_item_search_index(ss: SessionDep) -> int:
+    """
+    (Re)build in-process keyword index from database, return indexed items count.
+
+    Do nothing and return `0` if database supports full-text index.
+    """
+    if not _use_inverted_index():
+        return 0
+
+    rows = (
+        await ss.execute(
+            select(orm.Item.item_id, orm.Item.name, orm.Item.description)
+        )
+    ).all()
+
+    _item_text_index.clear()
+    for item_id, name, description in rows:
+        _item_text_index.index(item_id, f"{name} {description or ''}")
+
+    return len(rows)
+
+
+def index_item_text(item: orm.Item):
+    """Add or refresh keyword index of an item, call after item committed"""
+    if not _use_inverted_index():
+        return
+    _item_text_index.index(item.item_id, f"{item.name} {item.description or ''}")
+
+
+def unindex_items(item_id_list: Iterable[int]):
+    if not _use_inverted_index():
+        return
+    for item_id in item_id_list:
+        _item_text_index.remove(item_id)
+
+
+def _to_boolean_mode_query(keyword: str) -> str:
+    """
+    Convert user input to a MySQL boolean mode query that requires all words,
+    operators in user input are dropped
+    """
+    words = _boolean_mode_operators.sub(" ", keyword).split()
+    return " ".join(f"+{w}" for w in words)
+
+
+async def search_items(
+    ss: SessionDep,
+    keyword: str | None = None,
+    tag_names: Sequence[str] | None = None,
+    price_min: int | None = None,
+    price_max: int | None = None,
+    states: Sequence[orm.ItemState] | None = None,
+    sort: gene_sche.ItemSortTypeIn = gene_sche.ItemSortTypeIn.recent,
+    pagination: gene_sche.PaginationConfig | None = None,
+) -> gene_sche.PaginatedResult:
+    """
+    Search items of all users, tags of result items are loaded.
+
+    Args
+
+    - `keyword` Items should contain all words of keyword in name or description
+    - `tag_names` Items should have at least one of these tags, matched after
+      `normalize_tag_name()`
+    - `price_min`, `price_max` Inclusive price range
+    - `states` Default to valid items only. Hidden items are never returned
+    - `pagination` Default to keyset pagination with default size
+
+    Notes
+
+    - `total` of the result is always `None`, counting all matches of a keyword
+      search is expensive. Use `next_cursor` to fetch next page.
+    - Cursor of next page is based on `(created_time, item_id)` when sorted by
+      recency, and `(price, item_id)` when sorted by price. Cursor is only valid
+      for the same sort type.
+    """
+    # basic depends on this module
+    from .basic import normalize_tag_name
+
+    if pagination is None:
+        pagination = gene_sche.PaginationConfig(keyset=True)
+    if states is None:
+        states = [orm.ItemState.valid]
+
+    stmt = (
+        select(orm.Item)
+        .where(orm.Item.state.in_([s for s in states if s != orm.ItemState.hide]))
+        .options(*ITEM_OUT_LOAD)
+    )
+
+    # keyword
+    if keyword is not None:
+        if not _use_inverted_index():
+            query = _to_boolean_mode_query(keyword)
+            if query != "":
+                stmt = stmt.where(
+                    match(
+                        orm.Item.name, orm.Item.description, against=query
+                    ).in_boolean_mode()
+                )
+        else:
+            item_ids = _item_text_index.search(keyword)
+            if item_ids is not None:
+                logger.debug(f"Keyword '{keyword}' matched {len(item_ids)} indexed items")
+                stmt = stmt.where(orm.Item.item_id.in_(item_ids))
+
+    # tags, any of
+    if tag_names:
+        stmt = stmt.where(
+            orm.Item.item_id.in_(
+                select(orm.AssociationItemTag.item_id)
+                .join(orm.AssociationItemTag.tag)
+                .where(orm.Tag.name.in_({normalize_tag_name(t) for t in tag_names}))
+            )
+        )
+
+    # price range
+    if price_min is not None:
+        stmt = stmt.where(orm.Item.price >= price_min)
+    if price_max is not None:
+        stmt = stmt.where(orm.Item.price <= price_max)
+
+    # order and paginate
+    sort_columns = {
+        gene_sche.ItemSortTypeIn.recent: (orm.Item.created_time, True),
+        gene_sche.ItemSortTypeIn.price_asc: (orm.Item.price, False),
+        gene_sche.ItemSortTypeIn.price_desc: (orm.Item.price, True),
+    }
+    sort_col, desc = sort_columns[sort]
+    stmt = pagination.use_keyset_on(stmt, sort_col, orm.Item.item_id, desc=desc)
+
+    items = (await ss.scalars(stmt)).all()
+
+    return gene_sche.PaginatedResult(
+        total=None,
+        pagination=pagination,
+        data=items,
+        next_cursor=pagination.next_cursor(
+            items, lambda i: (getattr(i, sort_col.key), i.item_id)
+        ),
+    )
@@ -0,0 +1,2 @@
+from .core import *
+from .basic import *
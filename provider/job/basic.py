@@ -0,0 +1,74 @@
+from typing import Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import general as gene_config
+
+from schemes import sql as orm
+from schemes import general as gene_sche
+
+from .core import register_job_handler, register_periodic_job
+
+__all__ = [
+    "remove_users_job",
+    "remove_items_job",
+    "expire_trades_job",
+]
+
+
+def _totals_to_result(totals: Sequence[gene_sche.BulkOpeartionInfo]) -> dict:
+    return {"totals": [t.model_dump() for t in totals]}
+
+
+@register_job_handler("remove_users")
+async def remove_users_job(ss: AsyncSession, payload: dict) -> dict:
+    """
+    Cascade remove users, payload `{"user_id_list": [...]}`
+
+    Already removed users are skipped, so retrying this job is safe.
+    """
+    # lazy import
+    from ..user.core import remove_users_cascade
+
+    users = (
+        await ss.scalars(
+            select(orm.User).where(orm.User.user_id.in_(payload["user_id_list"]))
+        )
+    ).all()
+
+    return _totals_to_result(await remove_users_cascade(ss, users))
+
+
+@register_job_handler("remove_items")
+async def remove_items_job(ss: AsyncSession, payload: dict) -> dict:
+    """
+    Cascade remove items, payload `{"item_id_list": [...]}`
+    """
+    # lazy import
+    from ..item.core import remove_items_cascade_by_ids
+
+    return _totals_to_result(
+        await remove_items_cascade_by_ids(ss, payload["item_id_list"])
+    )
+
+
+@register_periodic_job("expire_trades", interval_s=gene_config.TRADE_EXPIRY_INTERVAL_S)
+async def expire_trades_job(ss: AsyncSession, payload: dict) -> dict:
+    """
+    Cancel stale pending / processing trades and notify their buyers and sellers,
+    enqueued periodically by job runners
+    """
+    # lazy import
+    from ..trade.expiry import expire_stale_trades, notify_expired_trades
+
+    expired = await expire_stale_trades(ss)
+    notified = await notify_expired_trades(ss, expired)
+
+    return {
+        "expired": {
+            reason.value: sum(1 for t in expired if t.cancel_reason == reason)
+            for reason in {t.cancel_reason for t in expired}
+        },
+        "notified": notified,
+    }
@@ -0,0 +1,416 @@
+import asyncio
+import os
+import secrets
+import socket
+import uuid
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import select, update, insert, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import general as gene_config
+
+from schemes import sql as orm
+from exception import error as exc
+
+from ..database import SessionDep, session_manager, try_commit
+
+__all__ = [
+    "JobHandler",
+    "register_job_handler",
+    "register_periodic_job",
+    "enqueue_job",
+    "get_job_by_id",
+    "get_job_by_poll_token",
+    "JobRunner",
+    "job_runner",
+]
+
+
+JobHandler = Callable[[AsyncSession, dict], Awaitable[dict | None]]
+"""
+Job handler receives a new session and the job payload, returns a JSON-serializable
+dict which will be stored as job result.
+
+Handlers may be retried, so they should be idempotent.
+"""
+
+_job_handlers: dict[str, JobHandler] = {}
+
+_periodic_jobs: dict[str, int] = {}
+"""
+Registered periodic jobs, `job_type -> interval in seconds`
+"""
+
+
+def register_job_handler(job_type: str):
+    """
+    Decorator to register a handler of `job_type`
+
+    Usage
+
+        @register_job_handler("remove_users")
+        async def remove_users_job(ss: AsyncSession, payload: dict):
+            ...
+    """
+
+    def decorator(handler: JobHandler) -> JobHandler:
+        if job_type in _job_handlers:
+            raise RuntimeError(f"Handler of job type '{job_type}' already registered")
+        _job_handlers[job_type] = handler
+        return handler
+
+    return decorator
+
+
+def register_periodic_job(job_type: str, interval_s: int):
+    """
+    Decorator to register a handler of `job_type`, and have it enqueued every
+    `interval_s` seconds by job runners.
+
+    Each run is enqueued with a `dedup_key` of its time slot, so even if every
+    process runs a job runner, only one job is enqueued and executed per slot.
+    Payload of the job is `{"scheduled_time": <start of the slot in ms>}`.
+
+    Usage
+
+        @register_periodic_job("expire_trades", interval_s=300)
+        async def expire_trades_job(ss: AsyncSession, payload: dict):
+            ...
+    """
+    register = register_job_handler(job_type)
+
+    def decorator(handler: JobHandler) -> JobHandler:
+        register(handler)
+        _periodic_jobs[job_type] = interval_s
+        return handler
+
+    return decorator
+
+
+async def enqueue_job(
+    ss: SessionDep,
+    job_type: str,
+    payload: dict,
+    user_id: int | None = None,
+    max_attempts: int | None = None,
+    with_poll_token: bool = False,
+) -> orm.Job:
+    """
+    Persist a new job and wake up the job runner of current process, return
+    the ORM instance of the job.
+
+    The job is committed immediately, so it will not be lost even if current
+    request fails afterwards.
+
+    Args
+
+    - `with_poll_token` If `True`, generate an unguessable `poll_token` so the job
+      could be polled without a session, check out `get_job_by_poll_token()`. Use it
+      for jobs that remove the login of their requester, e.g. account removal
+    """
+    if job_type not in _job_handlers:
+        raise RuntimeError(f"No handler registered for job type '{job_type}'")
+
+    job = orm.Job(
+        job_type=job_type,
+        payload=payload,
+        user_id=user_id,
+        max_attempts=max_attempts or gene_config.JOB_MAX_ATTEMPTS,
+        poll_token=secrets.token_urlsafe(32) if with_poll_token else None,
+    )
+    ss.add(job)
+    await try_commit(ss)
+
+    job_runner.wake()
+    return job
+
+
+async def get_job_by_id(ss: SessionDep, job_id: int) -> orm.Job:
+    job = await ss.get(orm.Job, job_id)
+    if job is None or job.deleted_at is not None:
+        raise exc.NoResultError(message=f"Could not found job with id: {job_id}")
+
+    return job
+
+
+async def get_job_by_poll_token(ss: SessionDep, poll_token: str) -> orm.Job:
+    """
+    Get job by its `poll_token`, check out `enqueue_job()`
+
+    Raises
+
+    - `no_result`
+    """
+    job = (
+        await ss.scalars(select(orm.Job).where(orm.Job.poll_token == poll_token))
+    ).one_or_none()
+    if job is None:
+        raise exc.NoResultError(message="Could not found job with this poll token")
+
+    return job
+
+
+class JobRunner:
+    """
+    In-process runner that executes persisted jobs in background.
+
+    Each process runs its own runner. Runners claim due jobs with a conditional
+    `UPDATE`, and hold a lease on the claimed job while executing it, so multiple
+    processes could share the same job table safely. The lease is extended
+    periodically while the job is executing, jobs left by a crashed process are
+    claimed again once their lease expired.
+
+    Failed jobs are retried with exponential backoff until `max_attempts` reached.
+
+    Runs of periodic jobs are enqueued by runners themselves, check out
+    `register_periodic_job()`.
+    """
+
+    def __init__(
+        self,
+        poll_interval_s: float,
+        lease_s: int,
+        retry_backoff_s: int,
+        batch_size: int = 10,
+    ) -> None:
+        self.poll_interval_s = poll_interval_s
+        self.lease_s = lease_s
+        self.retry_backoff_s = retry_backoff_s
+        self.batch_size = batch_size
+
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._task: asyncio.Task | None = None
+        self._wake_event = asyncio.Event()
+
+        # last time slot of each periodic job enqueued by this runner
+        self._periodic_slots: dict[str, int] = {}
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Job runner {self.worker_id} started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Job runner {self.worker_id} stopped")
+
+    def wake(self):
+        """Pick due jobs immediately instead of waiting for next poll"""
+        self._wake_event.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.enqueue_periodic_jobs()
+                while await self.run_once() > 0:
+                    pass
+            except Exception as e:
+                logger.exception(e)
+
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), self.poll_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+
+    async def run_once(self) -> int:
+        """
+        Claim and execute a batch of due jobs, return how many jobs were executed
+        """
+        job_ids = await self._claim_due_jobs()
+        for job_id in job_ids:
+            await self._execute(job_id)
+        return len(job_ids)
+
+    async def enqueue_periodic_jobs(self) -> int:
+        """
+        Enqueue the run of current time slot of each periodic job, return how many
+        jobs were actually enqueued by this runner
+        """
+        now = orm.get_current_timestamp_ms()
+        due_slots = {
+            job_type: now // (interval_s * 1000)
+            for job_type, interval_s in _periodic_jobs.items()
+            if self._periodic_slots.get(job_type) != now // (interval_s * 1000)
+        }
+        if len(due_slots) == 0:
+            return 0
+
+        enqueued = 0
+        async with session_manager() as ss:
+            for job_type, slot in due_slots.items():
+                # unique dedup key, other runners may have enqueued this run already
+                res = await ss.execute(
+                    insert(orm.Job)
+                    .prefix_with("IGNORE", dialect="mysql")
+                    .prefix_with("OR IGNORE", dialect="sqlite")
+                    .values(
+                        job_type=job_type,
+                        payload={
+                            "scheduled_time": slot * _periodic_jobs[job_type] * 1000
+                        },
+                        # next slot is a retry anyway
+                        max_attempts=1,
+                        run_after=now,
+                        created_time=now,
+                        dedup_key=f"{job_type}:{slot}",
+                    )
+                )
+                enqueued += res.rowcount
+            await try_commit(ss)
+
+        self._periodic_slots.update(due_slots)
+        return enqueued
+
+    @staticmethod
+    def _due_criteria(now: int):
+        return or_(
+            and_(orm.Job.state == orm.JobState.pending, orm.Job.run_after <= now),
+            # abandoned by a crashed runner
+            and_(
+                orm.Job.state == orm.JobState.running,
+                orm.Job.lease_expires_at < now,
+            ),
+        )
+
+    async def _claim_due_jobs(self) -> list[int]:
+        now = orm.get_current_timestamp_ms()
+        claimed: list[int] = []
+
+        async with session_manager() as ss:
+            candidates = (
+                await ss.scalars(
+                    select(orm.Job.job_id)
+                    .where(self._due_criteria(now))
+                    .order_by(orm.Job.run_after)
+                    .limit(self.batch_size)
+                )
+            ).all()
+
+            for job_id in candidates:
+                # conditional update, only one runner could win the job
+                res = await ss.execute(
+                    update(orm.Job)
+                    .where(orm.Job.job_id == job_id, self._due_criteria(now))
+                    .values(
+                        state=orm.JobState.running,
+                        attempts=orm.Job.attempts + 1,
+                        lease_owner=self.worker_id,
+                        lease_expires_at=now + self.lease_s * 1000,
+                    )
+                )
+                if res.rowcount == 1:
+                    claimed.append(job_id)
+
+            await try_commit(ss)
+
+        return claimed
+
+    async def _execute(self, job_id: int):
+        async with session_manager() as ss:
+            job = await get_job_by_id(ss, job_id)
+            job_type, payload = job.job_type, job.payload
+            attempts, max_attempts = job.attempts, job.max_attempts
+
+        handler = _job_handlers.get(job_type)
+
+        result: dict | None = None
+        error: str | None = None
+        heartbeat = asyncio.create_task(self._extend_lease_periodically(job_id))
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type '{job_type}'")
+            async with session_manager() as ss:
+                result = await handler(ss, payload)
+        except Exception as e:
+            logger.exception(e)
+            error = f"{type(e).__name__}: {e}"[:500]
+        finally:
+            heartbeat.cancel()
+            try:
+                await heartbeat
+            except asyncio.CancelledError:
+                pass
+
+        now = orm.get_current_timestamp_ms()
+        values: dict[str, Any] = dict(lease_owner=None, lease_expires_at=None)
+        if error is None:
+            values.update(
+                state=orm.JobState.success, result=result, error=None, finished_time=now
+            )
+        elif handler is None or attempts >= max_attempts:
+            values.update(state=orm.JobState.failed, error=error, finished_time=now)
+        else:
+            backoff_ms = self.retry_backoff_s * 1000 * 2 ** (attempts - 1)
+            values.update(
+                state=orm.JobState.pending, error=error, run_after=now + backoff_ms
+            )
+
+        async with session_manager() as ss:
+            # only the lease owner could finish the job
+            res = await ss.execute(
+                update(orm.Job)
+                .where(orm.Job.job_id == job_id, orm.Job.lease_owner == self.worker_id)
+                .values(**values)
+            )
+            await try_commit(ss)
+
+        if res.rowcount == 0:
+            logger.error(
+                f"Job {job_id} ({job_type}) attempt {attempts} finished after its lease "
+                f"was taken over, {values['state']} discarded"
+            )
+            return
+
+        logger.info(f"Job {job_id} ({job_type}) attempt {attempts}: {values['state']}")
+
+    async def _extend_lease_periodically(self, job_id: int):
+        """
+        Keep the lease of a running job until cancelled, extended every third of
+        `lease_s`, so a job running longer than `lease_s` is not claimed again
+        """
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            try:
+                async with session_manager() as ss:
+                    res = await ss.execute(
+                        update(orm.Job)
+                        .where(
+                            orm.Job.job_id == job_id,
+                            orm.Job.lease_owner == self.worker_id,
+                        )
+                        .values(
+                            lease_expires_at=orm.get_current_timestamp_ms()
+                            + self.lease_s * 1000
+                        )
+                    )
+                    await try_commit(ss)
+            except Exception as e:
+                # retry on next beat, which is still before the lease expires
+                logger.exception(e)
+                continue
+
+            if res.rowcount == 0:
+                logger.error(f"Lost lease of job {job_id}, stop extending it")
+                return
+
+
+job_runner = JobRunner(
+    poll_interval_s=gene_config.JOB_POLL_INTERVAL_S,
+    lease_s=gene_config.JOB_LEASE_S,
+    retry_backoff_s=gene_config.JOB_RETRY_BACKOFF_S,
+)
+"""
+Job runner of current process, started by app lifespan if `JOB_RUNNER_ENABLED`
+"""
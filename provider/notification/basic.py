@@ -22,7 +22,7 @@ from asyncer import asyncify
 from asyncio import iscoroutine
 
 from loguru import logger
-from sqlalchemy import select, func, Column, distinct, union_all, union
+from sqlalchemy import select, func, Column, distinct
 from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
 from sqlalchemy.sql import and_, or_
 from sqlalchemy import exc as sqlexc
@@ -43,6 +43,7 @@ from ..database import init_session_maker, session_maker, SessionDep, try_commit
 from ..user.core import get_user_contact_info_count
 from ..auth import check_user_permission
 
+from .core import change_unread_notification_count
 from .error import (
     NotificationError,
     InvalidReceiverError,
@@ -200,6 +201,12 @@ class NotificationSender:
         assert self.curr_session is not None
         self.curr_session.add(self.curr_orm_notification)
 
+        # maintain unread counter of receiver in the same transaction
+        assert self.curr_receiver is not None
+        await change_unread_notification_count(
+            self.curr_session, self.curr_receiver.user_id, 1
+        )
+
         await try_commit(self.curr_session)
 
         # after callback
@@ -212,11 +219,10 @@ class NotificationSender:
 
 
 async def log_middleware(sender: NotificationSender):
-    assert sender.curr_sender is not None
     assert sender.curr_receiver is not None
-    logger.debug(
-        f"Notification Sent. {sender.curr_sender.user_id} -> {sender.curr_receiver.user_id}"
-    )
+    # no sender means the notification is sent on behalf of system
+    sender_id = "system" if sender.curr_sender is None else sender.curr_sender.user_id
+    logger.debug(f"Notification Sent. {sender_id} -> {sender.curr_receiver.user_id}")
 
 
 async def get_notifications(
@@ -227,13 +233,21 @@ async def get_notifications(
     received: bool = True,
     ignore_read: bool = False,
     pagination: gene_sche.PaginationConfig | None = None,
+    count_total: bool = True,
 ):
     """
     Get notifications of a user
 
     - `time_desc` Order result by sent/received time desc
     - `sent` `received` Filter by sent/received notifications
-    - `pagination` Pagination config, use default if not provided
+    - `ignore_read` Only return unread notifications
+    - `pagination` Pagination config, use default if not provided. Supports keyset mode
+    - `count_total` If `False`, skip counting and `total` of the result will be `None`
+
+    Notes
+
+    `total` comes from a window function in the same statement. Only keyset pages
+    after the first one and out-of-range offset pages need an extra `COUNT` query.
     """
     # param validation
     if sent == False and received == False:
@@ -243,48 +257,60 @@ async def get_notifications(
         )
     pagination = pagination or gene_sche.PaginationConfig()
 
-    # basic stmt
-    basic_stmt = (
-        select(orm.Notification)
-        .select_from(orm.User)
-        .where(orm.User.user_id == user.user_id)
-    )
-
-    # sent and received filter
-    sent_notification = basic_stmt.join(orm.User.sent_notifications)
-    # logger.debug((await ss.scalars(sent_notification)).all())
-    received_notification = basic_stmt.join(orm.User.received_notifications)
-    # logger.debug((await ss.scalars(received_notification)).all())
-
-    # union sent/received notifications based on param
-    selected = []
+    # filter notification table directly, each branch is covered by an index
+    # on (receiver_id, read_time, created_time) or (sender_id, created_time)
+    user_filters = []
     if sent:
-        selected.append(sent_notification)
+        user_filters.append(orm.Notification.sender_id == user.user_id)
     if received:
-        selected.append(received_notification)
-    all_stmt = union_all(*selected).subquery()
-    all_notifications = aliased(orm.Notification, all_stmt)
+        user_filters.append(orm.Notification.receiver_id == user.user_id)
 
-    stmt = select(all_notifications)
-
-    # order
-    if time_desc:
-        stmt = stmt.order_by(all_notifications.created_time.desc())
-
-    # ignore read
+    criteria = [or_(*user_filters)]
     if ignore_read:
-        stmt = stmt.where(all_notifications.read_time == None)
-
-    # calculate total result under the applied criteria
-    total = await ss.scalar(select(func.count(all_notifications.notification_id)))
-    total = total or 0
-
-    # pagination
-    stmt = pagination.use_on(stmt)
-
-    res = (await ss.scalars(stmt)).all()
+        criteria.append(orm.Notification.read_time == None)
+
+    # window function runs before LIMIT/OFFSET but after the seek predicate,
+    # so it only gives the real total when no cursor is used
+    window_total = count_total and pagination.cursor is None
+    first_page = pagination.use_keyset or pagination.index == 0
+
+    stmt = select(orm.Notification).where(*criteria)
+    if window_total:
+        stmt = stmt.add_columns(func.count().over().label("total"))
+
+    # order and pagination
+    stmt = pagination.use_keyset_on(
+        stmt,
+        orm.Notification.created_time,
+        orm.Notification.notification_id,
+        desc=time_desc,
+    )
 
-    return gene_sche.PaginatedResult(total=total, pagination=pagination, data=res)
+    total: int | None = None
+    if window_total:
+        rows = (await ss.execute(stmt)).all()
+        res = [r[0] for r in rows]
+        if len(rows) > 0:
+            total = rows[0].total
+        elif first_page:
+            total = 0
+    else:
+        res = (await ss.scalars(stmt)).all()
+
+    if count_total and total is None:
+        total = await ss.scalar(
+            select(func.count(orm.Notification.notification_id)).where(*criteria)
+        )
+        total = total or 0
+
+    return gene_sche.PaginatedResult(
+        total=total,
+        pagination=pagination,
+        data=res,
+        next_cursor=pagination.next_cursor(
+            res, lambda n: (n.created_time, n.notification_id)
+        ),
+    )
 
 
 async def check_user_could_read_notification(
@@ -1,3 +1,5 @@
+from sqlalchemy import select, update
+
 from schemes import sql as orm
 from exception import error as exc
 
@@ -5,6 +7,10 @@ from ..database import SessionDep
 
 __all__ = [
     "get_notification_by_id",
+    "get_unread_notification_count",
+    "change_unread_notification_count",
+    "mark_notification_read",
+    "mark_all_notifications_read",
 ]
 
 
@@ -16,3 +22,102 @@ async def get_notification_by_id(ss: SessionDep, notification_id: int):
         )
 
     return orm_notification
+
+
+async def get_unread_notification_count(ss: SessionDep, user_id: int) -> int:
+    """
+    Get unread received notifications count of a user from the denormalized counter,
+    the notification table will not be touched.
+    """
+    count = await ss.scalar(
+        select(orm.User.unread_notification_count).where(orm.User.user_id == user_id)
+    )
+    if count is None:
+        raise exc.NoResultError(message=f"Could not found user with id: {user_id}")
+
+    return count
+
+
+async def change_unread_notification_count(
+    ss: SessionDep, user_id: int, delta: int
+) -> None:
+    """
+    Atomically add `delta` to the unread notification counter of a user.
+
+    Changes are not committed, call this function in the same transaction that
+    inserts or reads the notifications to keep the counter consistent.
+    """
+    if delta == 0:
+        return
+
+    await ss.execute(
+        update(orm.User)
+        .where(orm.User.user_id == user_id)
+        .values(unread_notification_count=orm.User.unread_notification_count + delta)
+    )
+
+
+async def mark_notification_read(
+    ss: SessionDep, notification: orm.Notification
+) -> bool:
+    """
+    Mark a notification as read and decrease the unread counter of its receiver.
+
+    Return `False` if the notification has already been read. The read state is
+    checked inside the `UPDATE` statement, so concurrent requests will not decrease
+    the counter twice.
+
+    Changes are not committed.
+    """
+    res = await ss.execute(
+        update(orm.Notification)
+        .where(
+            orm.Notification.notification_id == notification.notification_id,
+            orm.Notification.read_time == None,
+        )
+        .values(read_time=orm.get_current_timestamp_ms())
+    )
+    if res.rowcount == 0:
+        return False
+
+    await change_unread_notification_count(ss, notification.receiver_id, -1)
+    return True
+
+
+async def mark_all_notifications_read(
+    ss: SessionDep,
+    user_id: int,
+    up_to_notification_id: int | None = None,
+    up_to_time: int | None = None,
+) -> int:
+    """
+    Mark all unread received notifications of a user as read with a single
+    `UPDATE` statement, and decrease the unread counter accordingly.
+
+    Return how many notifications have been marked.
+
+    Args
+
+    - `up_to_notification_id` If provided, only mark notifications whose id is not
+      greater than it
+    - `up_to_time` If provided, only mark notifications created not later than it
+
+    Watermarks are usually the newest notification the client has displayed, so
+    notifications delivered concurrently will not be marked read by accident.
+
+    Changes are not committed.
+    """
+    stmt = update(orm.Notification).where(
+        orm.Notification.receiver_id == user_id,
+        orm.Notification.read_time == None,
+        orm.Notification.deleted_at == None,
+    )
+    if up_to_notification_id is not None:
+        stmt = stmt.where(orm.Notification.notification_id <= up_to_notification_id)
+    if up_to_time is not None:
+        stmt = stmt.where(orm.Notification.created_time <= up_to_time)
+
+    res = await ss.execute(stmt.values(read_time=orm.get_current_timestamp_ms()))
+
+    await change_unread_notification_count(ss, user_id, -res.rowcount)
+    return res.rowcount
@@ -41,7 +41,7 @@ async def send_to_telegram_callback(sender: NotificationSender):
         loop.create_task(
             _send_to_telegram_callback(
                 message_sender=sender.curr_sender,
-                message_receiver=sender.receiver,
+                message_receiver=sender.curr_receiver,
                 message_content=sender.curr_content,
                 orm_notification=sender.curr_orm_notification,
             )
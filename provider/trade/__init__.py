@@ -3,7 +3,10 @@ from .core import (
 )
 
 from .basic import (
+    TradeEligibility,
+    get_trade_eligibility,
     check_validity_to_start_transaction,
+    claim_item_version,
     start_transaction,
     get_transactions,
     determine_cancel_reason,
@@ -12,3 +15,9 @@ from .basic import (
     accpet_transaction,
     confirm_transaction,
 )
+
+from .expiry import (
+    ExpiredTrade,
+    expire_stale_trades,
+    notify_expired_trades,
+)
@@ -1,7 +1,8 @@
+from dataclasses import dataclass
 from typing import Annotated, cast, List, Sequence
 
 from loguru import logger
-from sqlalchemy import select, func, Column, distinct
+from sqlalchemy import select, update, union, func, Column, distinct
 from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
 from sqlalchemy.sql import and_, or_
 from sqlalchemy import exc as sqlexc
@@ -14,125 +15,160 @@ from schemes import db as db_sche
 from schemes import general as gene_sche
 
 from ..database import init_session_maker, session_maker, SessionDep, try_commit
-from ..user.core import get_user_contact_info_count
+from ..database import TRADE_OUT_LOAD
 
 from exception import error as exc
 
 
-async def check_item_validity_to_start_transaction(ss: SessionDep, item: orm.Item):
+@dataclass
+class TradeEligibility:
     """
-    Check if the item have no processing transaction
-
-    - Item is in valid state
-    - Item have no processing transaction
-
-    Raises
-
-    - `processing_transaction_exists` (409)
-    - `invalid_item` (404)
+    Everything needed to decide whether a buyer could trade an item, returned by
+    `get_trade_eligibility()`
+
+    - `item_state` `None` if the item not exists or has been deleted
+    - `seller_id` Owner of the item
+    - `item_version` Version of the item, check out `claim_item_version()`
+    - `item_processing_count` Processing trades of the item
+    - `duplicated_count` Pending or processing trades of the item by the buyer
+    - `contact_info_count` External contact info of the buyer
+    - `buyer_processing_count` Processing trades of the buyer
     """
-    if item.state != orm.ItemState.valid:
-        raise exc.NoResultError(
-            name="invalid_item",
-            message="This item is not in valid state for a transaction",
-        )
 
-    if await item.awaitable_attrs.processing_trade is not None:
-        raise exc.DuplicatedError(
-            name="processing_transaction_exists",
-            message="There is already an processing transaction with this item",
-        )
+    item_state: orm.ItemState | None
+    seller_id: int | None
+    item_version: int
+    item_processing_count: int
+    duplicated_count: int
+    contact_info_count: int
+    buyer_processing_count: int
+
+    def check_item(self):
+        """
+        Raises
+
+        - `invalid_item` (404)
+        - `processing_transaction_exists` (409)
+        """
+        if self.item_state != orm.ItemState.valid:
+            raise exc.NoResultError(
+                name="invalid_item",
+                message="This item is not in valid state for a transaction",
+            )
 
-    return True
+        if self.item_processing_count > 0:
+            raise exc.DuplicatedError(
+                name="processing_transaction_exists",
+                message="There is already an processing transaction with this item",
+            )
 
+    def check_start(self, buyer_id: int):
+        """
+        Same checks and raises as `check_validity_to_start_transaction()`
+        """
+        self.check_item()
 
-async def check_buyer_is_not_owner_of_item(
-    ss: SessionDep, buyer: orm.User, item: orm.Item
-):
-    """
-    Check that buyer is not the owner of the target item himself
+        if self.contact_info_count == 0:
+            raise exc.NoResultError(
+                name="no_valid_contact_info",
+                message="User has no valid contact information",
+            )
 
-    Raises
+        if self.buyer_processing_count >= sys_conf.MAX_TRANSACTION_PER_BUYER:
+            raise exc.LimitExceededError(name="processing_transaction_limit_exceeded")
 
-    - `identical_seller_buyer` (409)
-    """
-    # get seller of item
-    seller: orm.User = await ss.run_sync(lambda ss: item.seller)
+        if self.seller_id == buyer_id:
+            raise exc.ConflictError(
+                name="identical_seller_buyer",
+                message="The seller and buyer of an item could not be the same user",
+            )
 
-    # raise
-    if seller.user_id == buyer.user_id:
-        raise exc.ConflictError(
-            name="identical_seller_buyer",
-            message="The seller and buyer of an item could not be the same user",
-        )
+        if self.duplicated_count > 0:
+            raise exc.DuplicatedError(
+                name="duplicated_transaction",
+                message="There is already a transaction with this item and buyer",
+            )
 
 
-async def check_no_existing_processing_transaction(
-    ss: SessionDep, buyer: orm.User, item: orm.Item
-):
+async def get_trade_eligibility(
+    ss: SessionDep, buyer_id: int, item_id: int
+) -> TradeEligibility:
     """
-    Check if the buyer already have a pending transaction with the item
-
-    Checks
-
-    - Buyer may already start a transaction with this item, and the transaction
-      is waiting for seller's acceptance.
-    - Buyer may already have a _processing_ transaction with this item.
+    Collect all counts and flags needed by trade validity checks with a single
+    statement, each of them is a scalar subquery resolved by an index.
 
-    Note
-
-    This function will not check if the item has any other processing transactions.
-    For that purpose, use `check_item_validity_to_start_transaction()`
-
-    Raises
-
-    - `duplicated_transaction` (409)
+    Soft deleted rows are excluded from all counts.
     """
+    active_states = [orm.TradeState.pending, orm.TradeState.processing]
+
+    def count_trades(*criteria):
+        return (
+            select(func.count())
+            .select_from(orm.TradeRecord)
+            .where(*criteria, orm.TradeRecord.deleted_at == None)
+            .scalar_subquery()
+        )
 
-    stmt = (
+    def item_column(col):
+        return (
+            select(col)
+            .where(orm.Item.item_id == item_id, orm.Item.deleted_at == None)
+            .scalar_subquery()
+        )
+
+    stmt = select(
+        item_column(orm.Item.state),
+        item_column(orm.Item.user_id),
+        item_column(orm.Item.version),
+        count_trades(
+            orm.TradeRecord.item_id == item_id,
+            orm.TradeRecord.state == orm.TradeState.processing,
+        ),
+        count_trades(
+            orm.TradeRecord.item_id == item_id,
+            orm.TradeRecord.buyer_id == buyer_id,
+            orm.TradeRecord.state.in_(active_states),
+        ),
         select(func.count())
-        .select_from(orm.TradeRecord)
-        .join(orm.TradeRecord.buyer)
+        .select_from(orm.ContactInfo)
         .where(
-            and_(
-                # determine the item we need to check
-                orm.TradeRecord.item_id == item.item_id,
-                # check if any transaction in:
-                # - pending
-                # - processing
-                or_(
-                    orm.TradeRecord.state == orm.TradeState.processing,
-                    orm.TradeRecord.state == orm.TradeState.pending,
-                ),
-                # actually duplicated, relation will handle this
-                orm.TradeRecord.buyer_id == buyer.user_id,
-            )
+            orm.ContactInfo.user_id == buyer_id,
+            orm.ContactInfo.internal == False,
+            orm.ContactInfo.deleted_at == None,
         )
+        .scalar_subquery(),
+        count_trades(
+            orm.TradeRecord.buyer_id == buyer_id,
+            orm.TradeRecord.state == orm.TradeState.processing,
+        ),
     )
 
-    # check if there's duplictation
-    dup_transactions = await ss.scalar(stmt)
-    # there should be a return result, which is the count of duplicated transaction
-    assert dup_transactions is not None
+    row = (await ss.execute(stmt)).one()
 
-    # raise if duplicated
-    if dup_transactions > 0:
-        raise exc.DuplicatedError(
-            name="duplicated_transaction",
-            message="There is already a transaction with this item and buyer",
-        )
+    return TradeEligibility(
+        item_state=orm.ItemState(row[0]) if row[0] is not None else None,
+        seller_id=row[1],
+        item_version=row[2] or 0,
+        item_processing_count=row[3],
+        duplicated_count=row[4],
+        contact_info_count=row[5],
+        buyer_processing_count=row[6],
+    )
 
 
 async def check_validity_to_start_transaction(
     ss: SessionDep, user: orm.User, item: orm.Item
-):
+) -> TradeEligibility:
     """
-    Check the buyer and item validity of creating a new transaction between them.
+    Check the buyer and item validity of creating a new transaction between them,
+    return the `TradeEligibility` used for the checks.
 
     This function act as a general inclusive function to check several validities
     before starting a transaction. The code should promise all condition will be
     satisfied and it's safe to start a transaction if this function has passed.
 
+    All checks are based on a single query, check out `get_trade_eligibility()`
+
     Raises
 
     - `processing_transaction_exists` (409)
@@ -145,58 +181,47 @@ async def check_validity_to_start_transaction(
     For more info about validity check, check out
     [Project Wiki - Transaction Design](https://github.com/NFSandbox/sh_trade_backend/wiki/Transaction-Design)
     """
-    await check_item_validity_to_start_transaction(ss, item)
-    await check_user_validity_to_start_transaction(ss, user)
-    await check_buyer_is_not_owner_of_item(ss, user, item)
-    await check_no_existing_processing_transaction(ss, user, item)
+    eligibility = await get_trade_eligibility(ss, user.user_id, item.item_id)
+    eligibility.check_start(user.user_id)
+
+    return eligibility
 
 
-async def check_user_validity_to_start_transaction(ss: SessionDep, user: orm.User):
+async def claim_item_version(ss: SessionDep, item: orm.Item, version: int):
     """
-    Check if a user is allowed to start a new transaction, including:
+    Optimistic lock of trade operations on an item.
 
-    - User should not exceed max processing transaction per user limit
-    - User should have at least one contact info.
+    Bump `item.version` only if it still equals `version`, which is the version
+    read before validity checks. If another request started or accepted a trade
+    of this item in the meantime, the version has changed and the checks may be
+    based on stale data, so the operation is rejected.
+
+    Call this as the last statement before commit, the row lock taken by the
+    `UPDATE` is then held for the shortest time.
 
     Raises
 
-    - `no_valid_contact_info` (404)
-    - `processing_transaction_limit_exceeded` (400)
+    - `concurrent_trade_operation` (409)
     """
-    # get count of user processing transaction
-    if (await get_user_contact_info_count(ss, user)) == 0:
-        raise exc.NoResultError(
-            name="no_valid_contact_info",
-            message="User has no valid contact information",
-        )
-
-    # check processing count
-    # select all buys of current user, that is in processing state
-    stmt = (
-        select(orm.TradeRecord)
-        .select_from(orm.User)
-        .join(
-            orm.User.buys.and_(orm.TradeRecord.state == orm.TradeState.processing).and_(
-                orm.User.user_id == user.user_id
-            )
-        )
+    res = await ss.execute(
+        update(orm.Item)
+        .where(orm.Item.item_id == item.item_id, orm.Item.version == version)
+        .values(version=orm.Item.version + 1)
     )
-
-    # all processing buys
-    processing_buys = (await ss.scalars(stmt)).all()
-
-    # if limit exceeded
-    if len(processing_buys) >= sys_conf.MAX_TRANSACTION_PER_BUYER:
-        raise exc.LimitExceededError(name="processing_transaction_limit_exceeded")
-
-    return True
+    if res.rowcount != 1:
+        await ss.rollback()
+        raise exc.ConflictError(
+            name="concurrent_trade_operation",
+            message="The item is being traded by another request, please retry later",
+        )
 
 
 async def check_validity_to_accept_transaction(
     ss: SessionDep, user: orm.User, trade: orm.TradeRecord
-):
+) -> TradeEligibility:
     """
-    Check if a user could accept a transaction
+    Check if a user could accept a transaction, return the `TradeEligibility`
+    used for the checks.
 
     Checks
 
@@ -211,18 +236,17 @@ async def check_validity_to_accept_transaction(
     - `processing_transaction_exists` (409)
     - `invalid_item` (404)
     """
+    eligibility = await get_trade_eligibility(ss, trade.buyer_id, trade.item_id)
+
     # ensure user is the seller
-    seller_id = await ss.run_sync(lambda ss: trade.item.seller.user_id)
-    if user.user_id != seller_id:
+    if user.user_id != eligibility.seller_id:
         raise exc.IllegalOperationError(
             name="not_seller",
             message="Only the seller of the item could accept the transaction",
         )
 
     # item validity
-    await check_item_validity_to_start_transaction(
-        ss, await ss.run_sync(lambda ss: trade.item)
-    )
+    eligibility.check_item()
 
     # ensure transaction in pending state
     if trade.state != orm.TradeState.pending:
@@ -231,11 +255,29 @@ async def check_validity_to_accept_transaction(
             message="Only transactions in holding state could be accepted",
         )
 
+    return eligibility
+
 
-async def accpet_transaction(ss: SessionDep, trade: orm.TradeRecord):
+async def accpet_transaction(
+    ss: SessionDep, trade: orm.TradeRecord, item_version: int | None = None
+):
     """
     Accept a transaction, change its state to `processing`
+
+    Args
+
+    - `item_version` Version of the item read before validity checks, check out
+      `claim_item_version()`. Default to the version of item currently loaded
+
+    Raises
+
+    - `transaction_not_pending` (406)
+    - `concurrent_trade_operation` (409)
     """
+    item: orm.Item = await trade.awaitable_attrs.item
+    if item_version is None:
+        item_version = item.version
+
     # ensure transaction in pending state
     if trade.state != orm.TradeState.pending:
         raise exc.IllegalOperationError(
@@ -247,13 +289,20 @@ async def accpet_transaction(ss: SessionDep, trade: orm.TradeRecord):
     trade.state = orm.TradeState.processing
     trade.accepted_time = orm.get_current_timestamp_ms()
 
+    # no other trade of this item started or accepted since the checks
+    await claim_item_version(ss, item, item_version)
+
     await try_commit(ss)
 
     return trade
 
 
 async def start_transaction(
-    ss: SessionDep, user: orm.User, item: orm.Item, skip_check: bool = False
+    ss: SessionDep,
+    user: orm.User,
+    item: orm.Item,
+    skip_check: bool = False,
+    item_version: int | None = None,
 ):
     """
     Start a transaction with given user and item, check item validity before create.
@@ -268,6 +317,8 @@ async def start_transaction(
     Params
 
     - `skip_check` Skip item validity check
+    - `item_version` Version of the item read before validity checks, check out
+      `claim_item_version()`. Default to the version of item currently loaded
 
     Raises
 
@@ -277,12 +328,24 @@ async def start_transaction(
     - `invalid_item` (404)
     - `no_valid_contact_info` (404)
     - `processing_transaction_limit_exceeded` (400)
+    - `concurrent_trade_operation` (409) Another trade of this item started or
+      accepted concurrently
 
     All validity checking is handled in `check_validity_to_start_transaction()`
+
+    Concurrency
+
+    Checks and insertion are guarded by the optimistic lock on `item.version`,
+    concurrent starts and accepts of the same item could not both pass the checks.
     """
+    if item_version is None:
+        item_version = item.version
+
     # check item validity
     if not skip_check:
-        await check_validity_to_start_transaction(ss, user, item)
+        eligibility = await check_validity_to_start_transaction(ss, user, item)
+        # read in the same statement as the checks
+        item_version = eligibility.item_version
 
     # create new transaction
     new_transaction = orm.TradeRecord(buyer=user, item=item)
@@ -290,6 +353,9 @@ async def start_transaction(
     # add to session
     ss.add(new_transaction)
 
+    # no other trade of this item started or accepted since the checks
+    await claim_item_version(ss, item, item_version)
+
     await try_commit(ss)
 
     return new_transaction
@@ -300,42 +366,104 @@ async def get_transactions(
     user: orm.User,
     states: Sequence[orm.TradeState] | None,
     pagination: gene_sche.PaginationConfig | None = None,
-):
+    count_total: bool = True,
+) -> gene_sche.PaginatedResult[Sequence[orm.TradeRecord]]:
     """
-    Get related transactions of a user.
+    Get related transactions of a user, newest first.
 
     Note that this will get transaction both with this user as buyer and seller.
 
+    Relations needed by `db_sche.TradeRecordOut` are loaded, check out
+    `TRADE_OUT_LOAD`.
+
     Args
 
     - `states` Filter result using the list of state. If `None`, no filter will be applied.
+    - `pagination` Pagination config, use default if not provided. Supports keyset mode
+      ordered by `(created_time, trade_id)`
+    - `count_total` If `False`, skip counting and `total` of the result will be `None`
+
+    Notes
+
+    Trades as buyer and trades as seller are selected by two branches combined with
+    `UNION`, each of them resolved by its own index. Each branch only reads rows up to
+    the end of requested page.
     """
-    # get all transaction of a certain user with certain states
-    stmt = (
-        select(orm.TradeRecord)
-        .join(orm.TradeRecord.item)
-        .join(orm.Item.seller)
-        .where(
-            or_(
-                # this user is buyer
+    pagination = pagination or gene_sche.PaginationConfig()
+
+    # soft delete filter is not applied to subqueries of count statement
+    criteria = [orm.TradeRecord.deleted_at == None]
+    if states is not None:
+        criteria.append(orm.TradeRecord.state.in_(states))
+
+    # each branch returns at most all rows up to the end of requested page
+    branch_pagination = pagination
+    if not pagination.use_keyset:
+        branch_pagination = gene_sche.PaginationConfig(
+            size=pagination.size * (pagination.index + 1)
+        )
+
+    def as_buyer():
+        return (
+            select(orm.TradeRecord.trade_id, orm.TradeRecord.created_time)
+            # trades of removed items are not removed, exclude them explicitly
+            .join(orm.TradeRecord.item)
+            .where(
                 orm.TradeRecord.buyer_id == user.user_id,
-                # this user is seller
-                orm.User.user_id == user.user_id,
+                orm.Item.deleted_at == None,
+                *criteria,
             )
         )
-    )
 
-    # apply filters if exists
-    if states is not None:
-        stmt = stmt.where(orm.TradeRecord.state.in_(states))
+    def as_seller():
+        return (
+            select(orm.TradeRecord.trade_id, orm.TradeRecord.created_time)
+            .join(orm.TradeRecord.item)
+            .where(
+                orm.Item.user_id == user.user_id,
+                orm.Item.deleted_at == None,
+                *criteria,
+            )
+        )
 
-    # apply pagination config if exists
-    if pagination is not None:
-        stmt = pagination.use_on(stmt)
+    branches = [
+        select(
+            branch_pagination.use_keyset_on(
+                branch(), orm.TradeRecord.created_time, orm.TradeRecord.trade_id
+            ).subquery()
+        )
+        for branch in (as_buyer, as_seller)
+    ]
+    page_ids = union(*branches).subquery()
 
+    stmt = (
+        select(orm.TradeRecord)
+        .join(page_ids, orm.TradeRecord.trade_id == page_ids.c.trade_id)
+        # buyer, item and tags of all trades in a fixed number of queries
+        .options(*TRADE_OUT_LOAD)
+    )
+    stmt = pagination.use_keyset_on(
+        stmt, orm.TradeRecord.created_time, orm.TradeRecord.trade_id
+    )
     trade_list = (await ss.scalars(stmt)).all()
 
-    return trade_list
+    # a user could not buy items of their own, so two branches never overlap
+    total: int | None = None
+    if count_total:
+        counts = [
+            select(func.count()).select_from(branch().subquery()).scalar_subquery()
+            for branch in (as_buyer, as_seller)
+        ]
+        total = sum((await ss.execute(select(*counts))).one())
+
+    return gene_sche.PaginatedResult(
+        total=total,
+        pagination=pagination,
+        data=trade_list,
+        next_cursor=pagination.next_cursor(
+            trade_list, lambda t: (t.created_time, t.trade_id)
+        ),
+    )
 
 
 async def determine_cancel_reason(
@@ -16,6 +16,8 @@ from schemes import db as db_sche
 from schemes import general as gene_sche
 
 from ..database import init_session_maker, session_maker, SessionDep, try_commit
+from ..database import bulk_soft_delete, TRADE_OUT_LOAD
+from ..user.basic import mark_trades_changed
 
 from exception import error as exc
 
@@ -23,7 +25,14 @@ from ..database import init_session_maker, add_eager_load_to_stmt
 
 
 async def get_trade_by_id(ss: SessionDep, trade_id: int) -> orm.TradeRecord:
-    stmt = select(orm.TradeRecord).where(orm.TradeRecord.trade_id == trade_id)
+    """
+    Get a trade by id, with relations needed by `db_sche.TradeRecordOut` loaded
+    """
+    stmt = (
+        select(orm.TradeRecord)
+        .where(orm.TradeRecord.trade_id == trade_id)
+        .options(*TRADE_OUT_LOAD)
+    )
     try:
         return (await ss.scalars(stmt)).one()
     except sqlexc.NoResultFound:
@@ -51,11 +60,14 @@ async def remove_trades_cascade(
     """
     Remove a list of trade records
     """
-    t_total = gene_sche.BulkOpeartionInfo(operation="Remove trades")
-
-    for t in trades:
-        t.delete()
-        t_total.inc()
+    t_total = await bulk_soft_delete(
+        ss,
+        orm.TradeRecord,
+        orm.TradeRecord.trade_id.in_([t.trade_id for t in trades]),
+        operation="Remove trades",
+    )
+    # bulk update bypasses ORM events, mark permission cache invalidation manually
+    mark_trades_changed(ss, [t.buyer_id for t in trades])
 
     if commit:
         await try_commit(ss)
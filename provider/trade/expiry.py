@@ -0,0 +1,243 @@
+from dataclasses import dataclass
+from typing import Sequence
+
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.orm import InstrumentedAttribute
+
+from config import general as gene_config
+
+from schemes import sql as orm
+from schemes import db as db_sche
+
+from ..database import SessionDep, try_commit
+from ..user.basic import mark_trades_changed
+
+__all__ = [
+    "ExpiredTrade",
+    "expire_stale_trades",
+    "notify_expired_trades",
+]
+
+
+@dataclass
+class ExpiredTrade:
+    """
+    A trade cancelled by `expire_stale_trades()`
+    """
+
+    trade_id: int
+    item_id: int
+    item_name: str
+    buyer_id: int
+    seller_id: int
+    cancel_reason: orm.TradeCancelReason
+
+
+async def _expire_trades_batch(
+    ss: SessionDep,
+    state: orm.TradeState,
+    time_col: InstrumentedAttribute[int],
+    cutoff: int,
+    cancel_reason: orm.TradeCancelReason,
+    batch_size: int,
+    *criteria,
+) -> list[ExpiredTrade]:
+    """
+    Cancel at most `batch_size` trades in `state` with `time_col` earlier than
+    `cutoff`, oldest first, and commit.
+
+    Items of cancelled trades have their version bumped, so concurrent accept of
+    these trades fails with `concurrent_trade_operation`.
+    """
+    stmt = (
+        select(
+            orm.TradeRecord.trade_id,
+            orm.TradeRecord.item_id,
+            orm.Item.name,
+            orm.TradeRecord.buyer_id,
+            orm.Item.user_id,
+        )
+        .join(orm.TradeRecord.item)
+        .where(
+            orm.TradeRecord.state == state,
+            time_col < cutoff,
+            orm.TradeRecord.deleted_at == None,
+            *criteria,
+        )
+        # range scan on (state, time_col)
+        .order_by(time_col)
+        .limit(batch_size)
+        .with_for_update(of=orm.TradeRecord)
+    )
+    rows = (await ss.execute(stmt)).all()
+    if len(rows) == 0:
+        return []
+
+    trade_ids = [r[0] for r in rows]
+    await ss.execute(
+        update(orm.TradeRecord)
+        .where(orm.TradeRecord.trade_id.in_(trade_ids))
+        .values(state=orm.TradeState.cancelled, cancel_reason=cancel_reason)
+        .execution_options(synchronize_session=False)
+    )
+    # bulk update bypasses ORM events, mark permission cache invalidation manually
+    mark_trades_changed(ss, [r[3] for r in rows])
+    await ss.execute(
+        update(orm.Item)
+        .where(orm.Item.item_id.in_({r[1] for r in rows}))
+        .values(version=orm.Item.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await try_commit(ss)
+
+    return [
+        ExpiredTrade(
+            trade_id=trade_id,
+            item_id=item_id,
+            item_name=item_name,
+            buyer_id=buyer_id,
+            seller_id=seller_id,
+            cancel_reason=cancel_reason,
+        )
+        for trade_id, item_id, item_name, buyer_id, seller_id in rows
+    ]
+
+
+async def expire_stale_trades(
+    ss: SessionDep,
+    accept_timeout_s: int | None = None,
+    confirm_timeout_s: int | None = None,
+    batch_size: int | None = None,
+) -> list[ExpiredTrade]:
+    """
+    Cancel stale trades in batches, return all cancelled trades.
+
+    - Pending trades not accepted within `accept_timeout_s` since created,
+      with reason `seller_accept_timeout`
+    - Processing trades not confirmed by seller within `confirm_timeout_s` since
+      accepted, with reason `seller_confirm_timeout`. Trades already confirmed by
+      seller could not be cancelled, so they never expire
+
+    Args
+
+    - `accept_timeout_s` `confirm_timeout_s` `batch_size` Default to
+      `TRADE_ACCEPT_TIMEOUT_S`, `TRADE_CONFIRM_TIMEOUT_S` and
+      `TRADE_EXPIRY_BATCH_SIZE` of general config
+
+    Notes
+
+    Each batch is committed on its own, so trades cancelled before an error are kept.
+    Notifications are not sent, use `notify_expired_trades()` afterwards.
+    """
+    if accept_timeout_s is None:
+        accept_timeout_s = gene_config.TRADE_ACCEPT_TIMEOUT_S
+    if confirm_timeout_s is None:
+        confirm_timeout_s = gene_config.TRADE_CONFIRM_TIMEOUT_S
+    if batch_size is None:
+        batch_size = gene_config.TRADE_EXPIRY_BATCH_SIZE
+
+    now = orm.get_current_timestamp_ms()
+    rules = [
+        (
+            orm.TradeState.pending,
+            orm.TradeRecord.created_time,
+            now - accept_timeout_s * 1000,
+            orm.TradeCancelReason.seller_accept_timeout,
+            [],
+        ),
+        (
+            orm.TradeState.processing,
+            orm.TradeRecord.accepted_time,
+            now - confirm_timeout_s * 1000,
+            orm.TradeCancelReason.seller_confirm_timeout,
+            [orm.TradeRecord.confirmed_time == None],
+        ),
+    ]
+
+    expired: list[ExpiredTrade] = []
+    for state, time_col, cutoff, cancel_reason, criteria in rules:
+        while True:
+            batch = await _expire_trades_batch(
+                ss, state, time_col, cutoff, cancel_reason, batch_size, *criteria
+            )
+            expired.extend(batch)
+            if len(batch) < batch_size:
+                break
+
+    if len(expired) > 0:
+        logger.info(f"Expired {len(expired)} stale trades")
+
+    return expired
+
+
+_expiry_messages: dict[orm.TradeCancelReason, tuple[str, str]] = {
+    orm.TradeCancelReason.seller_accept_timeout: (
+        "The seller did not accept your transaction of item '{item}' in time, "
+        "the transaction has been cancelled",
+        "You did not accept the transaction of your item '{item}' in time, "
+        "the transaction has been cancelled",
+    ),
+    orm.TradeCancelReason.seller_confirm_timeout: (
+        "The seller did not confirm your transaction of item '{item}' in time, "
+        "the transaction has been cancelled",
+        "You did not confirm the transaction of your item '{item}' in time, "
+        "the transaction has been cancelled",
+    ),
+}
+"""
+`cancel_reason -> (message to buyer, message to seller)`
+"""
+
+
+async def notify_expired_trades(
+    ss: SessionDep, expired: Sequence[ExpiredTrade]
+) -> int:
+    """
+    Notify buyers and sellers of expired trades on behalf of system, return count
+    of sent notifications.
+
+    Failure of a notification is logged and does not stop the others.
+    """
+    # lazy import
+    from ..notification import NotificationSender
+
+    if len(expired) == 0:
+        return 0
+
+    user_ids = {t.buyer_id for t in expired} | {t.seller_id for t in expired}
+    users = {
+        u.user_id: u
+        for u in (
+            await ss.scalars(select(orm.User).where(orm.User.user_id.in_(user_ids)))
+        ).all()
+    }
+
+    n_sender = NotificationSender(session=ss, trusted=True)
+    sent = 0
+    for trade in expired:
+        buyer_msg, seller_msg = _expiry_messages[trade.cancel_reason]
+        for receiver_id, msg in [
+            (trade.buyer_id, buyer_msg),
+            (trade.seller_id, seller_msg),
+        ]:
+            receiver = users.get(receiver_id)
+            if receiver is None:
+                continue
+            try:
+                await n_sender.send(
+                    content=db_sche.NotificationContentOut(
+                        category="trade",
+                        title="Transaction Expired",
+                        message=msg.format(item=trade.item_name),
+                    ),
+                    receiver=receiver,
+                )
+                sent += 1
+            except Exception as e:
+                logger.exception(e)
+                logger.error(
+                    f"Failed to notify user {receiver_id} of expired trade {trade.trade_id}"
+                )
+
+    return sent
@@ -4,7 +4,9 @@ from .basic import (
     update_user_description,
     check_duplicate_contacts,
     add_contact_info,
-    get_all_active_buyers,
+    invalidate_contact_info_permission_cache,
+    mark_trades_changed,
+    check_is_active_buyer,
     check_get_contact_info_permission,
     get_user_contact_info_list,
 )
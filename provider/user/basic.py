@@ -1,8 +1,10 @@
-from typing import Annotated, cast, List
+from typing import Annotated, cast, List, Collection
 
 from loguru import logger
-from sqlalchemy import select, func, Column, distinct
+from sqlalchemy import select, exists, func, event, Column, distinct
 from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import and_
 from sqlalchemy import exc as sqlexc
 
@@ -14,10 +16,12 @@ from schemes import sql as orm
 from schemes import auth as auth_sche
 from schemes import db as db_sche
 
-from ..database import init_session_maker, session_maker, SessionDep
+from ..database import init_session_maker, session_maker, SessionDep, PrimarySession
 
 from exception import error as exc
 
+from tools.ttl_cache import TTLCache
+
 from ..database import init_session_maker, add_eager_load_to_stmt
 
 from .core import *
@@ -26,7 +30,9 @@ __all__ = [
     "update_user_description",
     "check_duplicate_contacts",
     "add_contact_info",
-    "get_all_active_buyers",
+    "invalidate_contact_info_permission_cache",
+    "mark_trades_changed",
+    "check_is_active_buyer",
     "check_get_contact_info_permission",
     "get_user_contact_info_list",
 ]
@@ -40,6 +46,7 @@ async def update_user_description(
     """Update user description in database"""
     user.description = description
     await session.commit()
+    invalidate_user_cache([user.user_id])
 
 
 async def check_duplicate_contacts(ss: SessionDep, info: db_sche.ContactInfoIn) -> None:
@@ -96,63 +103,91 @@ async def add_contact_info(ss: SessionDep, user: orm.User, info: db_sche.Contact
         raise
 
 
-async def get_all_active_buyers(ss: SessionDep, user_id: int):
+_contact_info_permission_cache = TTLCache[tuple[int, int], bool](
+    ttl_s=auth_conf.CONTACT_INFO_PERMISSION_CACHE_TTL_SECONDS,
+    max_size=auth_conf.USER_CACHE_MAX_SIZE,
+)
+"""
+Cross-request cache of `(seller_id, buyer_id) -> is active buyer`
+
+Invalidated automatically when `TradeRecord` rows changed through ORM.
+For bulk `UPDATE` statements, call `mark_trades_changed()` manually.
+Removal of items is not tracked, those entries are stale at most TTL seconds.
+"""
+
+
+def invalidate_contact_info_permission_cache(buyer_ids: Collection[int]) -> int:
+    """
+    Remove cached permission pairs of buyers, return removed entries count
     """
-    Get all active buyers of a user
+    buyer_id_set = set(buyer_ids)
+    if len(buyer_id_set) == 0:
+        return 0
+    return _contact_info_permission_cache.pop_if(lambda k, _: k[1] in buyer_id_set)
 
-    Notes:
 
-    - Active buyer of a user means all other users that have **active processing trade records
-      of an item owned by this user**
-    - The info returned by this function is usually used to check sellers' permission to access
-      the contact info of a buyer
+def mark_trades_changed(ss: Session | AsyncSession, buyer_ids: Collection[int]) -> None:
     """
+    Record buyers whose trades changed in `ss`, cached permission pairs of them
+    will be invalidated once `ss` commits.
 
-    user1 = aliased(orm.User)
-    item1 = aliased(orm.Item)
-
-    # all items selling by seller
-    _subq_seller_valid_items = (
-        select(item1)
-        .select_from(user1)
-        .join(
-            user1.items.of_type(item1)
-            .and_(user1.deleted_at == None)
-            .and_(user1.user_id == user_id)
-        )
-        .where(item1.deleted_at == None)
-        .where(item1.state == orm.ItemState.valid)
-        .subquery()
-    )
+    Called automatically for ORM changes of `TradeRecord`, bulk `UPDATE`
+    statements should call this function manually.
+    """
+    changed: set[int] = ss.info.setdefault("trade_changed_buyer_ids", set())
+    changed.update(buyer_ids)
 
-    valid_item = aliased(orm.Item, _subq_seller_valid_items, "valid_item")
 
-    # all trade record with those items
-    _subq_valid_trades = (
-        select(orm.TradeRecord).join_from(
-            valid_item,
-            valid_item.record.and_(orm.TradeRecord.deleted_at == None).and_(
-                orm.TradeRecord.state == orm.TradeState.processing
-            ),
-        )
-        # .where(orm.TradeRecord.deleted == False)
-        # .where(orm.TradeRecord.state == orm.TradeState.processing)
-        .order_by(orm.TradeRecord.created_time.desc())
-    ).subquery()
+@event.listens_for(orm.TradeRecord, "after_insert")
+@event.listens_for(orm.TradeRecord, "after_update")
+def _mark_trade_changed(mapper, connection, target: orm.TradeRecord):
+    ss = object_session(target)
+    if ss is None:
+        return
 
-    valid_trade = aliased(orm.TradeRecord, _subq_valid_trades, "valid_trade")
+    mark_trades_changed(ss, [target.buyer_id])
 
-    stmt_valid_buyers = select(orm.User).join(
-        valid_trade, orm.User.user_id == valid_trade.buyer_id
+
+@event.listens_for(PrimarySession, "after_commit")
+def _invalidate_committed_trade_changes(ss: Session):
+    invalidate_contact_info_permission_cache(
+        ss.info.pop("trade_changed_buyer_ids", set())
     )
 
-    res = await ss.scalars(stmt_valid_buyers)
-    res = res.all()
 
-    logger.debug(f"SQL for contact info permission: \n {stmt_valid_buyers}")
-    logger.debug(f"Return of SQL execution: {res}")
+async def check_is_active_buyer(ss: SessionDep, seller_id: int, buyer_id: int) -> bool:
+    """
+    Check if `buyer_id` is an active buyer of `seller_id`
 
-    return res
+    Notes:
+
+    - Active buyer of a user means all other users that have **active processing trade records
+      of an item owned by this user**
+    - The info returned by this function is usually used to check sellers' permission to access
+      the contact info of a buyer
+    - Resolved by a single `EXISTS` query on trades of the buyer, cached in
+      `_contact_info_permission_cache`
+    """
+    key = (seller_id, buyer_id)
+    is_active = _contact_info_permission_cache.get(key)
+    if is_active is not None:
+        return is_active
+
+    stmt = select(
+        exists().where(
+            orm.TradeRecord.buyer_id == buyer_id,
+            orm.TradeRecord.state == orm.TradeState.processing,
+            orm.TradeRecord.deleted_at == None,
+            orm.Item.item_id == orm.TradeRecord.item_id,
+            orm.Item.user_id == seller_id,
+            orm.Item.state == orm.ItemState.valid,
+            orm.Item.deleted_at == None,
+        )
+    )
+    is_active = bool(await ss.scalar(stmt))
+    _contact_info_permission_cache.set(key, is_active)
+
+    return is_active
 
 
 async def check_get_contact_info_permission(
@@ -177,9 +212,8 @@ async def check_get_contact_info_permission(
     For more info about permission check related to contact info, check out
     [this Wiki page](https://github.com/NFSandbox/sh_trade_backend/wiki/User-Contact-Info)
     """
-    # promise this two user is exists and valid
+    # promise the requested user is exists and valid
     try:
-        requester = await get_user_from_user_id(ss, requester_id)
         user = await get_user_from_user_id(ss, user_id)
     except exc.NoResultError as e:
         raise exc.NoResultError(
@@ -190,15 +224,18 @@ async def check_get_contact_info_permission(
     if user_id == requester_id:
         return
 
-    # get all valid buyers list, check if the requested user in this list
-    buyer_list = await get_all_active_buyers(ss, requester_id)
-    # for buyer in buyer_list:
-    #     if buyer.user_id == user.user_id:
-    #         return
-    if user in buyer_list:
+    # requester is the seller of a processing trade of requested user
+    if await check_is_active_buyer(ss, seller_id=requester_id, buyer_id=user_id):
         return
 
     # raise error
+    try:
+        requester = await get_user_from_user_id(ss, requester_id)
+    except exc.NoResultError as e:
+        raise exc.NoResultError(
+            message="Could not found requester or user by provided user ID"
+        ) from e
+
     raise exc.PermissionError(
         roles=await requester.awaitable_attrs.roles,
         message=f"Current account do not have permission to get contact info of user with user_id: {user.user_id}",
@@ -3,6 +3,7 @@ from typing import Annotated, cast, List, Sequence
 from loguru import logger
 from sqlalchemy import select, func, Column, distinct
 from sqlalchemy.orm import selectinload, QueryableAttribute, aliased
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.sql import and_
 from sqlalchemy import exc as sqlexc
 
@@ -21,9 +22,12 @@ from schemes import db as db_sche
 from schemes import general as gene_sche
 
 from ..database import init_session_maker, session_maker, SessionDep, try_commit
+from ..database import ROUTING_KEY, bulk_soft_delete
 
 from exception import error as exc
 
+from tools.ttl_cache import TTLCache
+
 from ..database import init_session_maker, add_eager_load_to_stmt
 
 
@@ -33,10 +37,33 @@ __all__ = [
     "get_user_from_user_id",
     "get_current_user_or_none",
     "get_current_user",
+    "invalidate_user_cache",
     "remove_users_cascade",
 ]
 
 
+_user_cache = TTLCache[str, db_sche.UserOut](
+    ttl_s=auth_conf.USER_CACHE_TTL_SECONDS,
+    max_size=auth_conf.USER_CACHE_MAX_SIZE,
+)
+"""
+Cache of resolved users, `supertoken_id -> basic user columns`
+
+Should not be used directly, use `invalidate_user_cache()` after changing user columns.
+"""
+
+
+def invalidate_user_cache(user_ids: Sequence[int]) -> int:
+    """
+    Remove cached users with `user_id` in `user_ids` from current user cache,
+    return removed entries count.
+
+    Call this function after user columns changed or user removed.
+    """
+    user_id_set = set(user_ids)
+    return _user_cache.pop_if(lambda _, u: u.user_id in user_id_set)
+
+
 SuperTokenSessionDep = Annotated[SessionContainer, Depends(verify_session())]
 SuperTokenSessionOrNoneDep = Annotated[
     SessionContainer | None, Depends(verify_session(session_required=False))
@@ -51,14 +78,38 @@ async def get_current_user(
     Get current user based on user token
 
     This function could be used as a FastAPI dependency
+
+    Notes
+
+    Resolved users are cached in `_user_cache`. On cache hit, the user instance is
+    attached to `session` without any query. Otherwise, user is retrieved with
+    a single joined query.
     """
     if supertoken_user is None:
         raise exc.TokenError(no_token=True)
 
     supertoken_id = supertoken_user.user_id
-    orm_supertoken = await session.get(orm.SuperTokenUser, supertoken_id)
-    assert orm_supertoken is not None
-    orm_user = await session.run_sync(lambda ss: orm_supertoken.user)
+
+    cached_user = _user_cache.get(supertoken_id)
+    if cached_user is not None:
+        # attach as a clean persistent instance, without emitting SELECT
+        orm_user = orm.User(**cached_user.model_dump(), deleted_at=None)
+        make_transient_to_detached(orm_user)
+        orm_user = await session.merge(orm_user, load=False)
+    else:
+        stmt = (
+            select(orm.User)
+            .join(orm.User.supertoken_ids)
+            .where(orm.SuperTokenUser.supertoken_id == supertoken_id)
+        )
+        orm_user = (await session.scalars(stmt)).one_or_none()
+        if orm_user is None:
+            raise exc.TokenError(message="Could not find user of current session")
+
+        _user_cache.set(supertoken_id, db_sche.UserOut.model_validate(orm_user))
+
+    # identify the session owner for read-your-writes routing
+    session.info[ROUTING_KEY] = orm_user.user_id
 
     return orm_user
 
@@ -133,8 +184,15 @@ async def get_user_contact_info_count(ss: SessionDep, user: orm.User):
     """
     Return count of user contact info (internal contact info excluded)
     """
-    count = await ss.run_sync(lambda x: len(user.external_contact_info))
-    return count
+    count = await ss.scalar(
+        select(func.count())
+        .select_from(orm.ContactInfo)
+        .where(
+            orm.ContactInfo.user_id == user.user_id,
+            orm.ContactInfo.internal == False,
+        )
+    )
+    return count or 0
 
 
 async def remove_all_roles_of_users(
@@ -145,17 +203,20 @@ async def remove_all_roles_of_users(
     """
     Remove all roles of a list of users
     """
-    stmt = select(orm.AssociationUserRole).where(
-        orm.AssociationUserRole.user_id.in_([u.user_id for u in users])
-    )
+    # lazy import
+    from ..auth import mark_roles_changed
 
-    assoc_user_role = (await ss.scalars(stmt)).all()
+    user_id_list = [u.user_id for u in users]
 
-    assoc_total = gene_sche.BulkOpeartionInfo(operation="Remove user-role associations")
+    assoc_total = await bulk_soft_delete(
+        ss,
+        orm.AssociationUserRole,
+        orm.AssociationUserRole.user_id.in_(user_id_list),
+        operation="Remove user-role associations",
+    )
 
-    for assoc in assoc_user_role:
-        assoc.delete()
-        assoc_total.inc()
+    # bulk update bypasses ORM events, mark role cache invalidation manually
+    mark_roles_changed(ss, user_id_list)
 
     if commit:
         await try_commit(ss)
@@ -206,81 +267,122 @@ async def remove_users_cascade(
       should be able to remove their account etc.)
     """
     # lazy import
-    from ..item.core import get_cascade_items_from_users, remove_items_cascade
-    from ..item.core import get_cascade_questions_from_askers, remove_questions
-    from ..trade.core import get_cascade_trade_from_buyers, remove_trades_cascade
-    from ..fav.core import remove_fav_items_cascade, get_cascade_fav_items_by_users
+    from ..item.core import get_cascade_item_ids_from_users, remove_items_cascade_by_ids
+    from ..fav.core import remove_fav_associations
+    from .basic import mark_trades_changed
 
     user_id_list = [u.user_id for u in users]
 
+    async def check_constraint(entity, *criteria, message: str):
+        if not constraint:
+            return
+        count = await ss.scalar(
+            select(func.count())
+            .select_from(entity)
+            .where(*criteria, entity.deleted_at == None)
+        )
+        if count:
+            raise exc.CascadeConstraintError(message)
+
     # remove items
-    items = await get_cascade_items_from_users(ss, users)
-    if constraint and len(items) > 0:
+    item_id_list = await get_cascade_item_ids_from_users(ss, user_id_list)
+    if constraint and len(item_id_list) > 0:
         raise exc.CascadeConstraintError("Could not remove user with valid items")
-    item_total = await remove_items_cascade(ss, items, commit=False)
+    item_total = await remove_items_cascade_by_ids(ss, item_id_list, commit=False)
 
     # remove contact info
-    contact_info_list = await get_cascade_contact_info_from_users(ss, users)
-    if constraint and len(contact_info_list) > 0:
-        raise exc.CascadeConstraintError(
-            "Could not remove user with valid contact info"
-        )
-    c_total = gene_sche.BulkOpeartionInfo(operation="Remove contact info")
-    for c in contact_info_list:
-        c.delete()
-        c_total.inc()
+    await check_constraint(
+        orm.ContactInfo,
+        orm.ContactInfo.user_id.in_(user_id_list),
+        message="Could not remove user with valid contact info",
+    )
+    c_total = await bulk_soft_delete(
+        ss,
+        orm.ContactInfo,
+        orm.ContactInfo.user_id.in_(user_id_list),
+        operation="Remove contact info",
+    )
 
     # remove trade
-    trades = await get_cascade_trade_from_buyers(ss, users)
-    if constraint and len(trades) > 0:
-        raise exc.CascadeConstraintError("Could not remove user with valid trades")
-    trade_total = await remove_trades_cascade(ss, trades, commit=False)
+    await check_constraint(
+        orm.TradeRecord,
+        orm.TradeRecord.buyer_id.in_(user_id_list),
+        message="Could not remove user with valid trades",
+    )
+    trade_total = await bulk_soft_delete(
+        ss,
+        orm.TradeRecord,
+        orm.TradeRecord.buyer_id.in_(user_id_list),
+        operation="Remove trades",
+    )
+    mark_trades_changed(ss, user_id_list)
 
     # remove question
-    questions = await get_cascade_questions_from_askers(ss, users)
-    if constraint and len(questions) > 0:
-        raise exc.CascadeConstraintError(
-            "Could not remove user with valid asked questions"
-        )
-    question_total = await remove_questions(ss, questions, commit=False)
+    await check_constraint(
+        orm.Question,
+        orm.Question.asker_id.in_(user_id_list),
+        message="Could not remove user with valid asked questions",
+    )
+    question_total = await bulk_soft_delete(
+        ss,
+        orm.Question,
+        orm.Question.asker_id.in_(user_id_list),
+        operation="Delete questions",
+    )
 
     # remove associations user-fav-item
-    assoc_fav_items = await get_cascade_fav_items_by_users(ss, users)
-    if constraint and len(assoc_fav_items) > 0:
-        raise exc.CascadeConstraintError(
-            "Could not remove user with valid associated fav items"
-        )
-    assoc_fav_items_total = await remove_fav_items_cascade(
-        ss, assoc_fav_items, commit=False
+    await check_constraint(
+        orm.AssociationUserFavouriteItem,
+        orm.AssociationUserFavouriteItem.user_id.in_(user_id_list),
+        message="Could not remove user with valid associated fav items",
+    )
+    assoc_fav_items_total = await remove_fav_associations(
+        ss,
+        orm.AssociationUserFavouriteItem.user_id.in_(user_id_list),
+        operation="Remove user-fav-item associations",
     )
 
     # remove associations user-role
     assoc_user_role_total = await remove_all_roles_of_users(ss, users, commit=False)
 
     # remove supertokens
-    for user in users:
-        for supertoken_user in await ss.run_sync(lambda ss: user.supertoken_ids):
-            # contact usertoken backend to remove supertoken user
-            await delete_user(supertoken_user.supertoken_id)
-            # remove supertoken user relationship in business database
-            supertoken_user.delete()
+    supertoken_id_list = (
+        await ss.scalars(
+            select(orm.SuperTokenUser.supertoken_id).where(
+                orm.SuperTokenUser.user_id.in_(user_id_list)
+            )
+        )
+    ).all()
+    for supertoken_id in supertoken_id_list:
+        # contact usertoken backend to remove supertoken user
+        await delete_user(supertoken_id)
+    # remove supertoken user relationship in business database
+    await bulk_soft_delete(
+        ss,
+        orm.SuperTokenUser,
+        orm.SuperTokenUser.supertoken_id.in_(supertoken_id_list),
+    )
 
     # finally, remove user itself
-    user_total = gene_sche.BulkOpeartionInfo(operation="Remove users")
-    for u in users:
-        u.delete()
-        user_total.inc()
+    user_total = await bulk_soft_delete(
+        ss,
+        orm.User,
+        orm.User.user_id.in_(user_id_list),
+        operation="Remove users",
+    )
 
     if commit:
         await try_commit(ss)
 
+    invalidate_user_cache(user_id_list)
+
     remove_user_total: list[gene_sche.BulkOpeartionInfo] = (
         [user_total]
         + [c_total]
         + item_total
-        + trade_total
-        + question_total
-        + assoc_fav_items_total
+        + [trade_total]
+        + [question_total]
+        + [assoc_fav_items_total]
         + assoc_user_role_total
     )
 
@@ -61,6 +61,11 @@ class ItemOut(DbSchemaBaseModel):
     created_time: int
     price: int
     state: orm.ItemState
+    fav_count: int = 0
+
+    # only set when the item list is decorated for a signed-in user,
+    # check out `provider.fav.mark_faved_items()`
+    faved_by_me: bool | None = None
 
     # this field need to be loaded manually in advance when validating from ORM class instance
     tags: list[TagOut] | None = None
@@ -116,6 +121,29 @@ class TradeRecordOut(DbSchemaBaseModel):
         from_attributes = True
 
 
+class JobOut(DbSchemaBaseModel):
+    """
+    Status of a background job.
+
+    `result` is set when the job succeeded, `error` records the error of the
+    last failed attempt.
+
+    `poll_token` is only set for jobs that could be polled without a session,
+    check out `/job/status/token`.
+    """
+
+    job_id: int
+    job_type: str
+    state: orm.JobState
+    attempts: int
+    max_attempts: int
+    created_time: int
+    finished_time: int | None = None
+    result: dict | None = None
+    error: str | None = None
+    poll_token: str | None = None
+
+
 AllowedContentTypeLiteral = Literal["text", "markdown", "url_action"]
 AllowedCategoryLiteral = Literal["basic", "user_msg", "system"]
 
@@ -2,16 +2,34 @@
 Declare models uses as util data structures in API I/O
 """
 
+import base64
+import binascii
+import functools
+import json
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Collection, Annotated, Any, Dict, List, Sequence, cast
+from typing import (
+    Callable,
+    Collection,
+    Annotated,
+    Any,
+    Dict,
+    List,
+    Sequence,
+    cast,
+)
 from dataclasses import dataclass
 
-from pydantic import BaseModel, NonNegativeInt, PositiveInt
+from pydantic import BaseModel, NonNegativeInt, PositiveInt, TypeAdapter
 
-from sqlalchemy.sql import Select
+from fastapi import Response
+
+from sqlalchemy.sql import Select, and_, or_
+from sqlalchemy.orm import QueryableAttribute
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from exception import error as exc
+
 from .sql import TradeState
 
 
@@ -20,6 +38,25 @@ class BackendInfoOut(BaseModel):
     on_cloud: bool
 
 
+class PoolStatusOut(BaseModel):
+    """
+    Live status of the connection pool of current worker process
+
+    - `size` Configured `pool_size`
+    - `checked_in` Idle connections in pool
+    - `checked_out` Connections currently used by sessions
+    - `overflow` Connections opened beyond `pool_size`, negative value means
+      the pool has not been filled up yet
+    - `max_overflow` Configured `max_overflow`
+    """
+
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+
+
 class BulkOpeartionInfo(BaseModel):
     """
     Pydantic schema used when backend need to return the result of bulk operation,
@@ -89,6 +126,16 @@ class TradesFilterTypeIn(str, Enum):
         return target_list
 
 
+class ItemSortTypeIn(str, Enum):
+    """
+    Sort order of item catalog
+    """
+
+    recent = "recent"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+
+
 class PaginationConfig(BaseModel):
     """
     Pagination tool class that used to add pagination to select statement
@@ -96,7 +143,10 @@ class PaginationConfig(BaseModel):
     Fields
 
     - `size` Specify how many rows in a page
-    - `index` Specify the page number, zero-indexed
+    - `index` Specify the page number, zero-indexed. Ignored in keyset mode
+    - `keyset` Use keyset (cursor) pagination instead of `LIMIT/OFFSET`
+    - `cursor` The `next_cursor` returned with previous page. Passing a cursor
+      implies `keyset` mode, leave it empty to get the first page
 
     Usages
 
@@ -110,6 +160,14 @@ class PaginationConfig(BaseModel):
         @router.get('/test')
         def test_endpoint(pagi_conf : PaginationConfig):
             pass
+
+    Keyset Mode
+
+    `LIMIT/OFFSET` scans and drops all rows before the requested page, which becomes
+    slow on deep pages. In keyset mode the page is located by a seek predicate on
+    `(created_time, primary key)` of the last row of previous page, which could be
+    resolved by an index on those columns no matter how deep the page is.
+    Check out `use_keyset_on()` and `next_cursor()`.
     """
 
     # how many rows contains in a page
@@ -118,6 +176,14 @@ class PaginationConfig(BaseModel):
     # zero-index page number
     index: Annotated[int, NonNegativeInt] = 0
 
+    # keyset pagination
+    keyset: bool = False
+    cursor: str | None = None
+
+    @property
+    def use_keyset(self) -> bool:
+        return self.keyset or self.cursor is not None
+
     def use_on[T: Select](self, select_stmt: T) -> T:
         """
         Apply this pagination config to a statement object, then return a new select
@@ -133,46 +199,166 @@ class PaginationConfig(BaseModel):
         limit = self.size
         return select_stmt.limit(limit).offset(offset)
 
+    def use_keyset_on[T: Select](
+        self,
+        select_stmt: T,
+        time_col: QueryableAttribute[int],
+        pk_col: QueryableAttribute[int],
+        desc: bool = True,
+    ) -> T:
+        """
+        Order the statement by `(time_col, pk_col)`, and apply this pagination config
+        to it. The seek predicate is only added in keyset mode, else fallback to
+        `use_on()`.
+
+        Args
+
+        - `time_col` Usually the `created_time` column of the selected entity, any
+          integer column could be used, e.g. `price`
+        - `pk_col` Primary key of the selected entity, used as the tie-breaker
+        - `desc` Order direction, must be the same across all pages of a cursor
+
+        Raises
+
+        - `param_error` Malformed cursor
+        """
+        if desc:
+            select_stmt = select_stmt.order_by(time_col.desc(), pk_col.desc())
+        else:
+            select_stmt = select_stmt.order_by(time_col.asc(), pk_col.asc())
+
+        if not self.use_keyset:
+            return self.use_on(select_stmt)
+
+        if self.cursor is not None:
+            last_time, last_pk = self.decode_cursor(self.cursor)
+            # expanded form of (time, pk) < (last_time, last_pk), which the
+            # optimizer could turn into a range scan on the index
+            if desc:
+                seek = or_(
+                    time_col < last_time,
+                    and_(time_col == last_time, pk_col < last_pk),
+                )
+            else:
+                seek = or_(
+                    time_col > last_time,
+                    and_(time_col == last_time, pk_col > last_pk),
+                )
+            select_stmt = select_stmt.where(seek)
+
+        return select_stmt.limit(self.size)
+
+    def next_cursor[RowType](
+        self,
+        rows: Sequence[RowType],
+        key: Callable[[RowType], tuple[int, int]],
+    ) -> str | None:
+        """
+        Return the cursor pointing to the page after `rows`.
+
+        Return `None` if not in keyset mode or `rows` is the last page.
+
+        - `key` Function that returns `(time_col, primary key)` values of a row, must
+          match the columns passed to `use_keyset_on()`
+        """
+        if not self.use_keyset or len(rows) < self.size:
+            return None
+        return self.encode_cursor(*key(rows[-1]))
+
+    @staticmethod
+    def encode_cursor(created_time: int, pk: int) -> str:
+        raw = json.dumps([created_time, pk], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[int, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_time, pk = json.loads(raw)
+            if not isinstance(created_time, int) or not isinstance(pk, int):
+                raise ValueError
+            return created_time, pk
+        except (binascii.Error, ValueError, TypeError):
+            raise exc.ParamError(param_name="cursor", message="Invalid cursor")
+
 
 class PaginatedResult[DType: Any]:
-    def __init__(self, total: int, pagination: PaginationConfig, data: DType) -> None:
+    def __init__(
+        self,
+        total: int | None,
+        pagination: PaginationConfig,
+        data: DType,
+        next_cursor: str | None = None,
+    ) -> None:
         self.total = total
         self.pagination = pagination
         self.data = data
+        self.next_cursor = next_cursor
 
 
 class PaginatedResultOut[DType: Sequence[BaseModel] | List[BaseModel] | BaseModel](
     BaseModel
 ):
-    total: int
+    total: int | None = None
     pagination: PaginationConfig
     data: DType
+    next_cursor: str | None = None
 
     class Config:
         from_attributes = True
 
 
-async def validate_result[ClsType](ss: AsyncSession, data, cls: ClsType):
+@functools.cache
+def get_type_adapter[ClsType](cls: type[ClsType]) -> TypeAdapter[ClsType]:
+    """
+    Return the `TypeAdapter` of an output type, e.g. `list[db_sche.ItemOut]`.
+
+    Building an adapter compiles the validator and serializer of the type, so
+    adapters are built once per type and cached.
+    """
+    return TypeAdapter(cls)
+
+
+async def validate_result[ClsType](
+    ss: AsyncSession, data, cls: type[ClsType]
+) -> ClsType:
     """
     Automatically validate the result in an SQLAlchemy sync session.
 
     - `ss` The session used to execute `run_sync`
-    - `data` The data to be validated. If its a ORM class instance, then this instance must
-      be bound to the received `ss`, otherwise will cause error
-    - `cls` The output type of the data, must inherited from Pydantic `BaseModel`
+    - `data` The data to be validated. If its a ORM class instance, then this instance
+      must be bound to the received `ss`, otherwise will cause error
+    - `cls` The output type of the data, a Pydantic model or a container of models,
+      e.g. `list[db_sche.ItemOut]`
+    """
+    adapter = get_type_adapter(cls)
+    return await ss.run_sync(
+        lambda _: adapter.validate_python(data, from_attributes=True)
+    )
 
-    Note:
 
-    - If the `data` is ORM
+def json_response[ClsType](
+    value: ClsType, cls: type[ClsType], exclude_none: bool = False
+) -> Response:
     """
-    # check attributes
-    if not hasattr(cls, "model_validate"):
-        raise Exception(
-            "Could only validated to type which has 'model_validate' method"
-        )
+    Serialize an already validated `value` of output type `cls` to a JSON response.
 
-    # validate
-    res: ClsType = await ss.run_sync(lambda x: cls.model_validate(data, from_attributes=True))  # type: ignore
+    FastAPI dumps a returned model and validates it against `response_model` again.
+    A returned `Response` skips that, the value is serialized to JSON bytes once by
+    the cached serializer of `cls`. Keep `response_model` on the route for docs.
 
-    # return
-    return res
+    - `exclude_none` Should match `response_model_exclude_none` of the route
+    """
+    return Response(
+        content=get_type_adapter(cls).dump_json(value, exclude_none=exclude_none),
+        media_type="application/json",
+    )
+
+
+async def validated_response(
+    ss: AsyncSession, data, cls: type, exclude_none: bool = False
+) -> Response:
+    """
+    Validate `data` with `validate_result()` and return it with `json_response()`
+    """
+    return json_response(await validate_result(ss, data, cls), cls, exclude_none)
@@ -10,7 +10,18 @@ from loguru import logger
 from pydantic import BaseModel
 
 # sqlalchemy basics
-from sqlalchemy import Select, BIGINT, String, JSON, ForeignKey, Column, Table
+from sqlalchemy import (
+    Select,
+    BIGINT,
+    INTEGER,
+    String,
+    JSON,
+    ForeignKey,
+    Column,
+    Table,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -64,7 +75,9 @@ class SoftDeleteMixin(
 
 
 class SQLBaseModel(DeclarativeBase, AsyncAttrs, SoftDeleteMixin):
-    type_annotation_map = {int: BIGINT}
+    # SQLite only auto-increments "INTEGER PRIMARY KEY" columns,
+    # use INTEGER variant when running on the SQLite stand-in
+    type_annotation_map = {int: BIGINT().with_variant(INTEGER(), "sqlite")}
 
 
 # custom column type
@@ -79,13 +92,17 @@ NullableTimeStamp = Annotated[int, mapped_column(nullable=True, default=None)]
 
 class AssociationUserRole(SQLBaseModel):
     __tablename__ = "association_users_roles"
+    __table_args__ = (
+        Index("ix_association_users_roles_user_id_role_id", "user_id", "role_id"),
+        Index("ix_association_users_roles_role_id", "role_id"),
+    )
 
     association_users_roles_id: Mapped[IntPrimaryKey] = mapped_column(
         autoincrement=True
     )
 
-    user_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("user.user_id"))
-    role_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("role.role_id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.user_id"))
+    role_id: Mapped[int] = mapped_column(ForeignKey("role.role_id"))
 
     created_time: Mapped[TimeStamp]
 
@@ -104,6 +121,14 @@ class User(SQLBaseModel):
     description: Mapped[LongString] = mapped_column(nullable=True)
     created_time: Mapped[TimeStamp]
 
+    # denormalized count of unread received notifications, only updated with
+    # atomic UPDATE statements, check out `provider.notification.core`
+    unread_notification_count: Mapped[int] = mapped_column(
+        default=0, server_default="0"
+    )
+    # denormalized count of active favourite items, check out `provider.fav.core`
+    fav_item_count: Mapped[int] = mapped_column(default=0, server_default="0")
+
     buys: Mapped[List["TradeRecord"]] = relationship(
         back_populates="buyer", foreign_keys="TradeRecord.buyer_id"
     )
@@ -202,6 +227,7 @@ class SuperTokenUser(SQLBaseModel):
     """
 
     __tablename__ = "supertoken_user"
+    __table_args__ = (Index("ix_supertoken_user_user_id", "user_id"),)
 
     user_id: Mapped[int] = mapped_column(ForeignKey("user.user_id"))
     supertoken_id: Mapped[LongString] = mapped_column(primary_key=True)
@@ -225,6 +251,7 @@ class ContactInfoType(Enum):
 
 class ContactInfo(SQLBaseModel):
     __tablename__ = "contact_info"
+    __table_args__ = (Index("ix_contact_info_user_id", "user_id"),)
 
     contact_info_id: Mapped[IntPrimaryKey] = mapped_column()
 
@@ -245,6 +272,33 @@ class ItemState(str, Enum):
 
 class Item(SQLBaseModel):
     __tablename__ = "item"
+    __table_args__ = (
+        # keyword search of catalog, ngram parser is required to tokenize CJK text.
+        # not available on SQLite, check out `provider.item.search`
+        Index(
+            "ix_item_fulltext_name_description",
+            "name",
+            "description",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+        # items of a seller, optionally filtered by state, newest first
+        Index(
+            "ix_item_user_id_deleted_at_state_created_time",
+            "user_id",
+            "deleted_at",
+            "state",
+            "created_time",
+        ),
+        # catalog browsing sorted by recency or price
+        Index(
+            "ix_item_state_deleted_at_created_time",
+            "state",
+            "deleted_at",
+            "created_time",
+        ),
+        Index("ix_item_state_deleted_at_price", "state", "deleted_at", "price"),
+    )
 
     item_id: Mapped[IntPrimaryKey] = mapped_column()
 
@@ -255,6 +309,11 @@ class Item(SQLBaseModel):
     created_time: Mapped[TimeStamp] = mapped_column(default=get_current_timestamp_ms)
     price: Mapped[int] = mapped_column()
     state: Mapped[ItemState] = mapped_column(default=ItemState.valid)
+    # denormalized count of users who favourited this item, check out `provider.fav.core`
+    fav_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # bumped by every trade start / accept of this item, used as an optimistic lock,
+    # check out `provider.trade.basic.claim_item_version()`
+    version: Mapped[int] = mapped_column(default=0, server_default="0")
 
     trades: Mapped[List["TradeRecord"]] = relationship(back_populates="item")
     processing_trade: Mapped["TradeRecord | None"] = relationship(
@@ -307,6 +366,17 @@ class TradeCancelReason(Enum):
 
 class TradeRecord(SQLBaseModel):
     __tablename__ = "trade"
+    __table_args__ = (
+        # processing / pending trades of an item
+        Index("ix_trade_item_id_state", "item_id", "state"),
+        # trades of a buyer, optionally filtered by state
+        Index("ix_trade_buyer_id_state", "buyer_id", "state"),
+        # trades of a buyer, newest first
+        Index("ix_trade_buyer_id_created_time", "buyer_id", "created_time"),
+        # expiry scan of stale pending / processing trades
+        Index("ix_trade_state_created_time", "state", "created_time"),
+        Index("ix_trade_state_accepted_time", "state", "accepted_time"),
+    )
 
     trade_id: Mapped[IntPrimaryKey]
 
@@ -329,6 +399,10 @@ class TradeRecord(SQLBaseModel):
 
 class Question(SQLBaseModel):
     __tablename__ = "question"
+    __table_args__ = (
+        Index("ix_question_item_id_created_time", "item_id", "created_time"),
+        Index("ix_question_asker_id", "asker_id"),
+    )
 
     question_id: Mapped[IntPrimaryKey]
 
@@ -357,7 +431,7 @@ class Tag(SQLBaseModel):
 
     tag_type: Mapped[TagsType] = mapped_column(default=TagsType.user_created)
     created_time: Mapped[TimeStamp]
-    name: Mapped[NormalString]
+    name: Mapped[NormalString] = mapped_column(unique=True)
 
     association_items: Mapped[List["AssociationItemTag"]] = relationship(
         back_populates="tag"
@@ -372,10 +446,15 @@ class Tag(SQLBaseModel):
 class AssociationItemTag(SQLBaseModel):
 
     __tablename__ = "association_items_tags"
+    __table_args__ = (
+        # tags of an item, and items with a tag
+        Index("ix_association_items_tags_item_id_tag_id", "item_id", "tag_id"),
+        Index("ix_association_items_tags_tag_id_item_id", "tag_id", "item_id"),
+    )
 
     association_items_tags_id: Mapped[IntPrimaryKey] = mapped_column(autoincrement=True)
-    item_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("item.item_id"))
-    tag_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("tag.tag_id"))
+    item_id: Mapped[int] = mapped_column(ForeignKey("item.item_id"))
+    tag_id: Mapped[int] = mapped_column(ForeignKey("tag.tag_id"))
     created_at: Mapped[TimeStamp]
 
     tag: Mapped["Tag"] = relationship(back_populates="association_items")
@@ -386,13 +465,23 @@ class AssociationItemTag(SQLBaseModel):
 
 class AssociationUserFavouriteItem(SQLBaseModel):
     __tablename__ = "association_user_favourite_item"
+    __table_args__ = (
+        # fav list of a user, and duplication check.
+        # there is at most one row of each pair, soft deleted row is restored
+        # when the item is added again, check out `provider.fav.core`
+        UniqueConstraint(
+            "user_id", "item_id", name="uq_association_user_favourite_item_user_item"
+        ),
+        # cascade removal by items
+        Index("ix_association_user_favourite_item_item_id", "item_id"),
+    )
 
     association_user_favourite_item_id: Mapped[IntPrimaryKey] = mapped_column(
         autoincrement=True
     )
 
-    user_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("user.user_id"))
-    item_id: Mapped[IntPrimaryKey] = mapped_column(ForeignKey("item.item_id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.user_id"))
+    item_id: Mapped[int] = mapped_column(ForeignKey("item.item_id"))
     created_at: Mapped[TimeStamp]
 
     user: Mapped["User"] = relationship(back_populates="association_fav_items")
@@ -434,6 +523,17 @@ class Role(SQLBaseModel):
 class Notification(SQLBaseModel):
 
     __tablename__ = "notification"
+    __table_args__ = (
+        # received notifications listing, optionally unread only, newest first
+        Index(
+            "ix_notification_receiver_id_read_time_created_time",
+            "receiver_id",
+            "read_time",
+            "created_time",
+        ),
+        # sent notifications listing, newest first
+        Index("ix_notification_sender_id_created_time", "sender_id", "created_time"),
+    )
 
     notification_id: Mapped[IntPrimaryKey] = mapped_column(autoincrement=True)
 
@@ -452,3 +552,57 @@ class Notification(SQLBaseModel):
     receiver: Mapped["User"] = relationship(
         back_populates="received_notifications", foreign_keys=receiver_id
     )
+
+
+class JobState(Enum):
+    pending = "pending"
+    running = "running"
+    success = "success"
+    failed = "failed"
+
+
+class Job(SQLBaseModel):
+    """
+    Persisted background job, executed by `provider.job.JobRunner`
+
+    - `job_type` Name of the registered handler
+    - `user_id` The user who enqueued this job, `None` for system jobs
+    - `run_after` Job will not be picked before this timestamp, used for retry backoff
+    - `lease_owner` `lease_expires_at` Set when a runner claims the job. A running job
+      with expired lease is considered abandoned and could be claimed again
+    - `dedup_key` Optional, at most one job could be enqueued with the same key. Used
+      by periodic jobs so only one process enqueues each run
+    - `poll_token` Optional, unguessable token to poll the job without a session. Used
+      by jobs that remove the login of their own requester, e.g. account removal
+    """
+
+    __tablename__ = "job"
+    __table_args__ = (
+        # runners poll due jobs by state and run_after
+        Index("ix_job_state_run_after", "state", "run_after"),
+        UniqueConstraint("dedup_key", name="uq_job_dedup_key"),
+        UniqueConstraint("poll_token", name="uq_job_poll_token"),
+    )
+
+    job_id: Mapped[IntPrimaryKey] = mapped_column(autoincrement=True)
+
+    job_type: Mapped[LongString]
+    payload: Mapped[dict] = mapped_column(JSON)
+    user_id: Mapped[int | None] = mapped_column(
+        ForeignKey("user.user_id"), nullable=True, default=None
+    )
+
+    state: Mapped[JobState] = mapped_column(default=JobState.pending)
+    attempts: Mapped[int] = mapped_column(default=0)
+    max_attempts: Mapped[int] = mapped_column(default=3)
+    run_after: Mapped[TimeStamp]
+    lease_owner: Mapped[LongString | None] = mapped_column(nullable=True)
+    lease_expires_at: Mapped[NullableTimeStamp]
+    dedup_key: Mapped[LongString | None] = mapped_column(nullable=True, default=None)
+    poll_token: Mapped[LongString | None] = mapped_column(nullable=True, default=None)
+
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[VeryLongString | None] = mapped_column(nullable=True)
+
+    created_time: Mapped[TimeStamp]
+    finished_time: Mapped[NullableTimeStamp]
@@ -0,0 +1,212 @@
+"""
+Concurrency stress test of trade operations.
+
+Fires parallel trade starts and accepts of the same item through provider
+functions, each request in its own session, then checks invariants:
+
+- A buyer has at most one active (pending / processing) trade of an item
+- An item has at most one processing trade
+
+Exit with status 1 if any invariant is violated.
+
+Usage
+
+    python stress_trade.py --init-db --buyers=20 --rounds=5
+
+Notes
+
+- Fixture users and items are inserted on each run and deleted afterwards,
+  `--init-db` drops and recreates all tables first.
+- Refuse to run unless the database is SQLite or `SCRATCH_DB` is set in
+  `config/sql.py`.
+"""
+
+import asyncio
+import sys
+from collections import Counter
+
+from loguru import logger
+import fire
+
+from sqlalchemy import select, func, delete
+
+from schemes import sql as orm
+
+from provider.database import session_manager, _engine, require_scratch_database
+from provider.item.core import get_item_by_id
+from provider.trade import start_transaction, accpet_transaction
+from provider.trade.basic import check_validity_to_accept_transaction
+from provider.trade.core import get_trade_by_id
+
+from exception import error as exc
+
+
+async def _seed_users(buyer_count: int) -> tuple[int, list[int]]:
+    async with session_manager() as ss:
+        seller = orm.User(username="stress_seller")
+        buyers = [orm.User(username=f"stress_buyer_{i}") for i in range(buyer_count)]
+        for u in [seller, *buyers]:
+            u.contact_info.append(
+                orm.ContactInfo(
+                    contact_type=orm.ContactInfoType.telegram, contact_info="stress"
+                )
+            )
+        ss.add_all([seller, *buyers])
+        await ss.commit()
+        return seller.user_id, [b.user_id for b in buyers]
+
+
+async def _seed_item(seller_id: int) -> int:
+    async with session_manager() as ss:
+        item = orm.Item(user_id=seller_id, name="stress", description="", price=1)
+        ss.add(item)
+        await ss.commit()
+        return item.item_id
+
+
+async def _cleanup(user_ids: list[int]):
+    """Hard delete all rows seeded by this run, including trades of seeded items"""
+    async with session_manager() as ss:
+        item_ids = select(orm.Item.item_id).where(orm.Item.user_id.in_(user_ids))
+        await ss.execute(
+            delete(orm.TradeRecord).where(orm.TradeRecord.item_id.in_(item_ids))
+        )
+        await ss.execute(delete(orm.Item).where(orm.Item.user_id.in_(user_ids)))
+        await ss.execute(
+            delete(orm.ContactInfo).where(orm.ContactInfo.user_id.in_(user_ids))
+        )
+        await ss.execute(delete(orm.User).where(orm.User.user_id.in_(user_ids)))
+        await ss.commit()
+
+
+async def _run(coro) -> str:
+    """Run an operation and return its outcome name"""
+    try:
+        await coro
+        return "ok"
+    except exc.BaseError as e:
+        return e.name
+    except Exception as e:
+        return type(e).__name__
+
+
+async def _start(buyer_id: int, item_id: int):
+    async with session_manager() as ss:
+        buyer = await ss.get_one(orm.User, buyer_id)
+        item = await get_item_by_id(ss, item_id)
+        await start_transaction(ss, buyer, item)
+
+
+async def _accept(seller_id: int, trade_id: int):
+    async with session_manager() as ss:
+        seller = await ss.get_one(orm.User, seller_id)
+        trade = await get_trade_by_id(ss, trade_id)
+        eligibility = await check_validity_to_accept_transaction(ss, seller, trade)
+        await accpet_transaction(ss, trade, eligibility.item_version)
+
+
+async def _violations(item_id: int) -> list[str]:
+    async with session_manager() as ss:
+        duplicated = (
+            await ss.execute(
+                select(orm.TradeRecord.buyer_id, func.count())
+                .where(
+                    orm.TradeRecord.item_id == item_id,
+                    orm.TradeRecord.state.in_(
+                        [orm.TradeState.pending, orm.TradeState.processing]
+                    ),
+                )
+                .group_by(orm.TradeRecord.buyer_id)
+                .having(func.count() > 1)
+            )
+        ).all()
+        processing = await ss.scalar(
+            select(func.count()).where(
+                orm.TradeRecord.item_id == item_id,
+                orm.TradeRecord.state == orm.TradeState.processing,
+            )
+        )
+
+    violations = [
+        f"buyer {buyer_id} has {count} active trades of item {item_id}"
+        for buyer_id, count in duplicated
+    ]
+    if processing is not None and processing > 1:
+        violations.append(f"item {item_id} has {processing} processing trades")
+    return violations
+
+
+async def _stress_rounds(
+    seller_id: int, buyer_ids: list[int], rounds: int, duplicates: int
+) -> list[str]:
+    violations: list[str] = []
+
+    for r in range(rounds):
+        item_id = await _seed_item(seller_id)
+
+        # the same buyer starts many trades of the item at once
+        dup_outcomes = await asyncio.gather(
+            *[_run(_start(buyer_ids[0], item_id)) for _ in range(duplicates)]
+        )
+
+        # all buyers start trades of the item at once
+        start_outcomes = await asyncio.gather(
+            *[_run(_start(b, item_id)) for b in buyer_ids[1:]]
+        )
+
+        # seller accepts all pending trades at once
+        async with session_manager() as ss:
+            trade_ids = (
+                await ss.scalars(
+                    select(orm.TradeRecord.trade_id).where(
+                        orm.TradeRecord.item_id == item_id
+                    )
+                )
+            ).all()
+        accept_outcomes = await asyncio.gather(
+            *[_run(_accept(seller_id, t)) for t in trade_ids]
+        )
+
+        logger.info(
+            f"Round {r}: duplicated starts {dict(Counter(dup_outcomes))}, "
+            f"starts {dict(Counter(start_outcomes))}, "
+            f"accepts {dict(Counter(accept_outcomes))}"
+        )
+        violations.extend(await _violations(item_id))
+
+    return violations
+
+
+async def stress(buyers: int, rounds: int, duplicates: int) -> list[str]:
+    seller_id, buyer_ids = await _seed_users(buyers)
+
+    try:
+        return await _stress_rounds(seller_id, buyer_ids, rounds, duplicates)
+    finally:
+        await _cleanup([seller_id, *buyer_ids])
+        await _engine.dispose()
+
+
+def main(buyers: int = 20, rounds: int = 5, duplicates: int = 5, init_db: bool = False):
+    async def run():
+        require_scratch_database("insert stress fixtures")
+        if init_db:
+            from create_db import init_database
+
+            await init_database()
+        return await stress(buyers, rounds, duplicates)
+
+    violations = asyncio.run(run())
+
+    for v in violations:
+        logger.error(v)
+
+    if len(violations) > 0:
+        logger.error(f"{len(violations)} invariant violations found")
+        sys.exit(1)
+
+    logger.success("No invariant violation found")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,41 @@
+"""
+Shared fixtures of tests.
+
+Tests run against a temporary SQLite database, the business database configured
+in `config/sql.py` is never touched.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from schemes import sql as orm
+
+from provider.database import PrimarySession
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    """
+    Session maker of a temporary SQLite database with all tables created
+
+    Connections are not pooled, so the database could be used by multiple event
+    loops, e.g. `asyncio.run()` of the test and the loop of `TestClient`.
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'test.sqlite3'}", poolclass=NullPool
+    )
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(orm.SQLBaseModel.metadata.create_all)
+
+    asyncio.run(create_tables())
+
+    yield async_sessionmaker[AsyncSession](
+        engine, expire_on_commit=False, sync_session_class=PrimarySession
+    )
+
+    asyncio.run(engine.dispose())
@@ -0,0 +1,84 @@
+"""
+Regression tests of notification endpoints.
+
+Usage
+
+    python -m pytest tests
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from schemes import sql as orm
+from schemes import db as db_sche
+
+from provider.database import get_session, SessionDep
+from provider.user.core import get_current_user, get_current_user_or_none
+
+import main
+
+
+@pytest.fixture
+def receiver_client(session_maker):
+    """
+    Client of the app signed in as the receiver of an unread notification,
+    yield `(client, notification_id, receiver_id)`
+    """
+
+    async def seed():
+        async with session_maker() as ss:
+            sender = orm.User(username="sender")
+            receiver = orm.User(username="receiver", unread_notification_count=1)
+            notification = orm.Notification(
+                sender=sender,
+                receiver=receiver,
+                content=db_sche.NotificationContentOut(
+                    title="Hi", message="Hi"
+                ).model_dump(),
+            )
+            ss.add_all([sender, receiver, notification])
+            await ss.commit()
+            return notification.notification_id, receiver.user_id
+
+    notification_id, receiver_id = asyncio.run(seed())
+
+    async def get_test_session():
+        async with session_maker() as ss:
+            yield ss
+
+    async def get_receiver(ss: SessionDep):
+        return await ss.get_one(orm.User, receiver_id)
+
+    main.app.dependency_overrides.update(
+        {
+            get_session: get_test_session,
+            get_current_user: get_receiver,
+            get_current_user_or_none: get_receiver,
+        }
+    )
+    try:
+        # without lifespan, so job runner and indexes are not started
+        yield TestClient(main.app), notification_id, receiver_id
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+def test_read_notification(session_maker, receiver_client):
+    client, notification_id, receiver_id = receiver_client
+
+    res = client.post("/notification/read", json={"notification_id": notification_id})
+    body = res.json()
+
+    assert res.status_code == 200
+    assert "detail" not in body, body
+    assert body["notification_id"] == notification_id
+    assert body["read_time"] is not None
+
+    async def get_unread_count():
+        async with session_maker() as ss:
+            receiver = await ss.get_one(orm.User, receiver_id)
+            return receiver.unread_notification_count
+
+    assert asyncio.run(get_unread_count()) == 0
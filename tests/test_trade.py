@@ -0,0 +1,54 @@
+"""
+Regression tests of trade providers.
+
+Usage
+
+    python -m pytest tests
+"""
+
+import asyncio
+
+from schemes import sql as orm
+from schemes import db as db_sche
+from schemes import general as gene_sche
+
+from provider import trade as trade_provider
+from provider.item.core import remove_items_cascade_by_ids
+
+
+async def _get_transactions_of_removed_item(session_maker):
+    async with session_maker() as ss:
+        seller = orm.User(username="seller")
+        buyer = orm.User(username="buyer")
+        removed = orm.Item(name="removed", description="", price=1)
+        kept = orm.Item(name="kept", description="", price=1)
+        seller.items.extend([removed, kept])
+        ss.add_all(
+            [
+                orm.TradeRecord(buyer=buyer, item=removed),
+                orm.TradeRecord(buyer=buyer, item=kept),
+            ]
+        )
+        await ss.commit()
+        seller_id, buyer_id = seller.user_id, buyer.user_id
+
+        # /item/remove keeps trade records of removed items
+        await remove_items_cascade_by_ids(ss, [removed.item_id])
+
+    results = {}
+    for name, user_id in [("buyer", buyer_id), ("seller", seller_id)]:
+        async with session_maker() as ss:
+            user = await ss.get_one(orm.User, user_id)
+            res = await trade_provider.get_transactions(ss, user, None)
+            out = await gene_sche.validate_result(
+                ss, res.data, list[db_sche.TradeRecordOut]
+            )
+            results[name] = (res.total, [t.item.name for t in out])
+    return results
+
+
+def test_get_transactions_excludes_removed_items(session_maker):
+    results = asyncio.run(_get_transactions_of_removed_item(session_maker))
+
+    assert results["buyer"] == (1, ["kept"])
+    assert results["seller"] == (1, ["kept"])
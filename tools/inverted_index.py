@@ -0,0 +1,83 @@
+import re
+from typing import Hashable
+
+_token_pattern = re.compile(r"[^\W_]+", re.UNICODE)
+_cjk_pattern = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text: str) -> set[str]:
+    """
+    Split text to lowercase word tokens. CJK characters have no word boundary,
+    so each of them is treated as a token.
+    """
+    tokens: set[str] = set()
+    for word in _token_pattern.findall(text.casefold()):
+        if _cjk_pattern.search(word) is None:
+            tokens.add(word)
+            continue
+        # split mixed words like "iphone手机" to "iphone", "手", "机"
+        for part in _cjk_pattern.split(word):
+            if part != "":
+                tokens.add(part)
+        tokens.update(_cjk_pattern.findall(word))
+    return tokens
+
+
+class InvertedIndex[DocIdType: Hashable]:
+    """
+    In-process inverted index used for keyword search when full-text index of
+    database is not available.
+
+    A document matches a query only if it contains all tokens of the query.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, set[DocIdType]] = {}
+        self._doc_tokens: dict[DocIdType, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_tokens)
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._doc_tokens.clear()
+
+    def index(self, doc_id: DocIdType, text: str) -> None:
+        """Index a document, replace the previous content if already indexed"""
+        self.remove(doc_id)
+
+        tokens = tokenize(text)
+        self._doc_tokens[doc_id] = tokens
+        for t in tokens:
+            self._postings.setdefault(t, set()).add(doc_id)
+
+    def remove(self, doc_id: DocIdType) -> None:
+        for t in self._doc_tokens.pop(doc_id, set()):
+            docs = self._postings.get(t)
+            if docs is None:
+                continue
+            docs.discard(doc_id)
+            if len(docs) == 0:
+                del self._postings[t]
+
+    def search(self, query: str) -> set[DocIdType] | None:
+        """
+        Return ids of documents containing all tokens of `query`.
+
+        Return `None` if `query` contains no token, which means no filter
+        should be applied.
+        """
+        tokens = tokenize(query)
+        if len(tokens) == 0:
+            return None
+
+        # intersect from the rarest token
+        postings = sorted(
+            (self._postings.get(t, set()) for t in tokens), key=lambda p: len(p)
+        )
+        result = set(postings[0])
+        for p in postings[1:]:
+            result &= p
+            if len(result) == 0:
+                break
+        return result
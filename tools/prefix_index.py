@@ -0,0 +1,61 @@
+import heapq
+from bisect import bisect_left, insort
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index of words with usage counts, used for autocomplete.
+
+    Words are kept in a sorted list, so all words with a certain prefix are
+    found by binary search and a short scan. Matching is case-insensitive.
+
+    Usage
+
+        index = PrefixIndex()
+        index.add("Python", 3)
+        index.suggest("py")  # [("Python", 3)]
+    """
+
+    def __init__(self) -> None:
+        # sorted (folded key, word) pairs
+        self._keys: list[tuple[str, str]] = []
+        self._counts: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    @staticmethod
+    def _fold(word: str) -> str:
+        return word.casefold()
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._counts.clear()
+
+    def add(self, word: str, delta: int = 1) -> None:
+        """
+        Add `delta` to usage count of `word`, insert the word if not exists.
+        Count never drops below zero, words with zero usage are still suggested.
+        """
+        if word not in self._counts:
+            insort(self._keys, (self._fold(word), word))
+            self._counts[word] = 0
+        self._counts[word] = max(0, self._counts[word] + delta)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        Return at most `limit` `(word, count)` pairs starting with `prefix`,
+        ordered by usage count desc.
+        """
+        key = self._fold(prefix)
+        start = bisect_left(self._keys, (key, ""))
+
+        matches: list[str] = []
+        for i in range(start, len(self._keys)):
+            folded, word = self._keys[i]
+            if not folded.startswith(key):
+                break
+            matches.append(word)
+
+        top = heapq.nlargest(limit, matches, key=lambda w: (self._counts[w], w))
+        return [(w, self._counts[w]) for w in top]
@@ -0,0 +1,149 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+@dataclass
+class QueryStats:
+    """
+    SQL statistics of a single request
+
+    - `count` How many statements executed
+    - `total_time_ms` Total time spent on executing statements
+    - `shapes` Execution count of each normalized statement shape
+    """
+
+    count: int = 0
+    total_time_ms: float = 0
+    shapes: Counter[str] = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_time_ms += elapsed_ms
+        self.shapes[normalize_statement(statement)] += 1
+
+    def repeated_shapes(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Return statement shapes executed more than `threshold` times,
+        which is usually caused by N+1 lazy loading
+        """
+        return [(s, c) for s, c in self.shapes.most_common() if c > threshold]
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar(
+    "query_stats", default=None
+)
+
+_whitespace_pattern = re.compile(r"\s+")
+_in_list_pattern = re.compile(r"IN \((?:[^()]*)\)", re.IGNORECASE)
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Normalize a statement to its shape, so that statements only differ in
+    bound parameters are treated as the same one.
+
+    Statements are already parameterized when reaching cursor, here we only
+    collapse whitespace and the expanded `IN (...)` lists.
+    """
+    statement = _whitespace_pattern.sub(" ", statement).strip()
+    return _in_list_pattern.sub("IN (?)", statement)
+
+
+def get_current_stats() -> QueryStats | None:
+    """Return the statistics of current request, `None` if not in a counted request"""
+    return _current_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_counter_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+
+    start_time = getattr(context, "_query_counter_start_time", time.perf_counter())
+    stats.record(statement, (time.perf_counter() - start_time) * 1000)
+
+
+def instrument_engine(engine: AsyncEngine | Engine):
+    """
+    Attach query counting listeners to an engine.
+    Engine that already instrumented will be ignored.
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    if event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        return
+
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCounterMiddleware:
+    """
+    ASGI middleware that counts SQL statements and DB time of each request.
+
+    The result is attached to response headers `X-DB-Query-Count` and
+    `X-DB-Query-Time-Ms`. If any statement shape repeats more than
+    `n_plus_one_threshold` times in one request, a warning will be logged and
+    the count of such shapes will be attached as `X-DB-N-Plus-One` header.
+
+    Only statements executed by engines passed to `instrument_engine()` are counted.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: int = 10) -> None:
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_stats(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-DB-Query-Count", str(stats.count))
+                headers.append("X-DB-Query-Time-Ms", f"{stats.total_time_ms:.2f}")
+
+                repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+                if len(repeated) > 0:
+                    headers.append("X-DB-N-Plus-One", str(len(repeated)))
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current_stats.reset(token)
+            self.report(scope, stats)
+
+    def report(self, scope: Scope, stats: QueryStats):
+        path = f"{scope.get('method')} {scope.get('path')}"
+
+        logger.debug(
+            f"{path}: {stats.count} queries, {stats.total_time_ms:.2f}ms DB time"
+        )
+
+        for shape, count in stats.repeated_shapes(self.n_plus_one_threshold):
+            logger.warning(
+                f"Possible N+1 queries in {path}, statement executed {count} times: "
+                f"{shape}"
+            )
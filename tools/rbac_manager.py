@@ -69,19 +69,39 @@ class RBACManager[
     RoleType: str,
     PermissionType: str,
 ]:
+    """
+    Role-based access control manager
+
+    Args
+
+    - `roles` All valid roles
+    - `role_inheritance` Roles that each role directly inherits permissions from
+    - `role_permissions` Permissions directly granted to each role
+    - `use_bitmask` If `True`, permission checks are performed on compiled bitmasks,
+      else on compiled permission sets. Check out `_compile_bitmasks()`
+    """
+
     def __init__(
         self,
         roles: Set[RoleType],
         role_inheritance: Dict[RoleType, Set[RoleType]],
         role_permissions: Dict[RoleType, Set[PermissionType]],
+        use_bitmask: bool = True,
     ) -> None:
         self.roles = roles
         self.role_inheritance = role_inheritance
         self.role_permissions = role_permissions
+        self.use_bitmask = use_bitmask
 
         self._compiled_role_permissions: Dict[RoleType, Set[PermissionType]] = {}
         self._compile_permissions()
 
+        self._permission_bits: Dict[PermissionType, int] = {}
+        self._compiled_role_masks: Dict[RoleType, int] = {}
+        # required permission sets are usually static, memoize their masks
+        self._required_mask_cache: Dict[frozenset[PermissionType], int] = {}
+        self._compile_bitmasks()
+
     def _compile_permissions(self):
         # clear
         self._compiled_role_permissions = deepcopy(self.role_permissions)
@@ -137,6 +157,62 @@ class RBACManager[
             f"RBAC Compiled, result: \n{pformat(self._compiled_role_permissions)}"
         )
 
+    def _compile_bitmasks(self):
+        """
+        Intern each permission to a bit index, then store compiled permissions of each
+        role as an integer bitmask.
+
+        Must be called after `_compile_permissions()`
+        """
+        self._permission_bits = {}
+        for permissions in self._compiled_role_permissions.values():
+            for p in sorted(permissions):
+                self._permission_bits.setdefault(p, 1 << len(self._permission_bits))
+
+        self._compiled_role_masks = {
+            role: self.permissions_to_mask(permissions)
+            for role, permissions in self._compiled_role_permissions.items()
+        }
+        self._required_mask_cache = {}
+
+        debug_log(
+            f"RBAC bitmasks compiled, {len(self._permission_bits)} permissions interned."
+        )
+
+    def permissions_to_mask(self, permissions: Collection[PermissionType]) -> int:
+        """
+        Convert permissions to bitmask.
+
+        Raise `KeyError` if a permission is not granted to any role.
+        """
+        mask = 0
+        for p in permissions:
+            mask |= self._permission_bits[p]
+        return mask
+
+    def _required_mask(self, role: Any, permissions: Collection[PermissionType]) -> int:
+        key = (
+            permissions
+            if isinstance(permissions, frozenset)
+            else frozenset(permissions)
+        )
+        mask = self._required_mask_cache.get(key)
+        if mask is not None:
+            return mask
+
+        try:
+            mask = self.permissions_to_mask(key)
+        except KeyError as e:
+            # permission not granted to any role, no role could satisfy it
+            raise InsufficientPermission(role=role, permission=e.args[0])
+
+        if len(self._required_mask_cache) < 1024:
+            self._required_mask_cache[key] = mask
+        return mask
+
+    def _mask_to_permissions(self, mask: int) -> Set[PermissionType]:
+        return {p for p, bit in self._permission_bits.items() if mask & bit}
+
     def check_role(self, role):
         if role not in self.roles:
             raise InvalidRole(role)
@@ -148,6 +224,49 @@ class RBACManager[
     ) -> None:
         self.check_role(role)
 
+        if self.use_bitmask:
+            required_mask = self._required_mask(role, permissions)
+            role_mask = self._compiled_role_masks[role]
+            if required_mask & role_mask != required_mask:
+                raise InsufficientPermission(
+                    role=role,
+                    permission=self._mask_to_permissions(required_mask & ~role_mask),
+                )
+            return
+
         for p in permissions:
             if p not in self._compiled_role_permissions[role]:
                 raise InsufficientPermission(role=role, permission=p)
+
+    def check_roles_have_all_permissions(
+        self,
+        roles: Collection[RoleType | Any],
+        permissions: Set[PermissionType],
+    ) -> None:
+        """
+        Check that `roles` together have all `permissions`, i.e. each permission is
+        granted by at least one of the roles.
+
+        Notice this is different from checking each role with
+        `check_role_has_all_permissions()`, which requires a single role to have all
+        permissions.
+        """
+        for role in roles:
+            self.check_role(role)
+
+        if self.use_bitmask:
+            roles_mask = 0
+            for role in roles:
+                roles_mask |= self._compiled_role_masks[role]
+
+            required_mask = self._required_mask(set(roles), permissions)
+            if required_mask & roles_mask != required_mask:
+                raise InsufficientPermission(
+                    role=set(roles),
+                    permission=self._mask_to_permissions(required_mask & ~roles_mask),
+                )
+            return
+
+        for p in permissions:
+            if not any(p in self._compiled_role_permissions[r] for r in roles):
+                raise InsufficientPermission(role=set(roles), permission=p)
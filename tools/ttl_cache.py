@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class TTLCache[KeyType: Hashable, ValueType]:
+    """
+    In-process LRU cache with per-entry time-to-live.
+
+    - `ttl_s` Seconds before an entry expires
+    - `max_size` Max entries kept, the least recently used entry will be
+      evicted when exceeded
+
+    Notes
+
+    Each worker process has its own cache instance, so invalidation only affects
+    current process. Entries in other processes will be stale at most `ttl_s` seconds.
+    """
+
+    def __init__(self, ttl_s: float, max_size: int = 10000) -> None:
+        self.ttl_s = ttl_s
+        self.max_size = max_size
+        self._data: OrderedDict[KeyType, tuple[float, ValueType]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: KeyType) -> ValueType | None:
+        """Return cached value of `key`, `None` if not exists or expired"""
+        try:
+            expires_at, value = self._data[key]
+        except KeyError:
+            return None
+
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: KeyType, value: ValueType) -> None:
+        self._data[key] = (time.monotonic() + self.ttl_s, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: KeyType) -> None:
+        self._data.pop(key, None)
+
+    def pop_if(self, predicate: Callable[[KeyType, ValueType], bool]) -> int:
+        """
+        Remove all entries satisfying `predicate(key, value)`, return removed count
+        """
+        keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+        for k in keys:
+            del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()